@@ -0,0 +1,144 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import gzip
+import json
+import threading
+import time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from helpers.geometry import features_to_geodataframe
+from helpers.geoparquet import GEOPARQUET_MEDIA_TYPE, write_location_parquet
+
+FakeMetricResult = namedtuple("FakeMetricResult", ["area_km2", "features", "vertices", "series"])
+
+
+class FakeLocationAPI:
+    """
+    Locations API serving pre-encoded JSON:API documents from a local HTTP server,
+    gzip encoded when accepted by the client. Sparse fieldsets (`select`) are encoded
+    per request. Locations are served as GeoParquet when accepted by the client.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.parquet = {}  # encoded on first request;
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def add(self, document):
+        body = json.dumps(document).encode("utf-8")
+        self.documents[document["data"]["id"]] = (
+            document,
+            body,
+            gzip.compress(body, compresslevel=6),
+        )
+        return document["data"]["id"]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def encode_parquet(self, resource_id):
+        import json_api_doc
+
+        if resource_id not in self.parquet:
+            document = json_api_doc.deserialize(self.documents[resource_id][0])
+            gdf = features_to_geodataframe(document["geojson"]["features"])
+            self.parquet[resource_id] = write_location_parquet(document, gdf)
+        return self.parquet[resource_id]
+
+    def _handler(self):
+        api, documents = self, self.documents
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive;
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                resource_id = url.path.rstrip("/").split("/")[-1]
+                if resource_id not in documents:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                document, body, compressed = documents[resource_id]
+                gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+
+                if GEOPARQUET_MEDIA_TYPE in self.headers.get("Accept", ""):
+                    body = api.encode_parquet(resource_id)  # compressed columns, not gzipped;
+                    self.send_response(200)
+                    self.send_header("Content-Type", GEOPARQUET_MEDIA_TYPE)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                select = parse_qs(url.query).get("select")
+                if select:
+                    fields = select[0].split(",")
+                    data = document["data"]
+                    attributes = {k: v for k, v in data["attributes"].items() if k in fields}
+                    body = json.dumps({"data": {**data, "attributes": attributes}}).encode("utf-8")
+                    compressed = gzip.compress(body, compresslevel=6)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/vnd.api+json")
+                if gzipped:
+                    body = compressed
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class FakeMetric:
+    """
+    Stand-in for a `marapp_metrics` metric, with a simulated remote computation latency.
+    """
+
+    slug = "fake"
+    latency = 0.0  # in seconds
+
+    def __init__(self, config_filepath=None, **kwargs):
+        pass
+
+    def measure(self, gdf, area_km2=None):
+        time.sleep(self.latency)
+
+        vertices = sum(len(g.exterior.coords) for g in gdf.geometry if hasattr(g, "exterior"))
+        series = {str(year): float(year % 7) for year in range(2001, 2021)}
+        return FakeMetricResult(area_km2, len(gdf), vertices, series)
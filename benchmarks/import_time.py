@@ -0,0 +1,105 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# placeholders for the environment read at import time by the handlers.
+DEFAULT_ENV = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "SENTRY_DSN": "",
+    "SERVICE_API_ENDPOINT": "http://localhost",
+    "SNS_WORKER_TOPIC_ARN": "arn:aws:sns:us-east-1:000000000000:worker",
+    "SNS_RESULT_TOPIC_ARN": "arn:aws:sns:us-east-1:000000000000:result",
+}
+
+ENTRY_POINTS = ["handlers.manager_handler", "handlers.worker_handler", "handlers.reducer_handler"]
+
+SNIPPET = """
+import sys, time
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+
+def measure(statement, repeat):
+    """
+    Run the statement in fresh interpreters, i.e. a cold start.
+
+    :return: The list of durations in milliseconds.
+    """
+    env = {**os.environ, **{k: v for k, v in DEFAULT_ENV.items() if k not in os.environ}}
+    code = SNIPPET.format(src=SRC_DIR, statement=statement)
+
+    durations = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True
+        )
+        durations.append(float(output.stdout.strip().splitlines()[-1]) * 1000)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import time of the handlers.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per entry point.")
+    parser.add_argument("--metrics", action="store_true", help="Also resolve each metric.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    statements = {name: f"import {name}" for name in ENTRY_POINTS}
+    if args.metrics:
+        sys.path.insert(0, SRC_DIR)
+        from config import MetricHandler
+
+        for slug in MetricHandler.slugs():
+            statements[
+                f"metric:{slug}"
+            ] = f"from config import MetricHandler; MetricHandler.get_handler({slug!r})"
+
+    results = {}
+    for name, statement in statements.items():
+        try:
+            durations = measure(statement, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"{name:<40} failed: {e.stderr.strip().splitlines()[-1]}")
+            continue
+
+        results[name] = {
+            "median_ms": statistics.median(durations),
+            "min_ms": min(durations),
+            "max_ms": max(durations),
+        }
+        print(f"{name:<40} median: {results[name]['median_ms']:9.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+RESULTS_DIR = os.path.join(ROOT_DIR, "benchmarks", "results")
+
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(1, SRC_DIR)
+
+from benchmarks.fakes import FakeLocationAPI, FakeMetric  # noqa
+from benchmarks.synthetic import SCENARIOS, location_document  # noqa
+from helpers.geometry import features_to_geodataframe  # noqa
+from tools.local_queue import InMemoryQueue, LocalContext, sns_event  # noqa
+
+# environment read at import time by the handlers, the location cache, result store & ledger
+# are disabled so every run measures the full computation.
+DEFAULT_ENV = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "SENTRY_DSN": "",
+    "SNS_WORKER_TOPIC_ARN": "arn:aws:sns:local:000000000000:worker",
+    "SNS_RESULT_TOPIC_ARN": "arn:aws:sns:local:000000000000:result",
+    "LOCATION_CACHE_ENABLED": "false",
+    "RESULT_STORE_URL": "",
+    "LEDGER_URL": "",
+    "RUNTIME_HISTORY_URL": "",
+    "PAYLOAD_STORE_URL": "memory://",
+    "UPSTREAM_RATE": "1000",  # the fake API never throttles, only the limiter overhead is timed
+    "UPSTREAM_RATE_MAX": "1000",
+}
+
+FETCH_MANY_COUNT = 50  # locations retrieved concurrently by the fetch_many stage
+LARGE_SERIES_LENGTH = 20000  # entries of the series published by the publish_large stage
+REGRESSION_THRESHOLD = 1.1  # report stages more than 10% slower than the baseline
+
+
+def measure(fn, repeat, memory=True):
+    """
+    Time the function over `repeat` runs, then trace its peak memory in a separate run
+    (tracing slows down the execution).
+
+    :return: A tuple of the stats dict and the value returned by the last run.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    stats = {
+        "median_ms": statistics.median(durations),
+        "min_ms": min(durations),
+        "max_ms": max(durations),
+    }
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        stats["peak_mb"] = peak / (1 << 20)
+
+    return stats, value
+
+
+def run_scenario(api, modules, area_km2, features, vertices, repeat, seed):
+    import json_api_doc
+    from geopandas import GeoDataFrame
+
+    manager_handler, worker_handler, fetch_service = modules
+
+    resource_id = api.add(location_document(area_km2, features, vertices, seed=seed))
+    resource_url = f"{api.endpoint}/locations/{resource_id}"
+    queue = InMemoryQueue()
+    manager_handler.sns = worker_handler.sns = queue
+
+    stages = {}
+
+    stages["fetch"], body = measure(
+        lambda: fetch_service.get_session().get(resource_url, timeout=60).content, repeat
+    )
+    stages["decode"], document = measure(lambda: json_api_doc.deserialize(json.loads(body)), repeat)
+    stages["geodataframe"], gdf = measure(
+        lambda: GeoDataFrame.from_features(document["geojson"]["features"]), repeat
+    )
+    stages["vectorized_geodataframe"], vectorized = measure(
+        lambda: features_to_geodataframe(document["geojson"]["features"]), repeat
+    )
+    check_same_frame(gdf, vectorized)
+    if hasattr(worker_handler.fetch_service, "get_geodataframe_by_id"):
+        try:
+            stages["stream_decode"], _ = measure(
+                lambda: worker_handler.fetch_service.get_geodataframe_by_id(resource_id), repeat
+            )
+        except ImportError:  # ijson not installed;
+            pass
+    try:
+        parquet_service = worker_handler.LocationService(location_format="geoparquet")
+        stages["parquet_decode"], _ = measure(
+            lambda: parquet_service.get_geodataframe_by_id(resource_id), repeat
+        )
+        parquet_bytes = len(api.encode_parquet(resource_id))
+    except ImportError:  # pyarrow not installed;
+        parquet_bytes = None
+    try:
+        resource_ids = [resource_id] * FETCH_MANY_COUNT
+        stages["fetch_many"], _ = measure(
+            lambda: worker_handler.fetch_service.get_many(resource_ids), repeat, memory=False
+        )
+    except ImportError:  # aiohttp not installed;
+        pass
+    stages["measure"], metric = measure(lambda: FakeMetric().measure(gdf, area_km2), repeat)
+
+    payload = {"slug": FakeMetric.slug, "location": resource_id, "metric": metric._asdict()}
+    stages["publish"], _ = measure(
+        lambda: queue.publish(TopicArn="result", Message=json.dumps(payload)), repeat
+    )
+    series = {str(i): float(i % 7) for i in range(LARGE_SERIES_LENGTH)}
+    large_payload = {**payload, "metric": {**payload["metric"], "series": series}}
+    stages["publish_large"], _ = measure(
+        lambda: worker_handler.publish_result(large_payload), repeat
+    )
+
+    worker_event = {"id": resource_id, "version": 1, "meta": {"worker": {"handler": "fake"}}}
+    stages["worker"], _ = measure(
+        lambda: worker_handler.lambda_handler(sns_event(worker_event), LocalContext()), repeat
+    )
+    stages["manager"], _ = measure(
+        lambda: manager_handler.lambda_handler(
+            sns_event({"id": resource_id, "version": 1}), LocalContext("manager", 30)
+        ),
+        repeat,
+    )
+
+    return {
+        "area_km2": area_km2,
+        "features": features,
+        "vertices": vertices,
+        "payload_bytes": len(body),
+        "parquet_bytes": parquet_bytes,
+        "stages": stages,
+    }
+
+
+def check_same_frame(expected, actual):
+    """
+    Fail the run when the vectorized construction differs from `from_features`,
+    geometries are compared through their WKB.
+    """
+    if list(expected.columns) != list(actual.columns) or len(expected) != len(actual):
+        raise AssertionError("Vectorized GeoDataFrame columns or length differ")
+    for i, (a, b) in enumerate(zip(expected.geometry, actual.geometry)):
+        if (a.wkb if a is not None else None) != (b.wkb if b is not None else None):
+            raise AssertionError(f"Vectorized geometry differs at row: {i}")
+    if not expected.drop(columns="geometry").equals(actual.drop(columns="geometry")):
+        raise AssertionError("Vectorized GeoDataFrame properties differ")
+
+
+def load_modules(endpoint):
+    """
+    Import the handlers against the fake locations API, with the fake metric.
+    """
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ["SERVICE_API_ENDPOINT"] = endpoint
+
+    from handlers import manager_handler, worker_handler
+    from services import fetch_service
+
+    worker_handler.resolve_handler = lambda handler: FakeMetric
+    worker_handler.get_metric_instance = lambda slug, *args, **kwargs: FakeMetric()
+
+    return manager_handler, worker_handler, fetch_service
+
+
+def git_commit():
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True
+        )
+        return output.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def compare(results, baseline):
+    """
+    Print the per-stage change of the median latency & peak memory against a baseline.
+    """
+    print(f"\nComparing {results['commit']} against {baseline['commit']}")
+    for name, scenario in results["scenarios"].items():
+        if name not in baseline["scenarios"]:
+            continue
+        for stage, stats in scenario["stages"].items():
+            base = baseline["scenarios"][name]["stages"].get(stage)
+            if not base or not base["median_ms"]:
+                continue
+            ratio = stats["median_ms"] / base["median_ms"]
+            flag = "  REGRESSION" if ratio > REGRESSION_THRESHOLD else ""
+            memory = ""
+            if "peak_mb" in stats and base.get("peak_mb"):
+                memory = f" peak: {stats['peak_mb'] / base['peak_mb']:5.2f}x"
+            print(f"{name:<16} {stage:<14} median: {ratio:5.2f}x{memory}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the handlers with fake backends.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage.")
+    parser.add_argument("--scenario", action="append", help="Run only these scenarios.")
+    parser.add_argument("--output", help="Results file (default: results/<commit>.json).")
+    parser.add_argument("--compare", help="Baseline results file to compare against.")
+    args = parser.parse_args()
+
+    api = FakeLocationAPI().start()
+    try:
+        modules = load_modules(api.endpoint)
+
+        scenarios = {}
+        for seed, (name, area_km2, features, vertices) in enumerate(SCENARIOS):
+            if args.scenario and name not in args.scenario:
+                continue
+            scenarios[name] = run_scenario(
+                api, modules, area_km2, features, vertices, args.repeat, seed
+            )
+            for stage, stats in scenarios[name]["stages"].items():
+                print(
+                    f"{name:<16} {stage:<14} median: {stats['median_ms']:10.1f} ms "
+                    f"peak: {stats.get('peak_mb', 0):8.1f} MB"
+                )
+    finally:
+        api.stop()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "scenarios": scenarios,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to: {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import math
+import random
+import uuid
+
+KM_PER_DEGREE = 111.32
+
+
+def polygon(center, area_km2, vertices, jitter=0.1, rng=random):
+    """
+    Star-shaped ring of about the given area & number of vertices around the center.
+    """
+    lon, lat = center
+    radius = math.sqrt(area_km2 / math.pi) / KM_PER_DEGREE  # in degrees (at the equator);
+    lon_scale = 1 / max(math.cos(math.radians(lat)), 0.01)
+
+    ring = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        r = radius * (1 + rng.uniform(-jitter, jitter))
+        ring.append([lon + r * math.cos(angle) * lon_scale, lat + r * math.sin(angle)])
+    ring.append(ring[0])
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def feature_collection(area_km2, features, vertices, seed=0):
+    """
+    FeatureCollection of non-overlapping polygons, sharing the total area & vertices.
+    """
+    rng = random.Random(seed)
+    per_feature_km2 = area_km2 / features
+    spacing = 3 * math.sqrt(per_feature_km2 / math.pi) / KM_PER_DEGREE
+    cols = math.ceil(math.sqrt(features))
+
+    collection = []
+    for i in range(features):
+        row, col = divmod(i, cols)
+        center = (-60 + col * spacing, -10 + row * spacing)
+        geometry = polygon(center, per_feature_km2, max(3, vertices // features), rng=rng)
+        collection.append({"type": "Feature", "properties": {"index": i}, "geometry": geometry})
+
+    return {"type": "FeatureCollection", "features": collection}
+
+
+def location_document(area_km2, features, vertices, version=1, seed=0):
+    """
+    JSON:API location document, as returned by the locations API.
+    """
+    return {
+        "data": {
+            "id": str(uuid.UUID(int=random.Random(seed).getrandbits(128))),
+            "type": "location",
+            "attributes": {
+                "version": version,
+                "areaKm2": area_km2,
+                "geojson": feature_collection(area_km2, features, vertices, seed=seed),
+            },
+        }
+    }
+
+
+# (name, area_km2, features, vertices) of the benchmarked locations.
+SCENARIOS = [
+    ("small-simple", 100, 1, 100),
+    ("medium", 50000, 10, 10000),
+    ("large-detailed", 500000, 1, 200000),
+    ("many-features", 200000, 5000, 250000),
+    ("country", 2000000, 50, 1000000),
+]
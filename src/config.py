@@ -18,52 +18,190 @@
 """
 
 import logging
+import os
+import threading
+import time
+from collections import Counter, namedtuple
 from enum import Enum, unique
-
-from marapp_metrics.metrics.biodiversity_intactness import BiodiversityIntactnessMetric
-from marapp_metrics.metrics.human_footprint import HumanFootprint
-from marapp_metrics.metrics.human_impact import HumanInfluenceEnsembleMetric
-from marapp_metrics.metrics.land_cover import LandUseLandCover
-from marapp_metrics.metrics.modis_fire import ModisFire
-from marapp_metrics.metrics.protected_areas import ProtectedAreas
-from marapp_metrics.metrics.terrestrial_carbon import TerrestrialCarbon
-from marapp_metrics.metrics.tree_loss import TreeLoss
-from marapp_metrics.metrics.modis_evi import ModisEvi
+from importlib import import_module
 
 # https://github.com/googleapis/google-api-python-client/issues/299
 logging.getLogger("googleapiclient.discovery_cache").setLevel(logging.CRITICAL)
 
 
+# rules merging the results computed for the tiles of a location, by slug; `*` sets the
+# rule of the fields not listed. Metrics without rules infer them from the field names.
+METRIC_MERGE_RULES = {
+    "biodiversity_intactness": {"*": "mean"},
+    "human_footprint": {"*": "mean"},
+    "human_impact": {"*": "mean"},
+    "land_use": {"*": "sum"},
+    "modis_evi": {"*": "mean"},
+    "modis_fire": {"*": "sum"},
+    "protected_areas": {"*": "sum"},
+    "terrestrial_carbon": {"*": "sum"},
+    "tree_loss": {"*": "sum"},
+}
+
+# adaptive simplification of the geometries, by slug: locations with more vertices than
+# `max_vertices` are simplified without changing their area by more than `max_area_error`.
+# Area based metrics (sums) are more sensitive to boundary errors than averaged ones.
+METRIC_SIMPLIFY_RULES = {
+    "*": {"max_vertices": 20000, "max_area_error": 0.005},
+    "biodiversity_intactness": {"max_area_error": 0.01},
+    "human_footprint": {"max_area_error": 0.01},
+    "human_impact": {"max_area_error": 0.01},
+    "land_use": {"max_area_error": 0.002},
+    "modis_evi": {"max_area_error": 0.01},
+    "modis_fire": {"max_area_error": 0.002},
+    "protected_areas": {"max_area_error": 0.001},
+    "terrestrial_carbon": {"max_area_error": 0.002},
+    "tree_loss": {"max_area_error": 0.002},
+}
+
+# maximum age in seconds of the stored results reused for unchanged geometries, by slug;
+# time series datasets gain new observations, their results go stale. None never expires.
+METRIC_RESULT_TTL = {
+    "*": None,
+    "modis_evi": 24 * 3600,  # 16-day composites, published as they complete
+    "modis_fire": 3 * 3600,  # near real-time active fires
+    "tree_loss": 7 * 24 * 3600,  # yearly releases
+}
+
+# prior runtime estimates (in seconds) of the metrics, by slug: a fixed cost plus a cost
+# per km2, used to route the jobs to the worker lanes until runtimes have been recorded.
+METRIC_RUNTIME_PRIORS = {
+    "biodiversity_intactness": {"seconds": 10, "seconds_per_km2": 2e-5},
+    "human_footprint": {"seconds": 20, "seconds_per_km2": 5e-5},
+    "human_impact": {"seconds": 10, "seconds_per_km2": 2e-5},
+    "land_use": {"seconds": 15, "seconds_per_km2": 5e-5},
+    "modis_evi": {"seconds": 60, "seconds_per_km2": 2e-4},
+    "modis_fire": {"seconds": 60, "seconds_per_km2": 2e-4},
+    "protected_areas": {"seconds": 5, "seconds_per_km2": 1e-5},
+    "terrestrial_carbon": {"seconds": 10, "seconds_per_km2": 3e-5},
+    "tree_loss": {"seconds": 60, "seconds_per_km2": 2e-4},
+}
+
+CachedInstance = namedtuple("CachedInstance", ["instance", "config_mtime", "init_seconds"])
+
+_instances = {}
+_instance_locks = {}
+_instances_lock = threading.Lock()
+
+# hits, misses, invalidations & initialization time spent/saved, per container.
+instance_stats = Counter()
+
+
 class MetricHandlerException(Exception):
     pass
 
 
 @unique
 class MetricHandler(Enum):
-    """Resolve the metric handler from the `metrics` library."""
-
-    BIODIVERSITY_INTACTNESS = BiodiversityIntactnessMetric
-    HUMAN_FOOTPRINT = HumanFootprint
-    HUMAN_IMPACT = HumanInfluenceEnsembleMetric
-    LAND_USE = LandUseLandCover
-    MODIS_FIRE = ModisFire
-    MODIS_EVI = ModisEvi
-    PROTECTED_AREAS = ProtectedAreas
-    TERRESTRIAL_CARBON = TerrestrialCarbon
-    TREE_LOSS = TreeLoss
+    """
+    Resolve the metric handler from the `metrics` library.
+
+    Handlers are registered by slug & import path, the metric classes (and Earth Engine,
+    geopandas, etc.) are only imported when resolved through `get_handler`.
+    """
+
+    BIODIVERSITY_INTACTNESS = (
+        "biodiversity_intactness",
+        "marapp_metrics.metrics.biodiversity_intactness:BiodiversityIntactnessMetric",
+    )
+    HUMAN_FOOTPRINT = ("human_footprint", "marapp_metrics.metrics.human_footprint:HumanFootprint")
+    HUMAN_IMPACT = (
+        "human_impact",
+        "marapp_metrics.metrics.human_impact:HumanInfluenceEnsembleMetric",
+    )
+    LAND_USE = ("land_use", "marapp_metrics.metrics.land_cover:LandUseLandCover")
+    MODIS_FIRE = ("modis_fire", "marapp_metrics.metrics.modis_fire:ModisFire")
+    MODIS_EVI = ("modis_evi", "marapp_metrics.metrics.modis_evi:ModisEvi")
+    PROTECTED_AREAS = ("protected_areas", "marapp_metrics.metrics.protected_areas:ProtectedAreas")
+    TERRESTRIAL_CARBON = (
+        "terrestrial_carbon",
+        "marapp_metrics.metrics.terrestrial_carbon:TerrestrialCarbon",
+    )
+    TREE_LOSS = ("tree_loss", "marapp_metrics.metrics.tree_loss:TreeLoss")
+
+    def __init__(self, slug, import_path):
+        self.slug = slug
+        self.import_path = import_path
+
+    def load(self):
+        """Import the metric class, cached by the module system."""
+
+        module_name, class_name = self.import_path.split(":")
+        handler = getattr(import_module(module_name), class_name)
+        if handler.slug != self.slug:
+            raise MetricHandlerException(
+                f"Registered slug: {self.slug} does not match handler slug: {handler.slug}"
+            )
+        return handler
 
     @classmethod
     def slugs(cls):
-        return [h.slug for h in cls.handlers()]
+        return [e.slug for e in cls]
 
     @classmethod
     def has_slug(cls, slug_name):
-        return any(h.slug == slug_name for h in cls.handlers())
+        return any(e.slug == slug_name for e in cls)
 
     @classmethod
     def handlers(cls):
-        return (e.value for e in cls)
+        return (e.load() for e in cls)
 
     @classmethod
     def get_handler(cls, slug_name):
-        return next((h for h in cls.handlers() if h.slug == slug_name), None)
+        return next((e.load() for e in cls if e.slug == slug_name), None)
+
+
+def simplify_rule(slug_name):
+    """
+    Adaptive simplification rule of the metric, the default `*` rule updated by its own.
+    """
+    return {**METRIC_SIMPLIFY_RULES["*"], **METRIC_SIMPLIFY_RULES.get(slug_name, {})}
+
+
+def result_ttl(slug_name):
+    """
+    Maximum age in seconds of the stored results of the metric, None when unbounded.
+    """
+    return METRIC_RESULT_TTL.get(slug_name, METRIC_RESULT_TTL["*"])
+
+
+def get_metric_instance(slug_name, config_filepath, **options):
+    """
+    Initialized metric instance, reused across warm invocations of the container.
+    Instances are keyed by slug & constructor options, and rebuilt when the
+    configuration file changes.
+    """
+    key = (slug_name, config_filepath, tuple(sorted(options.items())))
+    config_mtime = os.path.getmtime(config_filepath)
+
+    with _instances_lock:
+        lock = _instance_locks.setdefault(key, threading.Lock())
+
+    with lock:  # initialize each instance once, even with concurrent callers;
+        cached = _instances.get(key)
+        if cached is not None and cached.config_mtime == config_mtime:
+            instance_stats["hits"] += 1
+            instance_stats["saved_seconds"] += cached.init_seconds
+            return cached.instance
+
+        if cached is not None:
+            instance_stats["invalidations"] += 1
+        instance_stats["misses"] += 1
+
+        Handler = MetricHandler.get_handler(slug_name)
+        if Handler is None:
+            raise MetricHandlerException(f"No handler configured for: {slug_name}")
+
+        start = time.perf_counter()
+        instance = Handler(config_filepath=config_filepath, **options)
+        init_seconds = time.perf_counter() - start
+
+        instance_stats["init_seconds"] += init_seconds
+        _instances[key] = CachedInstance(instance, config_mtime, init_seconds)
+
+        return instance
@@ -19,6 +19,7 @@
 
 import json
 import os
+import time
 
 import boto3
 import sentry_sdk
@@ -28,18 +29,39 @@ from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from config import MetricHandler  # noqa
+from helpers.deadline import Deadline  # noqa
 from helpers.logging import get_logger  # noqa
+from helpers.metrics import StageTimer  # noqa
+from helpers.profiling import profiled  # noqa
+from helpers.tiles import tile_grid  # noqa
 from helpers.util import required_keys  # noqa
+from services.fetch_service import FETCH_TIMEOUT  # noqa
+from services.location_service import LocationService  # noqa
+from services.runtime_history import estimate_prior, get_runtime_history  # noqa
+from services.sns_service import publish_batch  # noqa
 
 sns = boto3.client("sns")
 
 SENTRY_DSN = os.environ["SENTRY_DSN"]
 SNS_WORKER_TOPIC_ARN = os.environ["SNS_WORKER_TOPIC_ARN"]
+SNS_WORKER_FAST_TOPIC_ARN = os.environ.get("SNS_WORKER_FAST_TOPIC_ARN")  # fast lane (optional)
+LANE_FAST_MAX_SECONDS = float(os.environ.get("LANE_FAST_MAX_SECONDS", 60))  # estimated runtime
+SNS_MANAGER_TOPIC_ARN = os.environ.get("SNS_MANAGER_TOPIC_ARN")  # required for bulk scheduling
+WORKER_METRICS_PER_EVENT = max(1, int(os.environ.get("WORKER_METRICS_PER_EVENT", 1)))
+TILE_AREA_THRESHOLD_KM2 = float(os.environ.get("TILE_AREA_THRESHOLD_KM2", 0))  # 0 disables tiling
+TILE_TARGET_AREA_KM2 = float(os.environ.get("TILE_TARGET_AREA_KM2", 250000))
+TILE_MAX_COUNT = int(os.environ.get("TILE_MAX_COUNT", 64))
+BULK_PAGE_SIZE = int(os.environ.get("BULK_PAGE_SIZE", 100))
+BULK_RATE_LIMIT = float(os.environ.get("BULK_RATE_LIMIT", 50))  # compute events/s, 0 disables
+BULK_TIME_MARGIN = int(os.environ.get("BULK_TIME_MARGIN", 5000))  # in milliseconds
 
 sentry_sdk.init(dsn=SENTRY_DSN, integrations=[AwsLambdaIntegration()])  # AWS Lambda integration
 
 logger = get_logger("manager-handler")
 
+location_service = LocationService()
+runtime_history = get_runtime_history()
+
 
 def lambda_handler(event, context):
     """
@@ -49,16 +71,51 @@ def lambda_handler(event, context):
         For details, see: https://docs.aws.amazon.com/lambda/latest/dg/python-context-object.html
     :return:
     """
-    logger.debug(f"Received event: {event['Records'][0]['Sns']['MessageId']}")
+    timer = StageTimer({"function": "manager"}, records=len(event["Records"]))
+
+    with profiled("manager"):
+        events = []
+        for record in event["Records"]:
+            logger.debug("Received event: %s", record["Sns"]["MessageId"])
+
+            message = record["Sns"]["Message"]
+            events.append(json.loads(message))
+
+        with timer.stage("prefetch"):
+            prefetch_areas([decoded for decoded in events if "bulk" not in decoded])
+
+        messages = []
+        for decoded in events:
+            if "bulk" in decoded:
+                with timer.stage("bulk"):
+                    handle_bulk(decoded["bulk"], context)  # publishes its own compute events;
+            else:
+                with timer.stage("schedule"):
+                    messages.extend(handle_record(decoded))
+
+        # splitting the workflow into multiple workers, each worker handles one or more metrics.
+        with timer.stage("publish"):
+            published = publish_jobs(messages)
+
+    timer.set(published=published)
+    timer.emit()
+
+    logger.debug(
+        "Successfully sent %s compute events for %s records", published, len(event["Records"])
+    )
+
 
-    message = event["Records"][0]["Sns"]["Message"]
-    decoded = json.loads(message)
+def handle_record(decoded):
+    """
+    Build the worker compute events for a single location.
 
+    :return: A list of (topic ARN, message) tuples, the topic being the lane of the job.
+    """
     required_keys(decoded, ["id", "version"])
 
     resource_id, version = decoded["id"], decoded["version"]
 
-    logger.debug(f"Handling event for resource: {resource_id} and version: {version}")
+    logger.debug("Handling event for resource: %s and version: %s", resource_id, version)
 
     if "resources" in decoded and len(decoded["resources"]):
         compute_resources = [
@@ -67,11 +124,200 @@ def lambda_handler(event, context):
     else:
         compute_resources = MetricHandler.slugs()  # all handlers;
 
-    # splitting the workflow into multiple workers, each worker should handle a single metric computation.
-    for handler in compute_resources:
-        logger.debug(f"Sending compute event for: {handler} and resource: {resource_id}")
+    area_km2 = decoded.get("areaKm2")
+    if TILE_AREA_THRESHOLD_KM2 > 0:  # lanes route the jobs of unknown areas to the default lane;
+        area_km2 = location_area(decoded)
+
+    rows, cols = location_grid(decoded, area_km2)
+    tiles = [None] if rows * cols == 1 else range(rows * cols)
+
+    # metrics grouped by lane, cheap metrics don't wait behind expensive ones
+    job_area_km2 = area_km2 / (rows * cols) if area_km2 is not None else None
+    lanes = {}
+    for slug in compute_resources:
+        lanes.setdefault(worker_lane(slug, job_area_km2), []).append(slug)
+
+    messages = []
+    for topic_arn, slugs in lanes.items():
+        for i in range(0, len(slugs), WORKER_METRICS_PER_EVENT):
+            handlers = slugs[i : i + WORKER_METRICS_PER_EVENT]
+
+            logger.debug("Sending compute event for: %s and resource: %s", handlers, resource_id)
+
+            if len(handlers) == 1:
+                worker = {"handler": handlers[0]}
+            else:
+                worker = {"handlers": handlers}  # multi-metric worker;
+
+            for tile in tiles:
+                if tile is not None:
+                    worker = {**worker, "tile": {"index": tile, "grid": [rows, cols]}}  # tile job;
+                decoded["meta"] = {"worker": worker}
+                messages.append((topic_arn, json.dumps(decoded)))
+
+    return messages
+
+
+def worker_lane(slug, area_km2=None):
+    """
+    Topic of the worker lane of a job: jobs estimated to run within `LANE_FAST_MAX_SECONDS`,
+    from the recorded runtimes of the metric, are sent to the fast lane when configured.
+    Jobs of locations of unknown area can't be estimated, they use the default lane.
+    """
+    if not SNS_WORKER_FAST_TOPIC_ARN or area_km2 is None:
+        return SNS_WORKER_TOPIC_ARN
+
+    if runtime_history is not None:
+        seconds = runtime_history.estimate(slug, area_km2)
+    else:
+        seconds = estimate_prior(slug, area_km2)
+
+    return SNS_WORKER_FAST_TOPIC_ARN if seconds <= LANE_FAST_MAX_SECONDS else SNS_WORKER_TOPIC_ARN
+
+
+def publish_jobs(messages):
+    """
+    Send the compute events to the topics of their lanes.
+
+    :param messages: A list of (topic ARN, message) tuples.
+    :return: The number of published events.
+    """
+    topics = {}
+    for topic_arn, message in messages:
+        topics.setdefault(topic_arn, []).append(message)
+
+    return sum(publish_batch(sns, topic_arn, batch) for topic_arn, batch in topics.items())
+
+
+def handle_bulk(bulk, context):
+    """
+    Schedule the computations for all the locations matching a filter (all locations when
+    omitted), paging through the locations API. When the invocation is about to time out,
+    a continuation event with the cursor of the next page is sent to the manager topic.
+
+    Bulk event::
+
+        {"bulk": {"filter": "<filter>", "resources": ["<slug>"], "cursor": "<cursor>"}}
+    """
+    filters, resources = bulk.get("filter"), bulk.get("resources")
+    cursor, scheduled = bulk.get("cursor"), bulk.get("scheduled", 0)
+
+    logger.debug("Handling bulk event for filter: %s from cursor: %s", filters, cursor)
+
+    deadline = Deadline.from_context(context, BULK_TIME_MARGIN)
+    start, sent = time.monotonic(), 0
+    while True:
+        if deadline.expired():
+            continue_bulk({**bulk, "cursor": cursor, "scheduled": scheduled})
+            return
+
+        documents, next_cursor = location_service.get_page(
+            select_fields=["id", "version", "areaKm2"],
+            filters=filters,
+            page_size=BULK_PAGE_SIZE,
+            cursor=cursor,
+            timeout=deadline.budget(FETCH_TIMEOUT),
+        )
+
+        messages = []
+        for document in documents:
+            decoded = {k: document.get(k) for k in ["id", "version", "areaKm2"]}
+            if resources:
+                decoded["resources"] = resources
+            messages.extend(handle_record(decoded))
+
+        sent += publish_jobs(messages)
+        scheduled += len(documents)
+
+        logger.debug("Scheduled %s locations for filter: %s", scheduled, filters)
+
+        if not next_cursor:
+            break
+        cursor = next_cursor
+
+        if BULK_RATE_LIMIT > 0:  # pace the compute events sent to the workers;
+            delay = sent / BULK_RATE_LIMIT - (time.monotonic() - start)
+            remaining = deadline.remaining()  # continued by the next invocation past the margin;
+            if remaining is not None:
+                delay = min(delay, remaining)
+            time.sleep(max(0.0, delay))
+
+    logger.debug("Successfully scheduled %s locations for filter: %s", scheduled, filters)
+
+
+def continue_bulk(bulk):
+    """
+    Send the continuation of a bulk event, resumed from its cursor by the next invocation.
+    """
+    if not SNS_MANAGER_TOPIC_ARN:
+        raise ValueError("Required parameters: SNS_MANAGER_TOPIC_ARN")
+
+    logger.debug("Sending bulk continuation event from cursor: %s", bulk["cursor"])
+
+    sns.publish(TopicArn=SNS_MANAGER_TOPIC_ARN, Message=json.dumps({"bulk": bulk}))
+
+
+def prefetch_areas(events):
+    """
+    Retrieve the areas missing from the location events of a multi-record event at once,
+    instead of one request per event when splitting the locations in tiles or routing the
+    jobs to lanes.
+    """
+    if TILE_AREA_THRESHOLD_KM2 <= 0 and not SNS_WORKER_FAST_TOPIC_ARN:
+        return
+
+    missing = [decoded for decoded in events if "id" in decoded and "areaKm2" not in decoded]
+    if len(missing) < 2:
+        return
+
+    try:
+        documents = location_service.get_many(
+            [decoded["id"] for decoded in missing],
+            select_fields=["id", "version", "areaKm2"],
+            raise_error=False,
+            versions=[decoded.get("version") for decoded in missing],
+        )
+    except Exception as e:  # retrieved one by one by `location_area`;
+        logger.warning("Failed to prefetch areas for %s resources %s", len(missing), e)
+        return
+
+    for decoded, document in zip(missing, documents):
+        if document is not None and document.get("areaKm2") is not None:
+            decoded["areaKm2"] = document["areaKm2"]
+
+
+def location_area(decoded):
+    """
+    Area of the location, from the event or retrieved from the API, None when unknown.
+    """
+    area_km2 = decoded.get("areaKm2")
+    if area_km2 is None:
+        try:
+            document = location_service.get_by_id(
+                resource_id=decoded["id"], select_fields=["id", "version", "areaKm2"]
+            )
+            area_km2 = document.get("areaKm2")
+        except Exception as e:
+            logger.warning("Failed to retrieve area for resource: %s %s", decoded["id"], e)
+
+    return area_km2
+
+
+def location_grid(decoded, area_km2=None):
+    """
+    Grid splitting the location in tiles, each tile computed by a separate worker and
+    merged by the reducer. Locations below the area threshold are not split.
+
+    :return: A (rows, cols) tuple.
+    """
+    if TILE_AREA_THRESHOLD_KM2 <= 0:
+        return 1, 1
+
+    if area_km2 is None or area_km2 <= TILE_AREA_THRESHOLD_KM2:
+        return 1, 1
+
+    grid = tile_grid(area_km2, TILE_TARGET_AREA_KM2, TILE_MAX_COUNT)
 
-        decoded["meta"] = {"worker": {"handler": handler}}
-        sns.publish(TopicArn=SNS_WORKER_TOPIC_ARN, Message=json.dumps(decoded))
+    logger.debug("Splitting resource: %s of %s km2 in %s tiles", decoded["id"], area_km2, grid)
 
-    logger.debug(f"Successfully handled event for resource: {resource_id} and version: {version}")
+    return grid
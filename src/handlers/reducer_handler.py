@@ -0,0 +1,174 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import json
+import os
+from urllib.parse import urlparse
+
+import boto3
+import sentry_sdk
+import sys
+from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from config import METRIC_MERGE_RULES  # noqa
+from helpers.deadline import Deadline  # noqa
+from helpers.logging import get_logger  # noqa
+from helpers.merge import merge_metrics  # noqa
+from helpers.storage import get_storage  # noqa
+from helpers.util import required_keys  # noqa
+from services.ledger import get_ledger  # noqa
+from services.payload_store import encode_payload, get_payload_store  # noqa
+
+sns = boto3.client("sns")
+
+SENTRY_DSN = os.environ["SENTRY_DSN"]
+SNS_RESULT_TOPIC_ARN = os.environ["SNS_RESULT_TOPIC_ARN"]
+TILE_STORE_URL = os.environ.get("TILE_STORE_URL", "file:///tmp/tile-store")
+
+if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") and urlparse(TILE_STORE_URL).scheme != "s3":
+    # the tiles of a location are stored by different invocations, lost with their containers;
+    raise ValueError(f"TILE_STORE_URL must be an s3:// store in AWS Lambda: {TILE_STORE_URL}")
+
+sentry_sdk.init(dsn=SENTRY_DSN, integrations=[AwsLambdaIntegration()])  # AWS Lambda integration
+
+logger = get_logger("reducer-handler")
+
+tile_store = get_storage(TILE_STORE_URL)
+payload_store = get_payload_store()
+ledger = get_ledger()
+
+
+def lambda_handler(event, context):
+    """
+    :param event:  AWS Lambda uses this parameter to pass in event data to the handler.
+        For details, see: https://docs.aws.amazon.com/lambda/latest/dg/with-sns.html
+    :param context: AWS Lambda uses this parameter to provide runtime information to your handler.
+        For details, see: https://docs.aws.amazon.com/lambda/latest/dg/python-context-object.html
+    :return:
+    """
+    deadline = Deadline.from_context(context)
+
+    for record in event["Records"]:
+        logger.debug("Received event: %s", record["Sns"]["MessageId"])
+
+        handle_record(record, deadline)
+
+
+def handle_record(record, deadline=None):
+    """
+    Store the partial result of a tile, once the results of all the tiles of the location
+    are stored, merge & publish the metric.
+
+    The merge is claimed in the ledger, a conditional write: when the last tiles are
+    stored concurrently, a single invocation publishes the metric. The claim expires with
+    the invocation, so the retries of a killed invocation merge the tiles. Tiles delivered
+    again once merged are discarded.
+
+    :param deadline: Optional Deadline of the invocation, bounding the merge claim.
+    """
+    deadline = deadline or Deadline()
+    message = record["Sns"]["Message"]
+    event = json.loads(message)
+    decoded = payload_store.unwrap(event) if payload_store is not None else event
+
+    required_keys(decoded, ["slug", "location", "version", "metric", "tile.index", "tile.count"])
+
+    slug, resource_id, version = decoded["slug"], decoded["location"], decoded["version"]
+    index, count = decoded["tile"]["index"], decoded["tile"]["count"]
+
+    logger.debug("Handling tile: %s/%s of %s for resource: %s", index, count, slug, resource_id)
+
+    if ledger is not None and ledger.reduced(resource_id, version, slug):
+        logger.info("Discarding tile: %s of merged %s for resource: %s", index, slug, resource_id)
+        delete_payload(event)
+        return
+
+    prefix = f"{resource_id}/{version}/{slug}/"
+    tile_key = f"{prefix}{index}.json"
+    partial = {"metric": decoded["metric"], "areaKm2": decoded.get("areaKm2", 0.0)}
+    tile_store.put(tile_key, json.dumps(partial).encode("utf-8"))
+
+    keys = tile_store.list(prefix)
+    if len(keys) < count:
+        if ledger is not None and ledger.reduced(resource_id, version, slug):
+            # merged meanwhile, completed before the tiles are deleted
+            tile_store.delete(tile_key)
+        else:
+            logger.debug(
+                "Waiting for %s tiles of %s for resource: %s", count - len(keys), slug, resource_id
+            )
+        delete_payload(event)  # the partial result is kept in the tile store;
+        return
+
+    lease = deadline.time_left()
+    if ledger is not None and not ledger.claim_reduction(resource_id, version, slug, lease):
+        logger.debug("Tiles of %s for resource: %s merged by another invocation", slug, resource_id)
+        delete_payload(event)
+        return
+
+    try:
+        publish_merged(slug, resource_id, version, keys)
+    except Exception:
+        if ledger is not None:
+            ledger.release_reduction(resource_id, version, slug)  # let the retries through;
+        raise
+
+    if ledger is not None:
+        ledger.complete_reduction(resource_id, version, slug)
+    delete_payload(event)  # kept until published, unwrapped again by the retries;
+    for key in keys:
+        tile_store.delete(key)
+
+    logger.debug("Successfully merged %s tiles of %s for resource: %s", count, slug, resource_id)
+
+
+def delete_payload(event):
+    """
+    Delete the stored payload of the event, if any.
+    """
+    if payload_store is not None:
+        payload_store.delete(event)
+
+
+def publish_merged(slug, resource_id, version, keys):
+    """
+    Merge the partial results of the tiles and publish the metric.
+    """
+    partials = [json.loads(tile_store.get(key)) for key in keys]
+    metric = merge_metrics(
+        [(p["metric"], p["areaKm2"]) for p in partials], METRIC_MERGE_RULES.get(slug)
+    )
+
+    payload = {
+        "slug": slug,
+        "location": resource_id,
+        "metric": metric,
+        "version": version,
+    }
+
+    logger.debug("Sending merged metric result event for %s and resource: %s", slug, resource_id)
+
+    if payload_store is not None:
+        message = payload_store.wrap(payload)
+    else:
+        message = encode_payload(payload).decode("utf-8")
+
+    sns.publish(TopicArn=SNS_RESULT_TOPIC_ARN, Message=message)
@@ -19,30 +19,88 @@
 
 import json
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 import boto3
 import sentry_sdk
 import sys
-from geopandas import GeoDataFrame
 from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from config import MetricHandler, MetricHandlerException  # noqa
+from config import (  # noqa
+    MetricHandler,
+    MetricHandlerException,
+    get_metric_instance,
+    instance_stats,
+    result_ttl,
+    simplify_rule,
+)
+from helpers.deadline import Deadline, DeadlineExceeded, cancel_before, cancellable  # noqa
+from helpers.geometry import features_to_geodataframe, vertex_count  # noqa
 from helpers.logging import get_logger  # noqa
+from helpers.metrics import StageTimer, size_bucket, timed  # noqa
+from helpers.profiling import profiled, reset_peak_rss, resource_usage  # noqa
+from helpers.simplify import simplify_geometries  # noqa
+from helpers.throttle import AdaptiveConcurrencyLimiter, CircuitBreaker  # noqa
+from helpers.throttle import ConcurrencyLimitExceeded  # noqa
+from helpers.tiles import clip_to_tile  # noqa
 from helpers.util import abspath, required_keys  # noqa
+from services.fetch_service import FETCH_TIMEOUT  # noqa
+from services.ledger import get_ledger  # noqa
 from services.location_service import LocationService  # noqa
+from services.payload_store import encode_payload, get_payload_store  # noqa
+from services.result_store import config_hash, geometry_hash, get_result_store  # noqa
+from services.runtime_history import get_runtime_history  # noqa
+from services.sns_service import publish_batch  # noqa
 
 sns = boto3.client("sns")
 
 SENTRY_DSN = os.environ["SENTRY_DSN"]
 SNS_RESULT_TOPIC_ARN = os.environ["SNS_RESULT_TOPIC_ARN"]
+SNS_REDUCER_TOPIC_ARN = os.environ.get("SNS_REDUCER_TOPIC_ARN")  # required for tile jobs
+SNS_WORKER_TOPIC_ARN = os.environ.get("SNS_WORKER_TOPIC_ARN")  # required for continuations
+FETCH_STREAMING = os.environ.get("FETCH_STREAMING", "false").lower() == "true"
+WORKER_CONCURRENCY = max(1, int(os.environ.get("WORKER_CONCURRENCY", 4)))  # metrics run at once
+WORKER_TIME_MARGIN = int(os.environ.get("WORKER_TIME_MARGIN", 60000))  # in ms, kept to checkpoint
+WORKER_MAX_CONTINUATIONS = int(os.environ.get("WORKER_MAX_CONTINUATIONS", 3))
+WORKER_SPLIT_CONTINUATIONS = os.environ.get("WORKER_SPLIT_CONTINUATIONS", "false").lower() == "true"
+EE_CONCURRENCY = max(1, int(os.environ.get("EE_CONCURRENCY", WORKER_CONCURRENCY)))  # metrics
+EE_RETRIES = int(os.environ.get("EE_RETRIES", 1))  # re-runs of metrics exceeding quotas
+WORKER_VERSION_PROBE = os.environ.get("WORKER_VERSION_PROBE", "true").lower() == "true"
+ADAPTIVE_SIMPLIFY = os.environ.get("ADAPTIVE_SIMPLIFY", "false").lower() == "true"
 
 sentry_sdk.init(dsn=SENTRY_DSN, integrations=[AwsLambdaIntegration()])  # AWS Lambda integration
 
 logger = get_logger("worker-handler")
 
 fetch_service = LocationService()
+result_store = get_result_store()
+payload_store = get_payload_store()
+ledger = get_ledger()
+runtime_history = get_runtime_history()
+
+METRIC_CONFIG_FILEPATH = abspath(__file__, "../earthengine.yaml")
+METRIC_OPTIONS = {"grid": True, "simplify": True, "best_effort": False}
+
+CONTINUATION_GRID = [2, 2]  # tiles of a location whose metrics ran out of time
+
+# Earth Engine errors of exceeded quotas, run again at a lowered concurrency, and of an outage
+EE_QUOTA_ERROR = re.compile(r"too many concurrent|quota|rate limit|\b429\b", re.IGNORECASE)
+EE_UNAVAILABLE_ERROR = re.compile(
+    r"internal error|service unavailable|backend error|\b50[234]\b", re.IGNORECASE
+)
+
+# shared by the threads and the warm invocations of the container
+ee_concurrency = AdaptiveConcurrencyLimiter(EE_CONCURRENCY)
+ee_breaker = CircuitBreaker("earthengine")
+
+# Earth Engine requests of the metrics library, checking the cancellation of the metric
+EE_CANCELLABLE_CALLS = ["computeValue", "getInfo", "getList"]
 
 
 def lambda_handler(event, context):
@@ -53,66 +111,583 @@ def lambda_handler(event, context):
         For details, see: https://docs.aws.amazon.com/lambda/latest/dg/python-context-object.html
     :return:
     """
-    logger.debug(f"Received event: {event['Records'][0]['Sns']['MessageId']}")
+    message_id = event["Records"][0]["Sns"]["MessageId"]
+
+    logger.debug("Received event: %s", message_id)
 
     message = event["Records"][0]["Sns"]["Message"]
     decoded = json.loads(message)
 
-    required_keys(decoded, ["id", "version", "meta.worker.handler"])
+    required_keys(decoded, ["id", "version", "meta.worker"])
+
+    resource_id, version = decoded["id"], decoded["version"]
+    handlers = worker_handlers(decoded["meta"]["worker"])
 
-    resource_id, version, handler = (
-        decoded["id"],
-        decoded["version"],
-        decoded["meta"]["worker"]["handler"],
+    logger.debug(
+        "Handling event: %s for resource: %s and version: %s", handlers, resource_id, version
     )
 
-    logger.debug(f"Handling event: {handler} for resource: {resource_id} and version: {version}")
+    # resolve the metric handler classes before doing any expensive work
+    metric_handlers = [resolve_handler(h) for h in handlers]
 
-    document = fetch_service.get_by_id(
-        resource_id=resource_id, select_fields=["id", "geojson", "version", "areaKm2"]
-    )  # fetch only required fields;
+    deadline = Deadline.from_context(context, WORKER_TIME_MARGIN)
 
-    required_keys(document, ["id", "geojson", "version", "areaKm2"])
+    # the claim expires with the invocation, the retries of a killed invocation get through
+    if ledger is not None and not ledger.claim_message(message_id, deadline.time_left()):
+        logger.info("Skipping duplicate event: %s", message_id)
+        return
 
-    if version != document["version"]:
-        raise ValueError("Version mismatch: document version does not match requested version")
+    timer = StageTimer({"function": "worker"}, location=resource_id, version=version)
+    # the function & its memory size, to right-size the functions from the profiles
+    timer.set(
+        functionName=getattr(context, "function_name", None),
+        memoryLimit=int(getattr(context, "memory_limit_in_mb", 0) or 0) or None,
+    )
+    reset_peak_rss()  # peak of this invocation, not of the warm container;
+
+    try:
+        with profiled(f"worker-{resource_id}"):
+            handle_location(decoded, metric_handlers, timer, deadline)
+    except Exception:
+        if ledger is not None:
+            ledger.release_message(message_id)  # let the retries of the event through;
+        raise
+
+    if ledger is not None:
+        ledger.complete_message(message_id)
+
+    logger.debug(
+        "Successfully handled event %s for resource: %s and version: %s",
+        handlers,
+        resource_id,
+        version,
+    )
+
+
+def handle_location(decoded, metric_handlers, timer, deadline=None):
+    """
+    Compute & publish the metrics of the location, metrics not completed before the
+    deadline are sent to a continuation event.
+
+    Stale versions, and metrics already computed or being computed for the version,
+    are skipped before the location is downloaded.
+    """
+    resource_id, version = decoded["id"], decoded["version"]
+    tile = decoded["meta"]["worker"].get("tile")
+    deadline = deadline or Deadline()
+
+    if WORKER_VERSION_PROBE and is_stale(resource_id, version, deadline, timer):
+        logger.info("Skipping stale event for resource: %s and version: %s", resource_id, version)
+        timer.set(stale=True)
+        return
+
+    if ledger is not None:
+        lease = deadline.time_left()
+        claimed = [
+            H
+            for H in metric_handlers
+            if ledger.claim_metric(resource_id, version, H.slug, tile, lease)
+        ]
+        if len(claimed) < len(metric_handlers):
+            skipped = [H.slug for H in metric_handlers if H not in claimed]
+            logger.info("Skipping claimed metrics: %s for resource: %s", skipped, resource_id)
+            timer.set(skipped=len(skipped))
+        if not claimed:
+            return
+        metric_handlers = claimed
+
+    try:
+        deferred, failures = compute_location(decoded, metric_handlers, timer, deadline)
+    except Exception:
+        release_metrics(decoded, [H.slug for H in metric_handlers])
+        raise
+    finally:
+        if runtime_history is not None:  # the runtimes of all metrics written at once;
+            runtime_history.flush()
+
+    release_metrics(decoded, [*deferred, *failures])  # computed again by continuations & retries;
+    pending = {*deferred, *failures}
+    complete_metrics(decoded, [H.slug for H in metric_handlers if H.slug not in pending])
+    timer.set(deferred=len(deferred))
+
+    if deferred:
+        for slug in continue_location(decoded, deferred):
+            failures[slug] = DeadlineExceeded(f"Ran out of time computing: {slug}")
+
+    if len(failures) == 1 and len(metric_handlers) == 1:
+        raise next(iter(failures.values()))
+    if failures:
+        raise MetricHandlerException(
+            f"Failed to compute metrics: {', '.join(failures)} for resource: {resource_id}"
+        )
+
+
+def compute_location(decoded, metric_handlers, timer, deadline):
+    """
+    Load the location, then compute & publish its metrics.
+
+    :return: A tuple of the deferred metrics and the failures, see `run_metrics`.
+    """
+    resource_id, version = decoded["id"], decoded["version"]
+
+    # the location & its GeoDataFrame are shared by all metrics
+    document, gdf = load_location(resource_id, version, timer, deadline.budget(FETCH_TIMEOUT))
+
+    if deadline.expired():
+        return {Handler.slug: False for Handler in metric_handlers}, {}
+
+    tile = decoded["meta"]["worker"].get("tile")
+    if tile is not None:
+        required_keys(tile, ["index", "grid"])
+
+        # compute only the part of the location within the tile, merged by the reducer
+        gdf, tile_area_km2 = clip_to_tile(gdf, tile["grid"], tile["index"], document["areaKm2"])
+        document = {**document, "areaKm2": tile_area_km2}
 
-    # resolve the metric handler class
+        logger.debug(
+            "Computing tile: %s of %s km2 for resource: %s", tile, tile_area_km2, resource_id
+        )
+
+        if gdf.empty:  # nothing to compute, the reducer still expects a result for the tile;
+            for Handler in metric_handlers:
+                payload = {"slug": Handler.slug, "location": resource_id, "metric": None}
+                publish_result(tile_payload({**payload, "version": version}, tile, 0.0))
+            return {}, {}
+
+    vertices = vertex_count(gdf)
+    timer.dimensions["sizeBucket"] = size_bucket(vertices)
+    timer.set(areaKm2=document["areaKm2"], vertices=vertices, features=len(gdf), tile=tile)
+
+    geometry_key = geometry_hash(gdf, document["areaKm2"]) if result_store else None
+
+    prepared = prepare_geometries(metric_handlers, gdf, timer) if ADAPTIVE_SIMPLIFY else None
+
+    return run_metrics(
+        metric_handlers, gdf, document, geometry_key, tile, timer, deadline, prepared
+    )
+
+
+def prepare_geometries(metric_handlers, gdf, timer=None):
+    """
+    Simplify the location for each metric according to its rule, once per distinct rule.
+
+    :return: A dict of slug to a tuple of the GeoDataFrame and the simplification report.
+    """
+    prepared, simplified = {}, {}
+    with timed(timer, "simplify"):
+        for Handler in metric_handlers:
+            rule = simplify_rule(Handler.slug)
+            key = tuple(sorted(rule.items()))
+            if key not in simplified:
+                simplified[key] = simplify_geometries(gdf, **rule)
+            prepared[Handler.slug] = simplified[key]
+    return prepared
+
+
+def is_stale(resource_id, version, deadline, timer=None):
+    """
+    Probe the current version of the location, fetching only its `id` & `version`.
+
+    :return: True if the location has a newer version than the requested one.
+    :raises ValueError: When the requested version is not (yet) the current version.
+    """
+    with timed(timer, "probe"):
+        document = fetch_service.get_by_id(
+            resource_id=resource_id,
+            select_fields=["id", "version"],
+            timeout=deadline.budget(FETCH_TIMEOUT),
+        )  # revalidated through its ETag;
+
+    if document["version"] == version:
+        return False
+    if document["version"] > version:
+        return True
+    raise ValueError("Version mismatch: document version does not match requested version")
+
+
+def release_metrics(decoded, slugs):
+    """
+    Release the ledger claims of the metrics.
+    """
+    if ledger is None:
+        return
+    tile = decoded["meta"]["worker"].get("tile")
+    for slug in slugs:
+        ledger.release_metric(decoded["id"], decoded["version"], slug, tile)
+
+
+def complete_metrics(decoded, slugs):
+    """
+    Mark the metrics published, skipped by the events delivered later for the version.
+    """
+    if ledger is None:
+        return
+    tile = decoded["meta"]["worker"].get("tile")
+    for slug in slugs:
+        ledger.complete_metric(decoded["id"], decoded["version"], slug, tile)
+
+
+def worker_handlers(worker):
+    """
+    Read the metric slugs from the worker meta, either a single `handler`
+    or a list of `handlers` computed against the same location.
+    """
+    if "handlers" in worker and len(worker["handlers"]):
+        return list(dict.fromkeys(worker["handlers"]))  # drop duplicates, keep order;
+    if "handler" in worker:
+        return [worker["handler"]]
+    raise ValueError("Required parameters: meta.worker.handler")
+
+
+def resolve_handler(handler):
+    """
+    Resolve the metric handler class.
+    """
     Handler = MetricHandler.get_handler(handler)
     if Handler is None:
         raise MetricHandlerException(f"No handler configured for: {handler}")
+    return Handler
 
-    # instantiate the metric object
-    instance = Handler(
-        config_filepath=abspath(__file__, "../earthengine.yaml"),
-        grid=True,
-        simplify=True,
-        best_effort=False,
-    )
 
-    # create a geopandas GeoDataFrame from the geojson shape
-    gdf = GeoDataFrame.from_features(document["geojson"]["features"])
+def load_location(resource_id, version, timer=None, timeout=None):
+    """
+    Fetch & validate the location for the requested version.
+
+    :param timeout: Optional request timeout in seconds, bounded by the invocation deadline.
+    :return: A tuple of the location document and its GeoDataFrame.
+    """
+    select_fields = ["id", "geojson", "version", "areaKm2"]  # fetch only required fields;
+
+    if FETCH_STREAMING or fetch_service.location_format != "json":
+        # decode the geometries incrementally or from a binary encoding, bounded memory
+        document, gdf = fetch_service.get_geodataframe_by_id(
+            resource_id=resource_id, select_fields=select_fields, timer=timer, timeout=timeout
+        )
+        required_keys(document, ["id", "version", "areaKm2"])
+    else:
+        document = fetch_service.get_by_id(
+            resource_id=resource_id,
+            select_fields=select_fields,
+            version=version,
+            timer=timer,
+            timeout=timeout,
+        )  # served from cache when already retrieved;
+        required_keys(document, select_fields)
+
+        # create a geopandas GeoDataFrame from the geojson shape
+        with timed(timer, "geodataframe"):
+            gdf = features_to_geodataframe(document["geojson"]["features"])
 
-    logger.debug(f"Running {instance.slug} computations for resource: {resource_id}")
+    if version != document["version"]:
+        raise ValueError("Version mismatch: document version does not match requested version")
 
-    # compute the metric
-    metric = instance.measure(gdf, area_km2=document["areaKm2"])
+    return document, gdf
 
-    logger.debug(f"Computed {instance.slug} metric for resource: {resource_id} {metric}")
+
+def run_metrics(
+    metric_handlers,
+    gdf,
+    document,
+    geometry_key=None,
+    tile=None,
+    timer=None,
+    deadline=None,
+    prepared=None,
+):
+    """
+    Compute & publish the metrics concurrently, most of the time is spent waiting on
+    remote Earth Engine reductions. A failing metric does not prevent the others from
+    being published.
+
+    Metrics are not started once the deadline is reached, and those still running at the
+    deadline are cancelled before their next Earth Engine request, their results are not
+    published; both are deferred to a continuation. No metric thread outlives the call.
+
+    :param prepared: Optional dict of slug to the simplified GeoDataFrame of the metric
+        and its simplification report, see `prepare_geometries`.
+    :return: A tuple of the deferred metrics, as a dict of slug to whether the metric was
+        started, and the failures, as a dict of slug to exception.
+    """
+    resource_id = document["id"]
+    timer = timer or StageTimer({"function": "worker"})
+    deadline = deadline or Deadline()
+    stopped, started = threading.Event(), set()
+    cancel_earthengine_requests()
+
+    def run(Handler):
+        if stopped.is_set() or deadline.expired():
+            raise DeadlineExceeded(f"No time left to compute: {Handler.slug}")
+        started.add(Handler.slug)
+
+        metric_timer = timer.child({"slug": Handler.slug}, failed=True)
+        try:
+            with profiled(f"{Handler.slug}-{resource_id}"), resource_usage(metric_timer):
+                # each metric works on an isolated copy of the GeoDataFrame
+                metric_gdf, report = (prepared or {}).get(Handler.slug, (gdf, None))
+                with cancellable(stopped):
+                    payload = compute_metric(
+                        Handler,
+                        metric_gdf.copy(),
+                        document,
+                        geometry_key,
+                        metric_timer,
+                        report,
+                        deadline,
+                    )
+                if tile is not None:
+                    payload = tile_payload(payload, tile, document["areaKm2"])
+                if stopped.is_set():  # too late, deferred to the continuation;
+                    raise DeadlineExceeded(f"Ran out of time computing: {Handler.slug}")
+                with metric_timer.stage("publish"):
+                    publish_result(payload)
+            metric_timer.set(failed=False)
+        finally:
+            metric_timer.emit()  # one record per metric;
+
+    deferred, failures = {}, {}
+
+    def collect(future, slug):
+        try:
+            future.result()
+        except (DeadlineExceeded, ConcurrencyLimitExceeded):  # no time left to wait for a slot;
+            deferred[slug] = slug in started
+        except Exception as e:
+            logger.error("Failed to compute %s metric for resource: %s %s", slug, resource_id, e)
+            if len(metric_handlers) > 1:
+                sentry_sdk.capture_exception(e)  # report each failure, not only the summary;
+            failures[slug] = e
+
+    executor = ThreadPoolExecutor(max_workers=min(WORKER_CONCURRENCY, len(metric_handlers)))
+    futures = {executor.submit(run, Handler): Handler.slug for Handler in metric_handlers}
+    try:
+        for future in as_completed(futures, timeout=deadline.remaining()):
+            collect(future, futures.pop(future))
+    except FutureTimeoutError:
+        stopped.set()
+        for future, slug in futures.items():
+            if future.done():
+                collect(future, slug)
+            else:
+                future.cancel()  # running metrics stop at their next cancellation check;
+                deferred[slug] = slug in started
+
+        logger.warning(
+            "Ran out of time computing metrics: %s for resource: %s", list(deferred), resource_id
+        )
+    finally:
+        # joined, so no metric keeps an Earth Engine slot or a cached instance past the call
+        executor.shutdown(wait=True)
+
+    return deferred, failures
+
+
+def cancel_earthengine_requests():
+    """
+    Check the cancellation of the metric before each Earth Engine request of the metrics
+    library, a metric making several requests. Patched once per container.
+    """
+    try:
+        import ee
+    except ImportError:  # e.g. local runs of fake metrics;
+        return
+    for name in EE_CANCELLABLE_CALLS:
+        if hasattr(ee.data, name):
+            cancel_before(ee.data, name)
+
+
+def compute_metric(
+    Handler, gdf, document, geometry_key=None, timer=None, simplification=None, deadline=None
+):
+    """
+    Compute a single metric for the location and build the result payload.
+    Results already computed for the same geometry & configuration are reused.
+
+    :param simplification: Optional report of the adaptive simplification of the
+        geometries, sent along the metric.
+    :param deadline: Optional Deadline, bounding the waits of the rate limiter.
+    """
+    resource_id, version, slug = document["id"], document["version"], Handler.slug
+
+    store_key, metric = None, None
+    if result_store is not None and geometry_key is not None:
+        options = metric_options(simplification)
+        if options is not METRIC_OPTIONS:  # the result depends on the simplification rule;
+            options = {**options, **simplify_rule(slug)}
+        store_key = result_store.key(
+            slug, geometry_key, config_hash(METRIC_CONFIG_FILEPATH, slug, **options)
+        )
+        metric = result_store.get(store_key, max_age=result_ttl(slug))
+
+    if timer is not None:
+        timer.set(stored=metric is not None)
+
+    if metric is not None:
+        logger.debug("Reusing stored %s metric for resource: %s %s", slug, resource_id, store_key)
+    else:
+        # instantiate the metric object, reused across warm invocations
+        options = metric_options(simplification)
+        instance = get_metric_instance(slug, METRIC_CONFIG_FILEPATH, **options)
+
+        logger.debug("Running %s computations for resource: %s", slug, resource_id)
+        logger.debug("Metric instance stats: %s", instance_stats)
+
+        # compute the metric, convert namedtuple to dict
+        start = time.perf_counter()
+        with timed(timer, "measure"):
+            metric = measure_metric(instance, gdf, document["areaKm2"], deadline)._asdict()
+
+        logger.debug("Computed %s metric for resource: %s %s", slug, resource_id, metric)
+
+        if runtime_history is not None:  # estimates the cost of the next jobs of the metric;
+            runtime_history.record(slug, document["areaKm2"], time.perf_counter() - start)
+
+        if store_key is not None:
+            result_store.put(store_key, metric)
 
     payload = {
-        "slug": instance.slug,
+        "slug": slug,
         "location": resource_id,
-        "metric": metric._asdict(),  # convert namedtuple to dict
+        "metric": metric,
         "version": version,
     }
 
     required_keys(payload, ["slug", "location", "metric", "version"])
 
-    logger.debug(f"Sending metric result event for {instance.slug} and resource: {resource_id}")
+    if simplification is not None:
+        payload["simplification"] = simplification
+        if timer is not None:
+            timer.set(
+                simplifiedVertices=simplification["simplifiedVertices"],
+                areaError=simplification["areaError"],
+            )
+
+    return payload
 
-    sns.publish(TopicArn=SNS_RESULT_TOPIC_ARN, Message=json.dumps(payload))
+
+def metric_options(simplification=None):
+    """
+    Constructor options of the metric instance. The metrics simplify the geometries with
+    their fixed tolerance, unless the location was already simplified adaptively: the
+    adaptive pass leaves locations within the vertex budget untouched.
+
+    :param simplification: Optional report of the adaptive simplification of the metric.
+    """
+    if simplification is not None and simplification["tolerance"] > 0:
+        return {**METRIC_OPTIONS, "simplify": False}
+    return METRIC_OPTIONS
+
+
+def measure_metric(instance, gdf, area_km2, deadline=None):
+    """
+    Run the Earth Engine reductions of the metric, under the adaptive concurrency cap of
+    the container and guarded by the Earth Engine circuit breaker: metrics fail fast while
+    Earth Engine is unhealthy, and the event is retried later.
+
+    The reductions are run by the metrics library, so the cap applies to whole metrics:
+    a metric failing on exceeded quotas lowers the cap, and is run again from its first
+    reduction up to `EE_RETRIES` times.
+    """
+    deadline = deadline or Deadline()
+
+    for attempt in range(EE_RETRIES + 1):
+        ee_breaker.allow()
+        ee_concurrency.acquire(max_wait=deadline.remaining())
+        try:
+            result = instance.measure(gdf, area_km2=area_km2)
+        except Exception as e:
+            if EE_QUOTA_ERROR.search(str(e)):
+                ee_concurrency.throttled()
+                if attempt < EE_RETRIES and not deadline.expired():
+                    logger.warning(
+                        "Running again %s exceeding quotas: %s", type(instance).__name__, e
+                    )
+                    continue
+            elif isinstance(e, OSError) or EE_UNAVAILABLE_ERROR.search(str(e)):
+                ee_breaker.failed()
+            raise
+        finally:
+            ee_concurrency.release()
+
+        ee_concurrency.succeeded()
+        ee_breaker.succeeded()
+        return result
+
+
+def continue_location(decoded, deferred):
+    """
+    Send the continuation events of the metrics deferred to a new invocation: those never
+    started are sent as they were. When `WORKER_SPLIT_CONTINUATIONS` is enabled, metrics
+    that ran out of time while computing are split in tiles, merged by the reducer;
+    otherwise they fail, computed again from scratch they would run out of time again.
+
+    :param deferred: A dict of slug to whether the metric was started.
+    :return: The slugs of the metrics that ran out of time and are not continued.
+    """
+    resource_id, worker = decoded["id"], decoded["meta"]["worker"]
+    continuation = worker.get("continuation", 0) + 1
+
+    if not SNS_WORKER_TOPIC_ARN or continuation > WORKER_MAX_CONTINUATIONS:
+        raise DeadlineExceeded(
+            f"Ran out of time computing metrics: {', '.join(deferred)} for resource: {resource_id}"
+        )
+
+    worker = {k: v for k, v in worker.items() if k not in ("handler", "handlers")}
+    worker["continuation"] = continuation
+
+    restart = [slug for slug, started in deferred.items() if not started]
+    split = [slug for slug, started in deferred.items() if started]
+    timed_out = []
+    if "tile" in worker or not (WORKER_SPLIT_CONTINUATIONS and SNS_REDUCER_TOPIC_ARN):
+        timed_out, split = split, []  # tiles are not split further;
+
+    workers = []
+    if restart:
+        workers.append({**worker, "handlers": restart})
+    if split:
+        rows, cols = CONTINUATION_GRID
+        for index in range(rows * cols):
+            tile = {"index": index, "grid": [rows, cols]}
+            workers.append({**worker, "handlers": split, "tile": tile})
 
     logger.debug(
-        f"Successfully handled event {handler} for resource: {resource_id} and version: {version}"
+        "Sending %s continuation events for: %s and resource: %s",
+        len(workers),
+        list(deferred),
+        resource_id,
     )
+
+    messages = [json.dumps({**decoded, "meta": {**decoded["meta"], "worker": w}}) for w in workers]
+    publish_batch(sns, SNS_WORKER_TOPIC_ARN, messages)
+
+    return timed_out
+
+
+def tile_payload(payload, tile, area_km2):
+    """
+    Partial result of a tile, sent to the reducer.
+    """
+    rows, cols = tile["grid"]
+    return {**payload, "tile": {"index": tile["index"], "count": rows * cols}, "areaKm2": area_km2}
+
+
+def publish_result(payload):
+    """
+    Send the metric result event, partial results of tiles are sent to the reducer.
+    Payloads too large for a message are offloaded to the payload store.
+    """
+    topic_arn = SNS_RESULT_TOPIC_ARN
+    if "tile" in payload:
+        if not SNS_REDUCER_TOPIC_ARN:
+            raise MetricHandlerException("Required parameters: SNS_REDUCER_TOPIC_ARN")
+        topic_arn = SNS_REDUCER_TOPIC_ARN
+
+    logger.debug(
+        "Sending metric result event for %s and resource: %s", payload["slug"], payload["location"]
+    )
+
+    if payload_store is not None:
+        message = payload_store.wrap(payload)
+    else:
+        message = encode_payload(payload).decode("utf-8")
+
+    sns.publish(TopicArn=topic_arn, Message=message)
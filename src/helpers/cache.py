@@ -0,0 +1,201 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import Counter, OrderedDict
+
+from helpers.logging import get_logger
+
+logger = get_logger("cache")
+
+SAMPLED_LENGTH = 64  # longer arrays of numbers & arrays are sized from a few of their items;
+SAMPLES = 8
+
+
+def estimate_size(value):
+    """
+    Estimate of the in-memory size in bytes of a decoded JSON value, a few times its
+    serialized size: each coordinate is a boxed float in a list. Long arrays of numbers or
+    arrays, e.g. the coordinates of a ring, are extrapolated from a sample of their items.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, list) and value:
+        items = value
+        if len(value) > SAMPLED_LENGTH and not isinstance(value[0], (dict, str)):
+            items = value[:: len(value) // SAMPLES]
+        size += sum(estimate_size(item) for item in items) * len(value) // len(items)
+    return size
+
+
+class MemoryCache:
+    """
+    In-process LRU cache bounded by the size in bytes of its entries, as given on `put`.
+    """
+
+    def __init__(self, max_bytes, stats=None):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.stats = stats if stats is not None else Counter()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            value, _ = self._entries[key]
+            return value
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return  # never evict the whole cache for a single oversized entry;
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.stats["memory_evictions"] += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    Gzip compressed JSON files on local disk, bounded by the total size in bytes of the files.
+    Oldest files (by access time) are evicted first.
+    """
+
+    compresslevel = 1  # favour speed, geojson compresses well regardless;
+
+    def __init__(self, directory, max_bytes, stats=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = stats if stats is not None else Counter()
+
+    def get(self, key):
+        filepath = self._filepath(key)
+        try:
+            with gzip.open(filepath, "rt", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(filepath)  # mark as recently used;
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Discarding unreadable cache file: %s %s", filepath, e)
+            self._remove(filepath)
+            return None
+
+    def put(self, key, value):
+        os.makedirs(self.directory, exist_ok=True)
+
+        filepath = self._filepath(key)
+        tmp_filepath = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with gzip.open(
+                tmp_filepath, "wt", encoding="utf-8", compresslevel=self.compresslevel
+            ) as f:
+                json.dump(value, f)
+            os.replace(tmp_filepath, filepath)  # atomic, readers never see partial files;
+        except OSError as e:
+            logger.warning("Failed to write cache file: %s %s", filepath, e)
+            self._remove(tmp_filepath)
+            return
+        self._evict()
+
+    def _evict(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json.gz"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in files)
+        for _, size, filepath in sorted(files):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(filepath)
+            total_bytes -= size
+            self.stats["disk_evictions"] += 1
+
+    def _filepath(self, key):
+        digest = hashlib.sha1(json.dumps(list(key)).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json.gz")
+
+    def _remove(self, filepath):
+        try:
+            os.remove(filepath)
+        except OSError:
+            pass
+
+
+class TwoTierCache:
+    """
+    Memory tier backed by a disk tier; disk hits are promoted to memory.
+    Keys are tuples of JSON serializable values.
+    """
+
+    def __init__(self, max_memory_bytes, directory, max_disk_bytes):
+        self.stats = Counter()
+        self.memory = MemoryCache(max_memory_bytes, stats=self.stats)
+        self.disk = DiskCache(directory, max_disk_bytes, stats=self.stats) if directory else None
+
+    def get(self, key, peek=False):
+        """
+        :param peek: Lookup without recording hits and misses.
+        """
+        tier, value = "memory", self.memory.get(key)
+        if value is None and self.disk is not None:
+            tier, value = "disk", self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value, estimate_size(value))
+
+        if not peek:
+            if value is not None:
+                self.stats["hits"] += 1
+                self.stats[f"{tier}_hits"] += 1
+            else:
+                self.stats["misses"] += 1
+
+        return value
+
+    def put(self, key, value):
+        """
+        :param value: A JSON serializable value, sized in memory by `estimate_size`.
+        """
+        self.memory.put(key, value, estimate_size(value))
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    @property
+    def evictions(self):
+        return self.stats["memory_evictions"] + self.stats["disk_evictions"]
@@ -0,0 +1,132 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+_cancellation = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """
+    Time left to the invocation, derived from the AWS Lambda context. A margin is
+    kept in reserve to checkpoint the remaining work before the function is killed.
+
+    Usage::
+
+        deadline = Deadline.from_context(context, margin_ms=30000)
+        fetch(timeout=deadline.budget(FETCH_TIMEOUT))
+        if deadline.expired():
+            ...  # checkpoint & continue in a new invocation
+    """
+
+    def __init__(self, remaining_ms=None, margin_ms=0):
+        self.margin = margin_ms / 1000
+        self.end = None if remaining_ms is None else time.monotonic() + remaining_ms / 1000
+
+    @classmethod
+    def from_context(cls, context, margin_ms=0):
+        """
+        :param context: The AWS Lambda context, no deadline when None (e.g. local runs).
+        """
+        remaining_ms = None
+        if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+            remaining_ms = context.get_remaining_time_in_millis()
+        return cls(remaining_ms, margin_ms)
+
+    def remaining(self):
+        """
+        Seconds left before the margin is reached, None without deadline.
+        """
+        if self.end is None:
+            return None
+        return max(0.0, self.end - time.monotonic() - self.margin)
+
+    def time_left(self):
+        """
+        Seconds left to the invocation, margin included, None without deadline.
+        """
+        if self.end is None:
+            return None
+        return max(0.0, self.end - time.monotonic())
+
+    def expired(self):
+        return self.end is not None and self.remaining() <= 0
+
+    def budget(self, seconds):
+        """
+        Bound a stage timeout by the time left.
+
+        :raises DeadlineExceeded: When no time is left.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return seconds
+        if remaining <= 0:
+            raise DeadlineExceeded("No time left in the invocation")
+        return min(seconds, remaining)
+
+
+@contextmanager
+def cancellable(event):
+    """
+    Cancel the work of the current thread once the event is set, at the next
+    `check_cancelled` call: threads can't be interrupted, they stop cooperatively.
+    """
+    previous = getattr(_cancellation, "event", None)
+    _cancellation.event = event
+    try:
+        yield
+    finally:
+        _cancellation.event = previous
+
+
+def check_cancelled():
+    """
+    :raises DeadlineExceeded: When the work of the current thread was cancelled.
+    """
+    event = getattr(_cancellation, "event", None)
+    if event is not None and event.is_set():
+        raise DeadlineExceeded("Cancelled at the deadline")
+
+
+def cancel_before(owner, name):
+    """
+    Check for cancellation before each call of `owner.name`, e.g. before each remote
+    request of a library which can't be cancelled otherwise. Patching twice is a no-op.
+
+    :param owner: The module or class of the function.
+    """
+    function = getattr(owner, name)
+    if getattr(function, "cancellable", False):
+        return
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        check_cancelled()
+        return function(*args, **kwargs)
+
+    wrapper.cancellable = True
+    setattr(owner, name, wrapper)
@@ -0,0 +1,77 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import ijson
+from ijson.common import ObjectBuilder
+
+
+def parse_location_stream(reader, geojson_attribute="geojson"):
+    """
+    Incrementally parse a JSON:API location document from a file-like object.
+    Features of the geojson attribute are handed over to shapely as soon as they
+    are complete, so the raw payload and the decoded feature tree are never held
+    in memory as a whole.
+
+    :param reader: File-like object, the response body.
+    :param geojson_attribute: The attribute holding the FeatureCollection.
+    :return: A tuple of the flattened document (without the geojson attribute) and
+        the list of rows, as expected by `GeoDataFrame`.
+    """
+    from shapely.geometry import shape
+
+    attributes_prefix = "data.attributes"
+    features_prefix = f"{attributes_prefix}.{geojson_attribute}.features.item"
+
+    document, rows = {}, []
+    builder, builder_prefix, builder_key = None, None, None
+
+    for prefix, event, value in ijson.parse(reader, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == builder_prefix and event in ("end_map", "end_array"):
+                if builder_prefix == features_prefix:
+                    rows.append(_feature_row(builder.value, shape))
+                else:
+                    document[builder_key] = builder.value
+                builder = None
+            continue
+
+        if prefix == "data.id" and event in ("string", "number"):
+            document["id"] = value
+        elif prefix == features_prefix and event == "start_map":
+            builder, builder_prefix = ObjectBuilder(), prefix
+            builder.event(event, value)
+        elif prefix.startswith(f"{attributes_prefix}.") and prefix.count(".") == 2:
+            key = prefix[len(attributes_prefix) + 1 :]
+            if key == geojson_attribute:
+                continue
+            if event in ("start_map", "start_array"):
+                builder, builder_prefix, builder_key = ObjectBuilder(), prefix, key
+                builder.event(event, value)
+            else:
+                document[key] = value
+
+    return document, rows
+
+
+def _feature_row(feature, shape):
+    geometry = feature.get("geometry")
+    row = {"geometry": shape(geometry) if geometry else None}
+    row.update(feature.get("properties") or {})
+    return row
@@ -0,0 +1,130 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+
+def vertex_count(gdf):
+    """
+    Total number of coordinates of the geometries of a GeoDataFrame.
+    """
+    try:
+        import shapely
+
+        return int(shapely.get_num_coordinates(gdf.geometry.values.data).sum())
+    except (ImportError, AttributeError):  # shapely < 2.0;
+        return sum(_num_coordinates(g) for g in gdf.geometry if g is not None)
+
+
+def _num_coordinates(geometry):
+    if hasattr(geometry, "geoms"):
+        return sum(_num_coordinates(g) for g in geometry.geoms)
+    if hasattr(geometry, "exterior"):
+        return len(geometry.exterior.coords) + sum(len(r.coords) for r in geometry.interiors)
+    return len(geometry.coords)
+
+
+def features_to_geodataframe(features, crs=None):
+    """
+    Build a GeoDataFrame from geojson features, same result as `GeoDataFrame.from_features`.
+    Polygons are created in bulk from flat coordinate buffers (shapely >= 2.0), or straight
+    from their rings (shapely < 2.0), instead of one `shape()` call per feature. Other
+    geometry types are created one by one.
+    """
+    from geopandas import GeoDataFrame
+    from pandas import DataFrame
+
+    try:
+        geometries = _geometry_array(features)
+    except ValueError:  # mixed coordinate dimensions;
+        return GeoDataFrame.from_features(features, crs=crs)
+
+    frame = DataFrame([feature.get("properties") or {} for feature in features])
+    frame.insert(0, "geometry", geometries)  # first column, as with `from_features`;
+
+    return GeoDataFrame(frame, crs=crs)
+
+
+def _geometry_array(features):
+    import numpy as np
+    from shapely.geometry import shape
+
+    geometries = np.empty(len(features), dtype=object)
+    polygons, multi_polygons = [], []
+    for i, feature in enumerate(features):
+        geometry = feature.get("geometry")
+        if not geometry:
+            continue
+        if geometry["type"] == "Polygon" and geometry["coordinates"]:
+            polygons.append(i)
+        elif geometry["type"] == "MultiPolygon" and geometry["coordinates"]:
+            multi_polygons.append(i)
+        else:
+            geometries[i] = shape(geometry)
+
+    for indices, multi in [(polygons, False), (multi_polygons, True)]:
+        if indices:
+            coords = [features[i]["geometry"]["coordinates"] for i in indices]
+            for i, geometry in zip(indices, _polygons(coords, multi)):
+                geometries[i] = geometry
+
+    return geometries
+
+
+def _polygons(geometries, multi):
+    """
+    Create the polygons, or multi polygons, of nested geojson coordinates.
+    """
+    try:
+        import shapely
+
+        geometry_type = shapely.GeometryType.MULTIPOLYGON if multi else shapely.GeometryType.POLYGON
+    except AttributeError:  # shapely < 2.0, without ragged arrays;
+        from shapely.geometry import MultiPolygon, Polygon
+
+        if multi:
+            return [MultiPolygon([(p[0], p[1:]) for p in g]) for g in geometries]
+        return [Polygon(g[0], g[1:]) for g in geometries]
+
+    return _from_coordinates(geometry_type, geometries, depth=3 if multi else 2)
+
+
+def _from_coordinates(geometry_type, geometries, depth):
+    """
+    Flatten nested geojson coordinates into a coordinate buffer & offset arrays, one per
+    nesting level (rings, polygons, geometries), then create all geometries at once.
+    """
+    import numpy as np
+    import shapely
+
+    coords = []
+    offsets = [[0] for _ in range(depth)]
+    for geometry in geometries:
+        parts = geometry if depth == 3 else [geometry]
+        for part in parts:
+            for ring in part:
+                coords.extend(ring)
+                offsets[0].append(len(coords))
+            if depth == 3:
+                offsets[1].append(len(offsets[0]) - 1)
+        offsets[-1].append(len(offsets[-2]) - 1)
+
+    return shapely.from_ragged_array(
+        geometry_type,
+        np.asarray(coords, dtype=float),
+        tuple(np.asarray(o, dtype=np.int64) for o in offsets),
+    )
@@ -0,0 +1,143 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import importlib.util
+import io
+import json
+
+GEOPARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+JSON_API_MEDIA_TYPE = "application/vnd.api+json"
+
+GEO_METADATA_KEY = b"geo"
+GEOPARQUET_VERSION = "0.4.0"
+LOCATION_METADATA_KEY = b"location"  # document attributes, next to the GeoParquet `geo` key
+
+
+def read_location_parquet(content):
+    """
+    Decode a GeoParquet location: geometries are WKB encoded in the columns listed by
+    the `geo` key of the file metadata and decoded straight into the GeoDataFrame, the
+    location attributes (without geojson) are JSON encoded in its `location` key.
+
+    Decoded with pyarrow & shapely only, `geopandas.read_parquet` requires geopandas 0.8.
+
+    :param content: The bytes of the parquet file.
+    :return: A tuple of the document and the GeoDataFrame.
+    """
+    import pyarrow.parquet as pq
+    from geopandas import GeoDataFrame, GeoSeries
+
+    table = pq.read_table(io.BytesIO(content))
+    metadata = table.schema.metadata or {}
+    document = json.loads(metadata.get(LOCATION_METADATA_KEY, b"{}"))
+    geo = json.loads(metadata.get(GEO_METADATA_KEY, b"{}"))
+
+    primary = geo.get("primary_column", "geometry")
+    columns = geo.get("columns", {primary: {"encoding": "WKB"}})
+    frame = table.to_pandas()
+    for name, column in columns.items():
+        if column.get("encoding", "WKB") != "WKB":
+            raise ValueError(f"Unsupported geometry encoding: {column.get('encoding')}")
+        frame[name] = GeoSeries(_from_wkb(frame[name].values), index=frame.index)
+
+    crs = _read_crs(columns.get(primary, {}).get("crs"))
+    return document, GeoDataFrame(frame, geometry=primary, crs=crs)
+
+
+def write_location_parquet(document, gdf, compression="zstd"):
+    """
+    Encode a location as GeoParquet, see `read_location_parquet`.
+
+    :param document: The location attributes, the geojson attribute is left out.
+    :return: The bytes of the parquet file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from pandas import DataFrame
+
+    attributes = {k: v for k, v in document.items() if k != "geojson"}
+
+    name = gdf.geometry.name
+    frame = DataFrame(gdf.drop(columns=[name]))
+    frame[name] = [None if g is None else g.wkb for g in gdf.geometry]
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+
+    column = {"encoding": "WKB", "geometry_types": []}
+    if gdf.crs is not None:
+        column["crs"] = _write_crs(gdf.crs)
+    geo = {"version": GEOPARQUET_VERSION, "primary_column": name, "columns": {name: column}}
+
+    metadata = {
+        **(table.schema.metadata or {}),
+        GEO_METADATA_KEY: json.dumps(geo),
+        LOCATION_METADATA_KEY: json.dumps(attributes),
+    }
+
+    buffer = io.BytesIO()
+    pq.write_table(table.replace_schema_metadata(metadata), buffer, compression=compression)
+    return buffer.getvalue()
+
+
+def _from_wkb(values):
+    try:
+        import shapely
+
+        return shapely.from_wkb(values)
+    except (ImportError, AttributeError):  # shapely < 2.0;
+        from shapely import wkb
+
+        return [None if v is None else wkb.loads(v) for v in values]
+
+
+def _read_crs(crs):
+    """
+    :param crs: A PROJJSON object or a string, OGC:CRS84 when missing as per GeoParquet.
+    """
+    from pyproj import CRS
+
+    if crs is None:
+        return CRS.from_user_input("OGC:CRS84")
+    if isinstance(crs, dict):
+        return CRS.from_json_dict(crs)
+    return CRS.from_user_input(crs)
+
+
+def _write_crs(crs):
+    from pyproj import CRS
+
+    return CRS.from_user_input(crs).to_json_dict()
+
+
+def geoparquet_available():
+    """
+    Whether pyarrow is installed, it is not bundled with the functions by default.
+    """
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def is_geoparquet(content_type):
+    return (content_type or "").split(";")[0].strip() == GEOPARQUET_MEDIA_TYPE
+
+
+def accept_header(formats):
+    """
+    Accept header preferring the given media types in order, JSON:API being the fallback.
+    """
+    media_types = [m for m in formats if m != JSON_API_MEDIA_TYPE] + [JSON_API_MEDIA_TYPE]
+    return ", ".join(f"{m};q={1 - i / 10:.1f}" if i else m for i, m in enumerate(media_types))
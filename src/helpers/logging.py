@@ -17,19 +17,127 @@
   specific language governing permissions and limitations under the License.
 """
 
+import json
 import logging
+import os
+import random
+import reprlib
+import sys
+import time
 
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")  # json or text
+LOG_MAX_LENGTH = int(os.environ.get("LOG_MAX_LENGTH", 1024))  # characters per argument
+# sampling rates by message template prefix, e.g. `{"Fetched ": 0.01}`
+LOG_SAMPLING = json.loads(os.environ.get("LOG_SAMPLING", "{}"))
 
-def get_logger(module_name):
-    logger = logging.getLogger(module_name)
-    logger.setLevel(logging.DEBUG)
+_repr = reprlib.Repr()
+_repr.maxstring = LOG_MAX_LENGTH
+_repr.maxother = LOG_MAX_LENGTH
+_repr.maxlist = _repr.maxtuple = _repr.maxset = _repr.maxdict = 20
+_repr.maxlevel = 4
+
+# attributes set on every record, anything else was passed through `extra`.
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def truncate(value, max_length=LOG_MAX_LENGTH):
+    """
+    Shorten a log argument, large containers are abbreviated and long strings cut.
+    """
+    if isinstance(value, (int, float, bool, type(None))):
+        return value  # keep numbers as is, they may be used with numeric conversions;
+    if isinstance(value, str):
+        text = value
+    elif isinstance(value, (dict, list, tuple, set, frozenset)):
+        text = _repr.repr(value)
+    else:
+        text = str(value)
+    if len(text) > max_length:
+        text = f"{text[:max_length]}... ({len(text)} chars)"
+    return text
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as single line JSON documents, arguments are truncated when the
+    record is formatted, i.e. only for records that are actually emitted.
+    """
+
+    def format(self, record):
+        if isinstance(record.args, tuple):
+            args = tuple(truncate(arg) for arg in record.args)
+        else:
+            args = record.args
+        message = record.msg % args if args else str(record.msg)
+
+        document = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": message,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                document[key] = truncate(value)
+        if record.exc_info:
+            document["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(document, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Human readable format for local runs, with the same argument truncation.
+    """
 
-    handler = logging.StreamHandler()
-    handler.setLevel(logging.DEBUG)
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
-    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    handler.setFormatter(formatter)
+    def format(self, record):
+        if isinstance(record.args, tuple):
+            record.args = tuple(truncate(arg) for arg in record.args)
+        return super().format(record)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of the records by message template, configured with `LOG_SAMPLING`.
+    Warnings and errors are never sampled.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))  # longest prefix first
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not isinstance(record.msg, str):
+            return True
+        for prefix, rate in self.rates:
+            if record.msg.startswith(prefix):
+                return random.random() < rate
+        return True
+
+
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+if LOG_SAMPLING:
+    _handler.addFilter(SamplingFilter(LOG_SAMPLING))
+
+
+def get_logger(module_name):
+    """
+    Get a logger set to `LOG_LEVEL`, all loggers share a single handler.
+
+    Pass arguments instead of formatting the message, e.g. `logger.debug("Metric: %s", metric)`,
+    the message is only built, with truncated arguments, when the level is enabled.
+    """
+    logger = logging.getLogger(module_name)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False  # the lambda runtime attaches its own handler to the root logger;
 
-    logger.addHandler(handler)
+    if _handler not in logger.handlers:
+        logger.addHandler(_handler)
 
     return logger
@@ -0,0 +1,110 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import re
+
+from helpers.logging import get_logger
+
+SUM, MEAN, MAX, MIN = "sum", "mean", "max", "min"
+
+# rule inferred from a field name, checked in order.
+FIELD_NAME_RULES = [
+    (
+        re.compile(r"(^|_)(mean|avg|average|median|percent|percentage|index|density|ratio)(_|$)"),
+        MEAN,
+    ),
+    (re.compile(r"(^|_)(max|maximum)(_|$)"), MAX),
+    (re.compile(r"(^|_)(min|minimum)(_|$)"), MIN),
+    (re.compile(r"(^|_)(area|km2|count|total|sum)(_|$)"), SUM),
+]
+
+logger = get_logger("merge")
+
+
+class MergeException(Exception):
+    pass
+
+
+def merge_metrics(partials, rules=None):
+    """
+    Merge the metric results computed for the tiles of a location.
+
+    Fields are merged according to their rule: `sum` for additive quantities (areas,
+    counts, totals), `mean` for intensive quantities (indexes, densities, percentages),
+    weighted by the area of the tiles, `max` & `min`. Histograms & time series (dicts)
+    are merged key by key with the rule of their field. Medians & percentiles are
+    approximated by their area-weighted mean.
+
+    :param partials: List of (metric dict, area_km2) tuples, one per non-empty tile.
+    :param rules: Dict of field name to rule; `*` sets the rule of the fields not listed.
+        Without `*`, the rule of the fields not listed is inferred from their name, and
+        fields matching no name rule are summed.
+    :return: The merged metric dict.
+    """
+    rules = rules or {}
+    partials = [(m, a) for m, a in partials if m is not None]
+    if not partials:
+        raise MergeException("No partial results to merge")
+
+    fields = list(partials[0][0].keys())  # keep the field order of the namedtuple;
+    return {
+        field: _merge_values([(m.get(field), a) for m, a in partials], _rule(field, rules), field)
+        for field in fields
+    }
+
+
+def _rule(field, rules):
+    if field in rules:
+        return rules[field]
+    if "*" in rules:
+        return rules["*"]
+
+    rule = next((r for pattern, r in FIELD_NAME_RULES if pattern.search(field.lower())), SUM)
+    logger.warning("No merge rule for field: %s, inferred: %s", field, rule)
+    return rule
+
+
+def _merge_values(values, rule, field):
+    present = [(v, a) for v, a in values if v is not None]
+    if not present:
+        return None
+
+    if all(isinstance(v, dict) for v, _ in present):  # histograms & time series;
+        keys = list(dict.fromkeys(k for v, _ in present for k in v))
+        return {k: _merge_values([(v.get(k), a) for v, a in present], rule, field) for k in keys}
+
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v, _ in present):
+        numbers = [v for v, _ in present]
+        if rule == SUM:
+            return sum(numbers)
+        if rule == MAX:
+            return max(numbers)
+        if rule == MIN:
+            return min(numbers)
+        if rule == MEAN:
+            total_area = sum(a for _, a in present)
+            if not total_area:
+                return sum(numbers) / len(numbers)
+            return sum(v * a for v, a in present) / total_area
+        raise MergeException(f"Unsupported merge rule: {rule} for field: {field}")
+
+    if all(v == present[0][0] for v, _ in present):  # constants, e.g. units or labels;
+        return present[0][0]
+
+    raise MergeException(f"Cannot merge values of field: {field}")
@@ -0,0 +1,120 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "marapp-workers")
+
+# vertex count upper bounds of the geometry size buckets.
+SIZE_BUCKETS = [(1000, "xs"), (10000, "s"), (100000, "m"), (1000000, "l")]
+
+
+def size_bucket(vertices):
+    """
+    Coarse geometry size class, low cardinality dimension of the metrics.
+    """
+    if vertices is None:
+        return "unknown"
+    return next((name for bound, name in SIZE_BUCKETS if vertices <= bound), "xl")
+
+
+class StageTimer:
+    """
+    Collects the durations of the stages of an invocation, and other measured values,
+    emitted as a CloudWatch embedded metric format (EMF) record: a structured log line,
+    extracted to metrics by CloudWatch and queryable with Logs Insights.
+    """
+
+    def __init__(self, dimensions=None, **properties):
+        self.dimensions = dict(dimensions or {})
+        self.properties = dict(properties)
+        self.timings = defaultdict(float)
+        self.values = {}  # name: (value, unit);
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.timings[name] += (time.perf_counter() - start) * 1000
+
+    def set(self, **properties):
+        self.properties.update(properties)
+
+    def value(self, name, value, unit="None"):
+        """
+        Record a metric other than a stage duration, e.g. `value("peakRss", 412, "Megabytes")`.
+        """
+        self.values[name] = (value, unit)
+
+    def child(self, dimensions=None, **properties):
+        """
+        New timer inheriting the timings, dimensions & properties of this one.
+        """
+        timer = StageTimer({**self.dimensions, **(dimensions or {})})
+        timer.properties = {**self.properties, **properties}
+        timer.timings.update(self.timings)
+        timer.values.update(self.values)
+        return timer
+
+    def record(self):
+        metrics = [{"Name": name, "Unit": "Milliseconds"} for name in self.timings]
+        metrics += [{"Name": name, "Unit": unit} for name, (_, unit) in self.values.items()]
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": METRICS_NAMESPACE,
+                        "Dimensions": [sorted(self.dimensions)],
+                        "Metrics": metrics,
+                    }
+                ],
+            },
+            **self.properties,
+            **self.dimensions,
+            **{name: round(value, 3) for name, value in self.timings.items()},
+            **{name: round(value, 3) for name, (value, _) in self.values.items()},
+        }
+
+    def emit(self):
+        if not METRICS_ENABLED:
+            return
+        # written straight to stdout, EMF records must not be prefixed by the log formatter.
+        sys.stdout.write(json.dumps(self.record(), default=str) + "\n")
+        sys.stdout.flush()
+
+
+@contextmanager
+def timed(timer, name):
+    """
+    Time a stage when a timer is given, no-op otherwise.
+    """
+    if timer is None:
+        yield None
+    else:
+        with timer.stage(name):
+            yield timer
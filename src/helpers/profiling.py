@@ -0,0 +1,127 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+from helpers.logging import get_logger
+
+PROFILE_THRESHOLD_MS = int(os.environ.get("PROFILE_THRESHOLD_MS", 0))  # 0 disables profiling
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/profiles")
+PROFILE_TOP = int(os.environ.get("PROFILE_TOP", 25))  # functions logged per profile
+
+logger = get_logger("profiling")
+
+
+@contextmanager
+def profiled(name):
+    """
+    Profile the current thread with cProfile when enabled through `PROFILE_THRESHOLD_MS`.
+    Profiles of runs slower than the threshold are dumped to `PROFILE_DIR` and the top
+    functions by cumulative time are logged.
+    """
+    if PROFILE_THRESHOLD_MS <= 0:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms >= PROFILE_THRESHOLD_MS:
+            _dump(profiler, name, elapsed_ms)
+
+
+def _dump(profiler, name, elapsed_ms):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    filepath = os.path.join(PROFILE_DIR, f"{name}-{int(time.time() * 1000)}.prof")
+    profiler.dump_stats(filepath)
+
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(PROFILE_TOP)
+
+    logger.warning(
+        "Slow run: %s took %.0f ms, profile: %s\n%s", name, elapsed_ms, filepath, stream.getvalue()
+    )
+
+
+@contextmanager
+def resource_usage(timer):
+    """
+    Record the wall & CPU time of the current thread in the timer (`wallTime` & `cpuTime`),
+    and the peak RSS of the process (`peakRss`). The peak RSS is the high-water mark since
+    `reset_peak_rss`, it includes the metrics computed concurrently by the invocation.
+    """
+    if timer is None:
+        yield
+        return
+
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        timer.value("wallTime", (time.perf_counter() - wall) * 1000, "Milliseconds")
+        timer.value("cpuTime", (time.thread_time() - cpu) * 1000, "Milliseconds")
+        peak = peak_rss_mb()
+        if peak is not None:
+            timer.value("peakRss", peak, "Megabytes")
+
+
+def reset_peak_rss():
+    """
+    Reset the peak RSS of the process, measured from the start of the invocation rather
+    than from the start of the (warm) container. Linux only.
+
+    :return: Whether the peak was reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """
+    :return: The peak RSS of the process in MB, None when unavailable.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024  # in kB;
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:  # not available on Windows;
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
@@ -0,0 +1,83 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+from helpers.geometry import vertex_count
+
+# candidate tolerances, as fractions of the largest side of the location bounds.
+TOLERANCE_STEPS = [10 ** (e / 2) for e in range(-12, -3)]  # 1e-6 ... 3e-3
+
+
+def simplify_geometries(gdf, max_vertices, max_area_error):
+    """
+    Simplify the geometries with the smallest tolerance bringing the vertex count within
+    `max_vertices`, without changing the area by more than `max_area_error`. When both
+    can't be met, the error bound wins and the vertex budget is exceeded.
+
+    Areas are compared in the CRS of the GeoDataFrame, relative errors are a close enough
+    approximation for EPSG:4326 locations.
+
+    :return: A tuple of the (simplified) GeoDataFrame and the simplification report:
+        the tolerance, vertex counts before & after, the relative area error and the
+        shape error (area of the symmetric difference relative to the area).
+    """
+    vertices = vertex_count(gdf)
+    report = {
+        "tolerance": 0.0,
+        "vertices": vertices,
+        "simplifiedVertices": vertices,
+        "areaError": 0.0,
+        "shapeError": 0.0,
+    }
+    if vertices <= max_vertices or gdf.empty:
+        return gdf, report
+
+    area = gdf.geometry.area.sum()
+    if area <= 0:  # points or lines, the area bound can't be checked;
+        return gdf, report
+
+    minx, miny, maxx, maxy = gdf.total_bounds
+    extent = max(maxx - minx, maxy - miny)
+
+    best = None
+    for step in TOLERANCE_STEPS:
+        tolerance = extent * step
+        simplified = gdf.geometry.simplify(tolerance, preserve_topology=True)
+        area_error = abs(simplified.area.sum() - area) / area
+        if area_error > max_area_error:
+            break
+        best = tolerance, simplified, area_error
+        if vertex_count(simplified) <= max_vertices:
+            break
+
+    if best is None:
+        return gdf, report
+
+    tolerance, simplified, area_error = best
+    try:
+        shape_error = gdf.geometry.symmetric_difference(simplified).area.sum() / area
+    except Exception:  # e.g. invalid input geometries;
+        shape_error = None
+
+    report.update(
+        tolerance=tolerance,
+        simplifiedVertices=vertex_count(simplified),
+        areaError=area_error,
+        shapeError=shape_error,
+    )
+    return gdf.set_geometry(simplified), report
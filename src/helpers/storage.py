@@ -0,0 +1,189 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import os
+import threading
+from urllib.parse import urlparse
+
+
+class StorageException(Exception):
+    pass
+
+
+class StorageBackend:
+    """
+    Minimal blob storage interface, keys are `/` separated paths.
+    """
+
+    def get(self, key):
+        """
+        :return: The stored bytes, None if the key does not exist.
+        """
+        raise NotImplementedError
+
+    def put(self, key, data):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def list(self, prefix=""):
+        """
+        :return: The keys starting with the given prefix.
+        """
+        raise NotImplementedError
+
+    def uri(self, key):
+        raise NotImplementedError
+
+
+class InMemoryStorage(StorageBackend):
+    """
+    Process local storage, used for tests.
+    """
+
+    def __init__(self):
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._blobs.get(key)
+
+    def put(self, key, data):
+        with self._lock:
+            self._blobs[key] = bytes(data)
+
+    def delete(self, key):
+        with self._lock:
+            self._blobs.pop(key, None)
+
+    def list(self, prefix=""):
+        return sorted(k for k in list(self._blobs) if k.startswith(prefix))
+
+    def uri(self, key):
+        return f"memory://{key}"
+
+
+class LocalFileStorage(StorageBackend):
+    """
+    Files on the local filesystem, below a root directory.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def get(self, key):
+        try:
+            with open(self._filepath(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data):
+        filepath = self._filepath(key)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        tmp_filepath = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_filepath, "wb") as f:
+            f.write(data)
+        os.replace(tmp_filepath, filepath)  # atomic, readers never see partial files;
+
+    def delete(self, key):
+        try:
+            os.remove(self._filepath(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self, prefix=""):
+        keys = []
+        for parent, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                key = os.path.relpath(os.path.join(parent, filename), self.root)
+                key = key.replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+    def uri(self, key):
+        return f"file://{self._filepath(key)}"
+
+    def _filepath(self, key):
+        filepath = os.path.abspath(os.path.join(self.root, key))
+        if not filepath.startswith(os.path.abspath(self.root) + os.sep):
+            raise StorageException(f"Invalid storage key: {key}")
+        return filepath
+
+
+class S3Storage(StorageBackend):
+    """
+    Objects in an S3 bucket, below an optional prefix.
+    """
+
+    def __init__(self, bucket, prefix="", client=None):
+        if client is None:
+            import boto3
+
+            client = boto3.client("s3")
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def get(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read()
+
+    def put(self, key, data):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def list(self, prefix=""):
+        keys = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            for obj in page.get("Contents", []):
+                keys.append(obj["Key"][len(self._key("")) :])
+        return keys
+
+    def uri(self, key):
+        return f"s3://{self.bucket}/{self._key(key)}"
+
+    def _key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+
+def get_storage(url):
+    """
+    Build a storage backend from its URL, one of:
+    `memory://`, `file:///path/to/root`, `s3://bucket/prefix`.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return InMemoryStorage()
+    if parsed.scheme == "file":
+        return LocalFileStorage(parsed.path)
+    if parsed.scheme == "s3":
+        return S3Storage(parsed.netloc, parsed.path)
+    raise StorageException(f"Unsupported storage: {url}")
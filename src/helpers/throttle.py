@@ -0,0 +1,314 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from helpers.logging import get_logger
+
+UPSTREAM_RATE = float(os.environ.get("UPSTREAM_RATE", 20))  # initial requests per second
+UPSTREAM_RATE_MIN = float(os.environ.get("UPSTREAM_RATE_MIN", 0.5))
+UPSTREAM_RATE_MAX = float(os.environ.get("UPSTREAM_RATE_MAX", 100))
+UPSTREAM_RATE_INCREASE = float(os.environ.get("UPSTREAM_RATE_INCREASE", 1))  # req/s per second
+UPSTREAM_RATE_DECREASE = float(os.environ.get("UPSTREAM_RATE_DECREASE", 0.5))  # rate factor
+UPSTREAM_BURST = int(os.environ.get("UPSTREAM_BURST", 10))  # requests sent at once
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", 30))  # in seconds
+
+logger = get_logger("throttle")
+
+_upstreams = {}
+_upstreams_lock = threading.Lock()
+
+
+class ThrottleException(Exception):
+    pass
+
+
+class RateLimitExceeded(ThrottleException):
+    pass
+
+
+class ConcurrencyLimitExceeded(ThrottleException):
+    pass
+
+
+class CircuitOpenException(ThrottleException):
+    pass
+
+
+class AdaptiveRateLimiter:
+    """
+    Client-side rate limiter adjusting its rate to the upstream (AIMD): the rate is
+    multiplied by `decrease` when throttled and raised by `increase` requests per second
+    for every second of successful requests. Requests are spaced by the rate, allowing
+    bursts of `burst` requests (GCRA).
+
+    Usage::
+
+        time.sleep(limiter.reserve(max_wait=timeout))
+        response = send()
+        if response.status_code == 429:
+            limiter.throttled(parse_retry_after(response.headers.get("Retry-After")))
+        else:
+            limiter.succeeded()
+    """
+
+    def __init__(
+        self,
+        rate=UPSTREAM_RATE,
+        min_rate=UPSTREAM_RATE_MIN,
+        max_rate=UPSTREAM_RATE_MAX,
+        increase=UPSTREAM_RATE_INCREASE,
+        decrease=UPSTREAM_RATE_DECREASE,
+        burst=UPSTREAM_BURST,
+    ):
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = max(1, burst)
+        self._tat = 0.0  # theoretical arrival time of the next request;
+        self._blocked_until = 0.0  # requested by Retry-After;
+        self._cooldown_until = 0.0  # a single decrease per throttling episode;
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        """
+        Reserve the next request slot.
+
+        :param max_wait: Maximum seconds to wait for the slot, None to wait as needed.
+        :return: The seconds to wait before sending the request.
+        :raises RateLimitExceeded: When the slot is further than `max_wait`.
+        """
+        with self._lock:
+            now = time.monotonic()
+            interval = 1 / self.rate
+            start = max(now, self._tat - (self.burst - 1) * interval, self._blocked_until)
+            if max_wait is not None and start - now > max_wait:
+                raise RateLimitExceeded(
+                    f"Rate limited for {start - now:.1f}s, more than the {max_wait:.1f}s left"
+                )
+            self._tat = max(self._tat, start) + interval
+            return start - now
+
+    def acquire(self, max_wait=None):
+        """
+        Wait for the next request slot, see `reserve`.
+        """
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def throttled(self, retry_after=None):
+        """
+        Lower the rate after a throttled request, and hold the requests for the
+        `Retry-After` delay of the upstream.
+
+        :param retry_after: Optional delay in seconds requested by the upstream.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._cooldown_until:  # concurrent throttles of the same rate;
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._cooldown_until = now + 1 / self.rate
+                logger.warning("Throttled by upstream, lowered rate to: %.2f/s", self.rate)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Client-side cap of the calls in flight to an upstream, adjusted to the upstream (AIMD):
+    the limit is multiplied by `decrease` when throttled and raised by one call for every
+    `limit` successful calls. Suited to upstreams limiting concurrent work rather than
+    requests, each call holding its slot for its whole duration.
+
+    Usage::
+
+        limiter.acquire(max_wait=timeout)
+        try:
+            result = call()
+        finally:
+            limiter.release()
+    """
+
+    def __init__(self, limit, min_limit=1, max_limit=None, decrease=UPSTREAM_RATE_DECREASE):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max_limit or limit
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
+        self.decrease = decrease
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, max_wait=None):
+        """
+        Wait for a free slot.
+
+        :param max_wait: Maximum seconds to wait for the slot, None to wait as needed.
+        :raises ConcurrencyLimitExceeded: When no slot is freed within `max_wait`.
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self._in_flight < int(self.limit), timeout=max_wait
+            ):
+                raise ConcurrencyLimitExceeded(
+                    f"No call slot freed in {max_wait:.1f}s, limit: {self.limit:.1f}"
+                )
+            self._in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def succeeded(self):
+        with self._condition:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def throttled(self):
+        with self._condition:
+            self.limit = max(self.min_limit, self.limit * self.decrease)
+            logger.warning("Throttled by upstream, lowered concurrency to: %.1f", self.limit)
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the upstream is unhealthy: after `failure_threshold` consecutive
+    failures the circuit opens and calls are rejected for `reset_timeout` seconds, then
+    a single probe call is let through, closing the circuit when it succeeds.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(
+        self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        :raises CircuitOpenException: While the circuit is open.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if now - self._opened_at >= self.reset_timeout:  # also when a probe never reported;
+                self.state = self.HALF_OPEN  # this caller is the probe;
+                self._opened_at = now
+                return
+            raise CircuitOpenException(f"Circuit open for upstream: {self.name}")
+
+    def succeeded(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Closed circuit for upstream: %s", self.name)
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def failed(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(
+                        "Opened circuit for upstream: %s after %s failures",
+                        self.name,
+                        self._failures,
+                    )
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class Upstream:
+    """
+    Rate limiter & circuit breaker of an upstream service, shared by the threads and
+    the warm invocations of the container.
+    """
+
+    def __init__(self, name, limiter=None, breaker=None):
+        self.name = name
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.breaker = breaker or CircuitBreaker(name)
+
+    def reserve(self, max_wait=None):
+        """
+        :return: The seconds to wait before sending the request.
+        :raises CircuitOpenException: While the upstream is unhealthy.
+        :raises RateLimitExceeded: When the request can't be sent within `max_wait`.
+        """
+        self.breaker.allow()
+        return self.limiter.reserve(max_wait)
+
+    def acquire(self, max_wait=None):
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    def succeeded(self):
+        self.limiter.succeeded()
+        self.breaker.succeeded()
+
+    def throttled(self, retry_after=None):
+        self.limiter.throttled(retry_after)
+
+    def failed(self):
+        self.breaker.failed()
+
+
+def get_upstream(name):
+    """
+    The shared Upstream of the given name, created on first use.
+    """
+    with _upstreams_lock:
+        if name not in _upstreams:
+            _upstreams[name] = Upstream(name)
+        return _upstreams[name]
+
+
+def parse_retry_after(value):
+    """
+    :param value: A `Retry-After` header, in seconds or as an HTTP date.
+    :return: The delay in seconds, None when missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,88 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import math
+
+EQUAL_AREA_CRS = "ESRI:54009"  # World Mollweide
+POLYGON_TYPES = ["Polygon", "MultiPolygon"]
+
+
+def tile_grid(area_km2, target_area_km2, max_tiles):
+    """
+    Square-ish grid splitting a location in tiles of about the target area.
+
+    :return: A (rows, cols) tuple, (1, 1) when the location doesn't need to be split.
+    """
+    count = min(max_tiles, math.ceil(area_km2 / target_area_km2))
+    if count <= 1:
+        return 1, 1
+
+    rows = math.ceil(math.sqrt(count))
+    cols = math.ceil(count / rows)
+    return rows, cols
+
+
+def tile_bounds(total_bounds, grid, index):
+    """
+    Bounds of the tile at the given (row-major) index of the grid.
+    """
+    minx, miny, maxx, maxy = total_bounds
+    rows, cols = grid
+    row, col = divmod(index, cols)
+
+    width, height = (maxx - minx) / cols, (maxy - miny) / rows
+    return (
+        minx + col * width,
+        miny + row * height,
+        maxx if col == cols - 1 else minx + (col + 1) * width,
+        maxy if row == rows - 1 else miny + (row + 1) * height,
+    )
+
+
+def clip_to_tile(gdf, grid, index, area_km2):
+    """
+    Clip the (EPSG:4326) location shape to a tile of the grid.
+
+    :param area_km2: The area of the whole location.
+    :return: A tuple of the clipped GeoDataFrame and its share of the location area;
+        the areas of all tiles add up to `area_km2`.
+    """
+    from geopandas import GeoSeries
+    from shapely.geometry import box
+
+    cell = box(*tile_bounds(gdf.total_bounds, grid, index))
+
+    clipped = gdf.copy()
+    clipped["geometry"] = gdf.geometry.intersection(cell)
+    # polygons touching the tile only along its edges leave lines, without area
+    degenerate = gdf.geometry.geom_type.isin(POLYGON_TYPES) & ~clipped.geometry.geom_type.isin(
+        POLYGON_TYPES + ["GeometryCollection"]
+    )
+    clipped = clipped[~(clipped.geometry.is_empty | clipped.geometry.isna() | degenerate)]
+
+    if clipped.empty:
+        return clipped, 0.0
+
+    def projected_area(geometries):
+        return GeoSeries(list(geometries), crs="EPSG:4326").to_crs(EQUAL_AREA_CRS).area.sum()
+
+    total = projected_area(gdf.geometry)
+    share = projected_area(clipped.geometry) / total if total else 0.0
+
+    return clipped, area_km2 * share
@@ -0,0 +1,166 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import asyncio
+import json
+import os
+
+import aiohttp
+
+from helpers.deadline import Deadline
+from helpers.logging import get_logger
+from helpers.throttle import get_upstream, parse_retry_after
+from services.fetch_service import (
+    FETCH_BACKOFF_FACTOR,
+    FETCH_MAX_PAYLOAD_BYTES,
+    FETCH_RETRIES,
+    FETCH_STATUS_FORCELIST,
+    FETCH_THROTTLE_STATUSES,
+    FETCH_TIMEOUT,
+    FETCH_UPSTREAM,
+    HTTP_KEEP_ALIVE_IDLE,
+    FetchResult,
+    ResourceFetchException,
+    check_payload_size,
+)
+
+FETCH_CONCURRENCY = max(1, int(os.environ.get("FETCH_CONCURRENCY", 10)))  # requests at once
+
+logger = get_logger("async-fetch-service")
+
+
+def fetch_resources(resource_urls, concurrency=FETCH_CONCURRENCY, **kwargs):
+    """
+    Fetches the resources concurrently from the given URLs, from synchronous code.
+
+    :return: The list of FetchResult, or exceptions, in the order of the URLs.
+    """
+    return asyncio.run(fetch_many(resource_urls, concurrency=concurrency, **kwargs))
+
+
+async def fetch_many(resource_urls, concurrency=FETCH_CONCURRENCY, etags=None, **kwargs):
+    """
+    Fetches the resources over a shared connection pool, with at most `concurrency`
+    requests in flight. A failing resource does not cancel the others.
+
+    :param etags: Optional list of the ETags to revalidate, in the order of the URLs.
+    :return: The list of FetchResult, or exceptions, in the order of the URLs.
+    """
+    if etags is None:
+        etags = [None] * len(resource_urls)
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=HTTP_KEEP_ALIVE_IDLE)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+
+        async def fetch(resource_url, etag):
+            async with semaphore:
+                return await fetch_resource_async(session, resource_url, etag=etag, **kwargs)
+
+        return await asyncio.gather(
+            *(fetch(url, etag) for url, etag in zip(resource_urls, etags)), return_exceptions=True
+        )
+
+
+async def fetch_resource_async(session, resource_url, etag=None, raise_error=True, **kwargs):
+    """
+    Fetches a resource from the given URL, with the retry policy, throttling & errors of
+    `fetch_service.fetch_resource_conditional`. The rate limiter & circuit breaker of the
+    locations API are shared with the synchronous requests.
+
+    :return: A FetchResult, `content` is None when the resource was not modified.
+    """
+    logger.info("Fetching resource: %s", resource_url)
+
+    params = {k: str(v) for k, v in kwargs.get("params", {}).items()}
+    headers = dict(kwargs.get("headers", {}))
+    timeout = kwargs.get("timeout") or FETCH_TIMEOUT
+    if etag:
+        headers["If-None-Match"] = etag
+
+    upstream = get_upstream(FETCH_UPSTREAM)
+    deadline = Deadline(timeout * 1000)
+    client_timeout = aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+    throttled = False
+    for attempt in range(FETCH_RETRIES + 1):
+        if attempt > 1 and not throttled:  # same backoff as urllib3, none before the 1st retry;
+            await asyncio.sleep(FETCH_BACKOFF_FACTOR * (2 ** (attempt - 1)))
+        await asyncio.sleep(upstream.reserve(max_wait=deadline.remaining()))
+        try:
+            async with session.get(
+                resource_url, params=params, headers=headers, timeout=client_timeout
+            ) as response:
+                throttled = response.status in FETCH_THROTTLE_STATUSES
+                if throttled:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    upstream.throttled(retry_after)
+                    if response.status == 503:  # unavailable, not only throttled;
+                        upstream.failed()
+                    if attempt < FETCH_RETRIES and (retry_after or 0) < deadline.remaining():
+                        continue
+                elif response.status >= 500:
+                    if response.status in FETCH_STATUS_FORCELIST and attempt < FETCH_RETRIES:
+                        continue
+                    upstream.failed()  # once retried, like the synchronous requests;
+                else:
+                    upstream.succeeded()
+
+                if response.status == 304:
+                    logger.debug("Resource not modified: %s", response.url)
+
+                    return FetchResult(content=None, etag=etag, size=0, not_modified=True)
+
+                if response.status != 200:
+                    logger.warning(
+                        "Received %s status code for resource: %s", response.status, response.url
+                    )
+                    response.raise_for_status()
+
+                content = await read_content(response, FETCH_MAX_PAYLOAD_BYTES)
+
+                return FetchResult(
+                    content=json.loads(content),
+                    etag=response.headers.get("ETag"),
+                    size=len(content),
+                    not_modified=False,
+                )
+        except aiohttp.ClientResponseError as e:
+            logger.error("Failed to fetch resource: %s %s", resource_url, e)
+
+            if raise_error:
+                raise ResourceFetchException(f"Failed to fetch resource: {resource_url}")
+            return None
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == FETCH_RETRIES:
+                upstream.failed()
+                raise
+
+
+async def read_content(response, max_bytes):
+    """
+    Read the body of a response, enforcing a payload size cap.
+    """
+    check_payload_size(response.content_length or 0, max_bytes, response.url)
+
+    content = bytearray()
+    async for chunk in response.content.iter_chunked(64 * 1024):
+        content.extend(chunk)
+        check_payload_size(len(content), max_bytes, response.url)
+
+    return content
@@ -17,26 +17,109 @@
   specific language governing permissions and limitations under the License.
 """
 
+import json
+import logging
 import os
+import socket
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3 import Retry
 
+from helpers.deadline import Deadline
 from helpers.logging import get_logger
+from helpers.metrics import timed
+from helpers.throttle import get_upstream, parse_retry_after
 from helpers.util import filesizeformat
 
-FETCH_TIMEOUT = os.environ.get("FETCH_TIMEOUT", 60)  # in seconds
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", 60))  # in seconds
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 10))  # number of hosts pooled
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 10))  # connections kept per host
+HTTP_KEEP_ALIVE = os.environ.get("HTTP_KEEP_ALIVE", "true").lower() == "true"
+HTTP_KEEP_ALIVE_IDLE = int(os.environ.get("HTTP_KEEP_ALIVE_IDLE", 60))  # in seconds
+FETCH_MAX_PAYLOAD_BYTES = int(os.environ.get("FETCH_MAX_PAYLOAD_BYTES", 256 * 1024 * 1024))
+
+# retry policy of the pooled sessions, shared with the async fetch service.
+FETCH_RETRIES = 3
+FETCH_BACKOFF_FACTOR = 0.3
+FETCH_STATUS_FORCELIST = (500, 502, 504)
+# throttled responses, retried after their Retry-After delay at a lowered request rate.
+FETCH_THROTTLE_STATUSES = (429, 503)
+FETCH_UPSTREAM = "locations"  # rate limiter & circuit breaker of the locations API
 
 logger = get_logger("fetch-service")
 
+FetchResult = namedtuple("FetchResult", ["content", "etag", "size", "not_modified"])
+
+
+_session = None
+_session_lock = threading.Lock()
+
 
 class ResourceFetchException(Exception):
     pass
 
 
+class PayloadTooLargeException(ResourceFetchException):
+    pass
+
+
+class BoundedReader:
+    """
+    File-like reader over a streamed response body, enforcing a payload size cap
+    on the decoded bytes read so far.
+    """
+
+    def __init__(self, response, max_bytes):
+        self.response = response
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.eof = False
+
+    def read(self, size=-1):
+        chunk = self.response.raw.read(size if size >= 0 else None, decode_content=True)
+        if not chunk:
+            self.eof = True
+
+        self.bytes_read += len(chunk)
+        check_payload_size(self.bytes_read, self.max_bytes, self.response.url)
+
+        return chunk
+
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter enabling TCP keep-alive probes on pooled connections, so idle
+    connections are not silently dropped (e.g. by NAT gateways) between invocations.
+    """
+
+    def __init__(self, keep_alive_idle=None, **kwargs):
+        self.keep_alive_idle = keep_alive_idle
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.keep_alive_idle:
+            socket_options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+            socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            if hasattr(socket, "TCP_KEEPIDLE"):  # not available on all platforms;
+                socket_options.append(
+                    (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keep_alive_idle)
+                )
+            kwargs["socket_options"] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
 def requests_retry_session(
-    retries=3, backoff_factor=0.3, status_forcelist=(500, 502, 504), session=None,
+    retries=FETCH_RETRIES,
+    backoff_factor=FETCH_BACKOFF_FACTOR,
+    status_forcelist=FETCH_STATUS_FORCELIST,
+    session=None,
+    pool_connections=HTTP_POOL_CONNECTIONS,
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    keep_alive_idle=None,
 ):
     """
     Drop-in replacement for requests.get with support for retries. Uses an exponential
@@ -47,6 +130,9 @@ def requests_retry_session(
     :param backoff_factor: A backoff factor to apply between attempts.
     :param status_forcelist: HTTP status codes to force a retry on.
     :param session:
+    :param pool_connections: The number of connection pools (hosts) to cache.
+    :param pool_maxsize: The maximum number of connections to keep in each pool.
+    :param keep_alive_idle: Idle time in seconds before sending TCP keep-alive probes.
     :return:
     """
     if session is None:
@@ -59,41 +145,243 @@ def requests_retry_session(
         backoff_factor=backoff_factor,
         status_forcelist=status_forcelist,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = KeepAliveHTTPAdapter(
+        keep_alive_idle=keep_alive_idle,
+        max_retries=retry,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+    )
     session.mount("http://", adapter)
     session.mount("https://", adapter)
 
     return session
 
 
+def get_session():
+    """
+    Module-level pooled session, reused across calls and warm invocations.
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests_retry_session(
+                    keep_alive_idle=HTTP_KEEP_ALIVE_IDLE if HTTP_KEEP_ALIVE else None
+                )
+                if not HTTP_KEEP_ALIVE:
+                    session.headers["Connection"] = "close"
+                _session = session
+    return _session
+
+
+def connection_stats():
+    """
+    Connection reuse of the pooled session, for the connection pools currently alive.
+
+    :return: A dict with the number of requests, new connections and the reuse rate.
+    """
+    num_requests, num_connections = 0, 0
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                num_requests += pool.num_requests
+                num_connections += pool.num_connections
+
+    reuse_rate = 1 - num_connections / num_requests if num_requests else 0.0
+
+    return {"requests": num_requests, "connections": num_connections, "reuse_rate": reuse_rate}
+
+
 def fetch_resource(resource_url, raise_error=True, **kwargs):
     """
     Fetches a resource from the given URL.
     """
-    logger.info(f"Fetching resource: {resource_url}")
+    result = fetch_resource_conditional(resource_url, raise_error=raise_error, **kwargs)
+
+    return result.content if result else None
+
+
+def fetch_resource_conditional(resource_url, etag=None, raise_error=True, **kwargs):
+    """
+    Fetches a resource from the given URL, revalidating a cached representation
+    through `If-None-Match` when an ETag is given.
+
+    :return: A FetchResult, `content` is None when the resource was not modified.
+    """
+    logger.info("Fetching resource: %s", resource_url)
 
     params = kwargs.get("params", {})
-    headers = kwargs.get("headers", {})
+    headers = dict(kwargs.get("headers", {}))
+    timer = kwargs.get("timer")  # optional StageTimer;
+    timeout = kwargs.get("timeout") or FETCH_TIMEOUT  # in seconds, bounded by the caller deadline;
+    if etag:
+        headers["If-None-Match"] = etag
 
-    json_decoded = None
+    result = None
     try:
-        response = requests_retry_session().get(
-            resource_url, params=params, headers=headers, timeout=FETCH_TIMEOUT
+        with timed(timer, "fetch"):
+            response = throttled_get(
+                resource_url, params=params, headers=headers, timeout=timeout, stream=True
+            )
+
+            # closed on errors, released to the pool once consumed
+            with response:
+                if response.status_code == 304:
+                    logger.debug("Resource not modified: %s", response.url)
+
+                    return FetchResult(content=None, etag=etag, size=0, not_modified=True)
+
+                if response.status_code != 200:
+                    logger.warning(
+                        "Received %s status code for resource: %s",
+                        response.status_code,
+                        response.url,
+                    )
+                    response.raise_for_status()
+
+                content = read_content(response, FETCH_MAX_PAYLOAD_BYTES)
+                size = len(content)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Fetched %s payload for resource: %s", filesizeformat(size), response.url)
+            logger.debug("Connection stats: %s", connection_stats())
+
+        with timed(timer, "deserialize"):
+            content = json.loads(content)
+
+        result = FetchResult(
+            content=content, etag=response.headers.get("ETag"), size=size, not_modified=False,
         )
+    except requests.exceptions.HTTPError as e:
+        logger.error("Failed to fetch resource: %s %s", resource_url, e)
+
+        if raise_error:
+            raise ResourceFetchException(f"Failed to fetch resource: {resource_url}")
+
+    return result
+
 
+@contextmanager
+def stream_resource(resource_url, max_bytes=FETCH_MAX_PAYLOAD_BYTES, **kwargs):
+    """
+    Streams a resource from the given URL, the body is never held in memory as a whole.
+
+    Usage::
+
+        with stream_resource(url, headers=headers) as reader:
+            for prefix, event, value in ijson.parse(reader):
+                ...
+
+    :param max_bytes: Maximum size of the (decoded) payload.
+    :return: A file-like object, reading the response body.
+    """
+    logger.info("Streaming resource: %s", resource_url)
+
+    params = kwargs.get("params", {})
+    headers = kwargs.get("headers", {})
+    timeout = kwargs.get("timeout") or FETCH_TIMEOUT
+
+    response = throttled_get(
+        resource_url, params=params, headers=headers, timeout=timeout, stream=True
+    )
+    reader = BoundedReader(response, max_bytes)
+    try:
         if response.status_code != 200:
-            logger.warn(f"Received {response.status_code} status code for resource: {response.url}")
-            response.raise_for_status()
+            logger.warning(
+                "Received %s status code for resource: %s", response.status_code, response.url
+            )
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                logger.error("Failed to fetch resource: %s %s", resource_url, e)
+                raise ResourceFetchException(f"Failed to fetch resource: {resource_url}")
+
+        content_length = int(response.headers.get("Content-Length", 0))
+        check_payload_size(content_length, max_bytes, response.url)
+
+        yield reader
 
         logger.debug(
-            f"Fetched {filesizeformat(len(response.content))} payload for resource: {response.url}"
+            "Streamed %s payload for resource: %s", filesizeformat(reader.bytes_read), response.url
         )
+    finally:
+        if reader.eof:
+            response.raw.release_conn()  # fully consumed, the connection can be reused;
+        else:
+            response.close()
 
-        json_decoded = response.json()
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"Failed to fetch resource: {resource_url} {e}")
 
-        if raise_error:
-            raise ResourceFetchException(f"Failed to fetch resource: {resource_url}")
+def throttled_get(resource_url, timeout=None, retries=FETCH_RETRIES, **kwargs):
+    """
+    GET through the pooled session, paced by the adaptive rate limiter of the locations
+    API and guarded by its circuit breaker. Throttled responses are retried after their
+    `Retry-After` delay while the timeout allows it, server errors & connection failures
+    (once retried by the session) count towards opening the circuit.
+
+    :param timeout: Timeout in seconds of the request, also bounding the throttling delays.
+    :param retries: Number of retries of throttled responses.
+    :return: The response, throttled when the retries are exhausted.
+    :raises ThrottleException: When the circuit is open or no time is left to wait.
+    """
+    upstream = get_upstream(FETCH_UPSTREAM)
+    timeout = timeout or FETCH_TIMEOUT
+    deadline = Deadline(timeout * 1000)
+
+    for attempt in range(retries + 1):
+        upstream.acquire(max_wait=deadline.remaining())
+        try:
+            response = get_session().get(resource_url, timeout=timeout, **kwargs)
+        except (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.RetryError,
+        ):
+            upstream.failed()
+            raise
+
+        if response.status_code in FETCH_THROTTLE_STATUSES:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            upstream.throttled(retry_after)
+            if response.status_code == 503:  # unavailable, not only throttled;
+                upstream.failed()
 
-    return json_decoded
+            if attempt < retries and (retry_after or 0) < deadline.remaining():
+                logger.warning(
+                    "Throttled (%s) fetching resource: %s retrying in %ss",
+                    response.status_code,
+                    resource_url,
+                    retry_after,
+                )
+                response.close()
+                continue
+        elif response.status_code >= 500:
+            upstream.failed()
+        else:
+            upstream.succeeded()
+
+        return response
+
+
+def read_content(response, max_bytes):
+    """
+    Read the body of a streamed response, enforcing a payload size cap.
+    """
+    content_length = int(response.headers.get("Content-Length", 0))
+    check_payload_size(content_length, max_bytes, response.url)
+
+    content = bytearray()
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        content.extend(chunk)
+        check_payload_size(len(content), max_bytes, response.url)
+
+    return content
+
+
+def check_payload_size(size, max_bytes, resource_url):
+    if max_bytes and size > max_bytes:
+        raise PayloadTooLargeException(
+            f"Payload exceeds the {filesizeformat(max_bytes)} limit for resource: {resource_url}"
+        )
@@ -0,0 +1,361 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import fcntl
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from helpers.logging import get_logger
+
+LEDGER_URL = os.environ.get("LEDGER_URL", "file:///tmp/ledger")  # empty disables the ledger
+LEDGER_TTL = int(os.environ.get("LEDGER_TTL", 3600))  # in seconds, of completed work
+LEDGER_LEASE = int(os.environ.get("LEDGER_LEASE", 900))  # in seconds, of work in flight
+
+logger = get_logger("ledger")
+
+
+class LedgerException(Exception):
+    pass
+
+
+class LedgerBackend:
+    """
+    Atomic claims of keys, expiring after a TTL.
+    """
+
+    def claim(self, key, ttl):
+        """
+        Claim the key unless already claimed and not yet expired.
+
+        :return: True if the claim succeeded.
+        """
+        raise NotImplementedError
+
+    def mark(self, key, ttl):
+        """
+        Set the expiration of the key, claimed or not.
+        """
+        raise NotImplementedError
+
+    def release(self, key):
+        raise NotImplementedError
+
+    def claimed(self, key):
+        """
+        :return: True if the key is claimed or marked, and not yet expired.
+        """
+        raise NotImplementedError
+
+
+class InMemoryLedger(LedgerBackend):
+    """
+    Process local claims, used for tests.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key, ttl):
+        now = self.clock()
+        with self._lock:
+            if self._expires.get(key, 0) > now:
+                return False
+            self._expires[key] = now + ttl
+            return True
+
+    def mark(self, key, ttl):
+        with self._lock:
+            self._expires[key] = self.clock() + ttl
+
+    def release(self, key):
+        with self._lock:
+            self._expires.pop(key, None)
+
+    def claimed(self, key):
+        return self._expires.get(key, 0) > self.clock()
+
+
+class LocalFileLedger(LedgerBackend):
+    """
+    Claims as files below a root directory, linked exclusively. Shared by the processes
+    of a host, i.e. a single warm AWS Lambda container.
+
+    Expired claims are taken over under an exclusive lock of the claim file, compared
+    again once locked: a single process takes over, the others see the new claim.
+    """
+
+    def __init__(self, root, clock=time.time):
+        self.root = root
+        self.clock = clock
+
+    def claim(self, key, ttl):
+        filepath = self._filepath(key)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        for _ in range(3):
+            try:
+                self._link(filepath, self.clock() + ttl)
+                return True
+            except FileExistsError:
+                pass
+            with self._locked(filepath) as linked:
+                if not linked:  # released or taken over meanwhile, claim again;
+                    continue
+                if self._expires(filepath) > self.clock():
+                    return False
+                self._replace(filepath, self.clock() + ttl)
+                return True
+        return False
+
+    def mark(self, key, ttl):
+        filepath = self._filepath(key)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+
+        with self._locked(filepath):
+            self._replace(filepath, self.clock() + ttl)
+
+    def release(self, key):
+        try:
+            os.remove(self._filepath(key))
+        except FileNotFoundError:
+            pass
+
+    def claimed(self, key):
+        return self._expires(self._filepath(key)) > self.clock()
+
+    @contextmanager
+    def _locked(self, filepath):
+        """
+        Lock the claim file exclusively, yielding False when it does not exist or was
+        removed or replaced before the lock was acquired.
+        """
+        try:
+            fd = os.open(filepath, os.O_RDONLY)
+        except FileNotFoundError:
+            fd = None
+        if fd is None:
+            yield False
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                linked = os.stat(filepath).st_ino == os.fstat(fd).st_ino
+            except FileNotFoundError:
+                linked = False
+            yield linked
+        finally:
+            os.close(fd)  # releases the lock;
+
+    def _link(self, filepath, expires):
+        """
+        Create the claim file with its content at once.
+
+        :raises FileExistsError: When already claimed.
+        """
+        tmp_filepath = self._write_tmp(filepath, expires)
+        try:
+            os.link(tmp_filepath, filepath)
+        finally:
+            os.remove(tmp_filepath)
+
+    def _replace(self, filepath, expires):
+        os.replace(self._write_tmp(filepath, expires), filepath)
+
+    def _write_tmp(self, filepath, expires):
+        tmp_filepath = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_filepath, "w") as f:
+            f.write(str(expires))
+        return tmp_filepath
+
+    def _expires(self, filepath):
+        try:
+            with open(filepath) as f:
+                return float(f.read() or 0)
+        except (OSError, ValueError):
+            return 0.0
+
+    def _filepath(self, key):
+        filepath = os.path.abspath(os.path.join(self.root, key))
+        if not filepath.startswith(os.path.abspath(self.root) + os.sep):
+            raise LedgerException(f"Invalid ledger key: {key}")
+        return filepath
+
+
+class DynamoDBLedger(LedgerBackend):
+    """
+    Claims as items of a DynamoDB table, shared by all containers. The table has a
+    string `key` partition key and `expires` as TTL attribute.
+    """
+
+    def __init__(self, table, client=None, clock=time.time):
+        if client is None:
+            import boto3
+
+            client = boto3.client("dynamodb")
+        self.client = client
+        self.table = table
+        self.clock = clock
+
+    def claim(self, key, ttl):
+        now = int(self.clock())
+        try:
+            self.client.put_item(
+                TableName=self.table,
+                Item={"key": {"S": key}, "expires": {"N": str(now + ttl)}},
+                # expired items are only deleted eventually by DynamoDB, overwrite them
+                ConditionExpression="attribute_not_exists(#k) OR #e < :now",
+                ExpressionAttributeNames={"#k": "key", "#e": "expires"},
+                ExpressionAttributeValues={":now": {"N": str(now)}},
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def mark(self, key, ttl):
+        expires = int(self.clock()) + ttl
+        self.client.put_item(
+            TableName=self.table, Item={"key": {"S": key}, "expires": {"N": str(expires)}},
+        )
+
+    def release(self, key):
+        self.client.delete_item(TableName=self.table, Key={"key": {"S": key}})
+
+    def claimed(self, key):
+        response = self.client.get_item(
+            TableName=self.table, Key={"key": {"S": key}}, ConsistentRead=True
+        )
+        item = response.get("Item")
+        return item is not None and int(item["expires"]["N"]) >= int(self.clock())
+
+
+class Ledger:
+    """
+    Idempotency ledger of the worker, suppressing events delivered more than once
+    and metrics already computed, or being computed, for a location version; and of the
+    reducer, merging the tiles of a metric once.
+
+    Work in flight is claimed with a short lease, about the time left to the invocation,
+    and marked as completed for `ttl` once done: the claims of an invocation killed by
+    a timeout or out of memory expire before the retries of the event are delivered.
+    """
+
+    def __init__(self, backend, ttl=LEDGER_TTL, lease=LEDGER_LEASE):
+        self.backend = backend
+        self.ttl = ttl
+        self.lease = lease
+
+    def claim_message(self, message_id, lease=None):
+        """
+        :param lease: Seconds the claim is held until completed or released, e.g. the time
+            left to the invocation, defaults to `LEDGER_LEASE`.
+        """
+        return self._claim(f"messages/{message_id}", lease)
+
+    def complete_message(self, message_id):
+        self._mark(f"messages/{message_id}")
+
+    def release_message(self, message_id):
+        self._release(f"messages/{message_id}")
+
+    def claim_metric(self, location, version, slug, tile=None, lease=None):
+        return self._claim(self.metric_key(location, version, slug, tile), lease)
+
+    def complete_metric(self, location, version, slug, tile=None):
+        self._mark(self.metric_key(location, version, slug, tile))
+
+    def release_metric(self, location, version, slug, tile=None):
+        self._release(self.metric_key(location, version, slug, tile))
+
+    def claim_reduction(self, location, version, slug, lease=None):
+        """
+        Claim the merge of the tiles of a metric, a single invocation publishes the result.
+        """
+        return self._claim(f"reductions/{location}/{version}/{slug}/merge", lease)
+
+    def complete_reduction(self, location, version, slug):
+        self._mark(f"reductions/{location}/{version}/{slug}/done")
+
+    def release_reduction(self, location, version, slug):
+        self._release(f"reductions/{location}/{version}/{slug}/merge")
+
+    def reduced(self, location, version, slug):
+        """
+        :return: True if the tiles of the metric were merged & published.
+        """
+        key = f"reductions/{location}/{version}/{slug}/done"
+        try:
+            return self.backend.claimed(key)
+        except Exception as e:
+            logger.warning("Failed to read ledger key: %s %s", key, e)
+            return False
+
+    @staticmethod
+    def metric_key(location, version, slug, tile=None):
+        key = f"metrics/{location}/{version}/{slug}"
+        if tile is not None:
+            rows, cols = tile["grid"]
+            key = f"{key}/{rows}x{cols}-{tile['index']}"
+        return key
+
+    def _claim(self, key, lease=None):
+        lease = max(1, int(math.ceil(lease))) if lease is not None else self.lease
+        try:
+            return self.backend.claim(key, lease)
+        except Exception as e:  # an unavailable ledger must not block the computations;
+            logger.warning("Failed to claim ledger key: %s %s", key, e)
+            return True
+
+    def _mark(self, key):
+        try:
+            self.backend.mark(key, self.ttl)
+        except Exception as e:
+            logger.warning("Failed to complete ledger key: %s %s", key, e)
+
+    def _release(self, key):
+        try:
+            self.backend.release(key)
+        except Exception as e:
+            logger.warning("Failed to release ledger key: %s %s", key, e)
+
+
+def get_ledger(url=LEDGER_URL, ttl=LEDGER_TTL, lease=LEDGER_LEASE):
+    """
+    Build the ledger from its backend URL, one of: `memory://`, `file:///path/to/root`,
+    `dynamodb://table`. None when disabled.
+    """
+    if not url:
+        return None
+
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        backend = InMemoryLedger()
+    elif parsed.scheme == "file":
+        backend = LocalFileLedger(parsed.path)
+    elif parsed.scheme == "dynamodb":
+        backend = DynamoDBLedger(parsed.netloc)
+    else:
+        raise LedgerException(f"Unsupported ledger: {url}")
+
+    return Ledger(backend, ttl, lease)
@@ -21,15 +21,47 @@ import os
 
 import json_api_doc
 
+from helpers.cache import TwoTierCache
+from helpers.geojson import parse_location_stream
+from helpers.geoparquet import (
+    GEOPARQUET_MEDIA_TYPE,
+    accept_header,
+    geoparquet_available,
+    is_geoparquet,
+    read_location_parquet,
+)
 from helpers.logging import get_logger
+from helpers.metrics import timed
 from helpers.util import urljoin
-from services.fetch_service import fetch_resource
+from services.fetch_service import (
+    PayloadTooLargeException,
+    fetch_resource,
+    fetch_resource_conditional,
+    stream_resource,
+)
 
 SERVICE_API_ENDPOINT = os.environ["SERVICE_API_ENDPOINT"]
 SERVICE_API_KEY = os.environ.get("SERVICE_API_KEY", None)  # ApiKey (optional)
 
+LOCATION_CACHE_ENABLED = os.environ.get("LOCATION_CACHE_ENABLED", "true").lower() == "true"
+LOCATION_CACHE_MEMORY_BYTES = int(os.environ.get("LOCATION_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+LOCATION_CACHE_DIR = os.environ.get("LOCATION_CACHE_DIR", "/tmp/location-cache")
+LOCATION_CACHE_DISK_BYTES = int(os.environ.get("LOCATION_CACHE_DISK_BYTES", 256 * 1024 * 1024))
+LOCATION_FORMAT = os.environ.get("LOCATION_FORMAT", "json")  # preferred geometry encoding
+
+# media types of the binary location encodings, negotiated with a JSON:API fallback.
+LOCATION_MEDIA_TYPES = {"geoparquet": GEOPARQUET_MEDIA_TYPE}
+
 logger = get_logger("location-service")
 
+# shared by all service instances, survives across warm invocations of the container.
+location_cache = TwoTierCache(
+    max_memory_bytes=LOCATION_CACHE_MEMORY_BYTES,
+    directory=LOCATION_CACHE_DIR,
+    max_disk_bytes=LOCATION_CACHE_DISK_BYTES,
+)
+latest_versions = {}  # latest known version by (id, fields), used for revalidation;
+
 
 class LocationServiceException(Exception):
     pass
@@ -38,14 +70,39 @@ class LocationServiceException(Exception):
 class LocationService:
     headers = {"Accept": "application/vnd.api+json"}
 
-    def __init__(self):
+    def __init__(self, cache=None, location_format=LOCATION_FORMAT):
         if SERVICE_API_KEY:
             self.headers["ApiKey"] = SERVICE_API_KEY
         self.endpoint = SERVICE_API_ENDPOINT
+        if cache is None and LOCATION_CACHE_ENABLED:
+            cache = location_cache
+        self.cache = cache
+        if location_format != "json" and location_format not in LOCATION_MEDIA_TYPES:
+            raise LocationServiceException(f"Unsupported location format: {location_format}")
+        if location_format == "geoparquet" and not geoparquet_available():
+            logger.warning("Requesting JSON locations, pyarrow is required to decode GeoParquet")
+            location_format = "json"
+        self.location_format = location_format
 
     def get_by_id(
-        self, resource_id, include_fields=None, select_fields=None, raise_error=True,
+        self,
+        resource_id,
+        include_fields=None,
+        select_fields=None,
+        raise_error=True,
+        version=None,
+        timer=None,
+        timeout=None,
     ):
+        """
+        Retrieve a location by id. Documents are cached by (id, version, fields) and the
+        latest known representation is revalidated through its ETag; cached documents are
+        shared between callers and must not be mutated.
+
+        :param version: The expected version, served from cache without revalidation.
+        :param timer: Optional StageTimer, records the fetch & deserialize stages.
+        :param timeout: Optional request timeout in seconds, defaults to `FETCH_TIMEOUT`.
+        """
         params = {}
         if include_fields:
             params["include"] = self._encode(include_fields)
@@ -54,14 +111,250 @@ class LocationService:
 
         resource_url = self._url("/locations", resource_id)
         try:
-            content = fetch_resource(resource_url, headers=self.headers, params=params)
-            return self._deserialize(content)
+            if self.cache is None:
+                result = fetch_resource_conditional(
+                    resource_url, headers=self.headers, params=params, timer=timer, timeout=timeout
+                )
+                if timer is not None:
+                    timer.set(payloadBytes=result.size)
+                with timed(timer, "deserialize"):
+                    return self._deserialize(result.content)
+            return self._get_cached(resource_id, version, resource_url, params, timer, timeout)
+        except PayloadTooLargeException:
+            raise
         except Exception as e:
-            logger.error(f"Failed to retrieve location: {resource_id} {e}")
+            logger.error("Failed to retrieve location: %s %s", resource_id, e)
 
             if raise_error:
                 raise LocationServiceException(f"Failed to retrieve location: {resource_id}")
 
+    def get_geodataframe_by_id(
+        self, resource_id, select_fields=None, raise_error=True, timer=None, timeout=None,
+    ):
+        """
+        Retrieve a location by id, decoding its geometries straight into a GeoDataFrame.
+        Memory bound alternative to `get_by_id` for huge locations.
+
+        The binary `location_format` of the service is negotiated when configured, e.g.
+        GeoParquet (WKB geometries), geojson features are streamed & decoded otherwise.
+
+        :param timer: Optional StageTimer, records the fetch (streamed & decoded) and
+            geodataframe stages.
+        :param timeout: Optional request timeout in seconds, defaults to `FETCH_TIMEOUT`.
+        :return: A tuple of the document (without geojson) and the GeoDataFrame.
+        """
+        from geopandas import GeoDataFrame
+
+        params = {}
+        if select_fields:
+            params["select"] = self._encode(select_fields)
+
+        headers = self.headers
+        if self.location_format in LOCATION_MEDIA_TYPES:
+            media_types = [LOCATION_MEDIA_TYPES[self.location_format]]
+            headers = {**self.headers, "Accept": accept_header(media_types)}
+
+        resource_url = self._url("/locations", resource_id)
+        try:
+            document, rows, content = self._stream_location(
+                resource_url, headers, params, timer, timeout
+            )
+            if content is not None:
+                try:
+                    with timed(timer, "geodataframe"):
+                        return read_location_parquet(content)
+                except Exception as e:  # requested again as JSON:API;
+                    logger.warning("Failed to decode GeoParquet location: %s %s", resource_id, e)
+                    document, rows, _ = self._stream_location(
+                        resource_url, self.headers, params, timer, timeout
+                    )
+            with timed(timer, "geodataframe"):
+                return document, GeoDataFrame(rows)
+        except PayloadTooLargeException:
+            raise
+        except Exception as e:
+            logger.error("Failed to retrieve location: %s %s", resource_id, e)
+
+            if raise_error:
+                raise LocationServiceException(f"Failed to retrieve location: {resource_id}")
+
+    def get_many(
+        self, resource_ids, include_fields=None, select_fields=None, raise_error=True, versions=None
+    ):
+        """
+        Retrieve locations by id concurrently, over a shared connection pool with at most
+        `FETCH_CONCURRENCY` requests in flight. Same retries & errors as `get_by_id`:
+        a failed location raises, or is returned as None when `raise_error` is False.
+        Documents are cached & revalidated like those of `get_by_id`.
+
+        :param versions: Optional list of the expected versions, in the order of the ids,
+            served from cache without request.
+        :return: The list of documents, in the order of the ids.
+        """
+        from services.async_fetch_service import fetch_resources  # only needed for batches;
+
+        params = {}
+        if include_fields:
+            params["include"] = self._encode(include_fields)
+        if select_fields:
+            params["select"] = self._encode(select_fields)
+        fields = [params.get("include"), params.get("select")]
+
+        if versions is None:
+            versions = [None] * len(resource_ids)
+        documents = [None] * len(resource_ids)
+        fetched, latest = [], {}  # indexes of the ids to fetch & their cached representation;
+        for i, (resource_id, version) in enumerate(zip(resource_ids, versions)):
+            if self.cache is not None:
+                entry = self._cached_entry(resource_id, version, fields)
+                if entry is not None:
+                    documents[i] = entry["document"]
+                    continue
+                latest[i] = self._latest_entry(resource_id, fields)
+            fetched.append(i)
+
+        if not fetched:
+            return documents
+
+        resource_urls = [self._url("/locations", resource_ids[i]) for i in fetched]
+        etags = [latest[i]["etag"] if latest.get(i) else None for i in fetched]
+        results = fetch_resources(resource_urls, etags=etags, headers=self.headers, params=params)
+
+        for i, result in zip(fetched, results):
+            resource_id = resource_ids[i]
+            if isinstance(result, PayloadTooLargeException):
+                raise result
+            if isinstance(result, Exception):
+                logger.error("Failed to retrieve location: %s %s", resource_id, result)
+
+                if raise_error:
+                    raise LocationServiceException(f"Failed to retrieve location: {resource_id}")
+                continue
+
+            if result.not_modified:
+                self.cache.stats["revalidations"] += 1
+                documents[i] = latest[i]["document"]
+                continue
+
+            document = self._deserialize(result.content)
+            if self.cache is not None:
+                self._cache_document(resource_id, fields, result, document)
+            documents[i] = document
+
+        return documents
+
+    def get_page(self, select_fields=None, filters=None, page_size=100, cursor=None, timeout=None):
+        """
+        Retrieve a page of locations, following the cursor of the previous page.
+
+        :param filters: Filter expression supported by the API, all locations when omitted.
+        :param timeout: Optional request timeout in seconds, defaults to `FETCH_TIMEOUT`.
+        :return: A tuple of the list of documents and the cursor of the next page,
+            None on the last page.
+        """
+        params = {"page[size]": page_size}
+        if select_fields:
+            params["select"] = self._encode(select_fields)
+        if filters:
+            params["filter"] = filters
+        if cursor:
+            params["page[cursor]"] = cursor
+
+        resource_url = self._url("/locations")
+        try:
+            content = fetch_resource(
+                resource_url, headers=self.headers, params=params, timeout=timeout
+            )
+        except Exception as e:
+            logger.error("Failed to retrieve locations page: %s %s", cursor, e)
+            raise LocationServiceException(f"Failed to retrieve locations page: {cursor}")
+
+        next_cursor = content.get("meta", {}).get("pagination", {}).get("nextCursor")
+
+        return self._deserialize(content) or [], next_cursor
+
+    def _stream_location(self, resource_url, headers, params, timer=None, timeout=None):
+        """
+        :return: A tuple of the document, its geojson feature rows and the GeoParquet
+            content, either the rows or the content being None.
+        """
+        document, rows, content = None, None, None
+        with timed(timer, "fetch"):
+            with stream_resource(
+                resource_url, headers=headers, params=params, timeout=timeout
+            ) as reader:
+                if is_geoparquet(reader.response.headers.get("Content-Type")):
+                    content = b"".join(iter(lambda: reader.read(1 << 20), b""))
+                else:  # not supported by the API, fall back to JSON:API;
+                    document, rows = parse_location_stream(reader)
+        if timer is not None:
+            timer.set(payloadBytes=reader.bytes_read, binary=content is not None)
+        return document, rows, content
+
+    def _get_cached(self, resource_id, version, resource_url, params, timer=None, timeout=None):
+        fields = [params.get("include"), params.get("select")]
+
+        entry = self._cached_entry(resource_id, version, fields)
+        if entry is not None:
+            if timer is not None:
+                timer.set(payloadBytes=entry["size"], cached=True)
+            return entry["document"]
+
+        latest = self._latest_entry(resource_id, fields)
+        etag = latest["etag"] if latest else None
+
+        result = fetch_resource_conditional(
+            resource_url,
+            etag=etag,
+            headers=self.headers,
+            params=params,
+            timer=timer,
+            timeout=timeout,
+        )
+        if result.not_modified:
+            self.cache.stats["revalidations"] += 1
+            if timer is not None:
+                timer.set(payloadBytes=latest["size"], cached=True)
+            return latest["document"]
+
+        if timer is not None:
+            timer.set(payloadBytes=result.size, cached=False)
+        with timed(timer, "deserialize"):
+            document = self._deserialize(result.content)
+
+        self._cache_document(resource_id, fields, result, document)
+
+        logger.debug(
+            "Cache miss for location: %s and version: %s %s", resource_id, version, self.cache.stats
+        )
+        return document
+
+    def _cached_entry(self, resource_id, version, fields):
+        """
+        :return: The cached entry of the expected version, None when unknown or not cached.
+        """
+        if version is None:
+            return None
+        entry = self.cache.get((resource_id, version, *fields))
+        if entry is not None:
+            logger.debug("Cache hit for location: %s and version: %s", resource_id, version)
+        return entry
+
+    def _latest_entry(self, resource_id, fields):
+        """
+        :return: The cached entry of the latest known version, to revalidate, or None.
+        """
+        latest_key = (resource_id, *fields)
+        if latest_key not in latest_versions:
+            return None
+        return self.cache.get((resource_id, latest_versions[latest_key], *fields), peek=True)
+
+    def _cache_document(self, resource_id, fields, result, document):
+        entry = {"etag": result.etag, "size": result.size, "document": document}
+        if document.get("version") is not None:
+            self.cache.put((resource_id, document["version"], *fields), entry)
+            latest_versions[(resource_id, *fields)] = document["version"]
+
     def _url(self, *args):
         return urljoin(self.endpoint, *args)
 
@@ -0,0 +1,168 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import gzip
+import hashlib
+import json
+import math
+import os
+
+from helpers.logging import get_logger
+from helpers.storage import get_storage
+
+try:
+    import orjson
+except ImportError:  # falls back to the standard library encoder;
+    orjson = None
+
+PAYLOAD_STORE_URL = os.environ.get("PAYLOAD_STORE_URL", "file:///tmp/payload-store")
+PAYLOAD_MAX_BYTES = int(os.environ.get("PAYLOAD_MAX_BYTES", 200 * 1024))  # SNS limit is 256 KB
+
+PAYLOAD_ENCODING = "json+gzip"
+
+logger = get_logger("payload-store")
+
+
+class PayloadStoreException(Exception):
+    pass
+
+
+def encode_payload(payload):
+    """
+    Compact JSON encoding of the payload, without whitespace. Encoded as the standard
+    library does: non-finite floats as `NaN` & `Infinity`, which orjson encodes as `null`,
+    so payloads with non-finite floats fall back to the standard library encoder.
+
+    :return: The encoded bytes.
+    """
+    if orjson is not None and not _has_non_finite(payload):
+        options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        try:
+            return orjson.dumps(payload, option=options)
+        except orjson.JSONEncodeError:  # e.g. integers over 64 bits;
+            pass
+    return json.dumps(payload, separators=(",", ":"), default=_to_list).encode("utf-8")
+
+
+def _has_non_finite(obj):
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(k) or _has_non_finite(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(item) for item in obj)
+    if hasattr(obj, "dtype"):  # numpy arrays & scalars;
+        if obj.dtype.kind not in "fc":
+            return False
+        import numpy as np
+
+        return not np.isfinite(obj).all()
+    return False
+
+
+def _to_list(obj):
+    if hasattr(obj, "tolist"):  # numpy arrays & scalars, as serialized by orjson;
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class PayloadStore:
+    """
+    Claim-check of the published events: payloads over `max_bytes` once encoded are
+    compressed & stored, the event only carries the keys of the payload required to
+    route it and a reference to the stored payload with its checksum.
+    """
+
+    def __init__(self, backend, max_bytes=PAYLOAD_MAX_BYTES):
+        self.backend = backend
+        self.max_bytes = max_bytes
+
+    def key(self, payload, checksum):
+        resource_id, version, slug = payload["location"], payload.get("version"), payload["slug"]
+        return f"{resource_id}/{version}/{slug}/{checksum}.json.gz"
+
+    def wrap(self, payload):
+        """
+        :param payload: The event payload, with `slug` & `location` keys.
+        :return: The serialized event, the payload itself when small enough.
+        """
+        encoded = encode_payload(payload)
+        if len(encoded) <= self.max_bytes:
+            return encoded.decode("utf-8")
+
+        data = gzip.compress(encoded, compresslevel=6)
+        checksum = hashlib.sha256(data).hexdigest()
+        key = self.key(payload, checksum)
+        self.backend.put(key, data)
+
+        logger.debug(
+            "Stored payload of %s bytes (%s compressed) for resource: %s",
+            len(encoded),
+            len(data),
+            payload["location"],
+        )
+
+        event = {k: v for k, v in payload.items() if k != "metric"}
+        event["payloadRef"] = {
+            "uri": self.backend.uri(key),
+            "key": key,
+            "sha256": checksum,
+            "bytes": len(data),
+            "encoding": PAYLOAD_ENCODING,
+        }
+        return encode_payload(event).decode("utf-8")
+
+    def unwrap(self, decoded):
+        """
+        :param decoded: The deserialized event.
+        :return: The payload, retrieved from the store when the event carries a reference.
+        """
+        ref = decoded.get("payloadRef")
+        if ref is None:
+            return decoded
+
+        if ref.get("encoding") != PAYLOAD_ENCODING:
+            raise PayloadStoreException(f"Unsupported payload encoding: {ref.get('encoding')}")
+
+        data = self.backend.get(ref["key"])
+        if data is None:
+            raise PayloadStoreException(f"Missing stored payload: {ref['uri']}")
+        if hashlib.sha256(data).hexdigest() != ref["sha256"]:
+            raise PayloadStoreException(f"Checksum mismatch of stored payload: {ref['uri']}")
+
+        return json.loads(gzip.decompress(data))
+
+    def delete(self, decoded):
+        """
+        Delete the stored payload of a consumed event, if any.
+        """
+        ref = decoded.get("payloadRef")
+        if ref is None:
+            return
+        try:
+            self.backend.delete(ref["key"])
+        except Exception as e:  # left to the bucket lifecycle rules;
+            logger.warning("Failed to delete stored payload: %s %s", ref["uri"], e)
+
+
+def get_payload_store(url=PAYLOAD_STORE_URL):
+    """
+    Build the payload store from its backend URL, None when disabled.
+    """
+    return PayloadStore(get_storage(url)) if url else None
@@ -0,0 +1,135 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import yaml
+
+from helpers.logging import get_logger
+from helpers.storage import get_storage
+
+RESULT_STORE_URL = os.environ.get("RESULT_STORE_URL", "file:///tmp/result-store")
+RESULT_STORE_NAMESPACE = os.environ.get("RESULT_STORE_NAMESPACE", "v2")  # bump to invalidate
+
+logger = get_logger("result-store")
+
+_config_hashes = {}
+_config_lock = threading.Lock()
+
+
+class ResultStore:
+    """
+    Content-addressed store of metric results. Results are keyed by the hash of the
+    normalized geometry, the metric slug and the hash of the metric configuration, so
+    a new version of a location with an unchanged geometry reuses the stored result.
+
+    Results are stored along their creation time, results older than the maximum age of
+    the metric are computed again.
+    """
+
+    def __init__(self, backend, namespace=RESULT_STORE_NAMESPACE, clock=time.time):
+        self.backend = backend
+        self.namespace = namespace
+        self.clock = clock
+
+    def key(self, slug, geometry_hash, config_hash):
+        return f"{self.namespace}/{slug}/{geometry_hash}/{config_hash}.json"
+
+    def get(self, key, max_age=None):
+        """
+        :param max_age: Optional maximum age in seconds of the result.
+        :return: The stored metric, None when missing or expired.
+        """
+        try:
+            data = self.backend.get(key)
+        except Exception as e:  # the store is an optimization, never fail the computation;
+            logger.warning("Failed to read stored result: %s %s", key, e)
+            return None
+        if data is None:
+            return None
+
+        stored = json.loads(data)
+        if "storedAt" not in stored:  # written by a previous version of the store;
+            return None
+        if max_age is not None and self.clock() - stored["storedAt"] > max_age:
+            logger.debug("Discarding expired stored result: %s", key)
+            return None
+        return stored["metric"]
+
+    def put(self, key, metric):
+        stored = {"storedAt": self.clock(), "metric": metric}
+        try:
+            self.backend.put(key, json.dumps(stored).encode("utf-8"))
+        except Exception as e:
+            logger.warning("Failed to store result: %s %s", key, e)
+
+
+def get_result_store(url=RESULT_STORE_URL):
+    """
+    Build the result store from its backend URL, None when disabled.
+    """
+    return ResultStore(get_storage(url)) if url else None
+
+
+def geometry_hash(gdf, area_km2=None):
+    """
+    Hash of the normalized geometries, independent of the order of the features
+    and of the starting point & orientation of the rings.
+    """
+    digests = sorted(
+        hashlib.sha256(_normalize(geometry).wkb).digest()
+        for geometry in gdf.geometry
+        if geometry is not None and not geometry.is_empty
+    )
+
+    h = hashlib.sha256()
+    for digest in digests:
+        h.update(digest)
+    h.update(repr(area_km2).encode("utf-8"))  # the area is an input of the computations;
+
+    return h.hexdigest()
+
+
+def config_hash(config_filepath, slug, **options):
+    """
+    Hash of the metric configuration: the `earthengine.yaml` assets of the slug and
+    the metric constructor options. Cached until the configuration file changes.
+    """
+    mtime = os.path.getmtime(config_filepath)
+    cache_key = (config_filepath, mtime, slug, tuple(sorted(options.items())))
+
+    with _config_lock:
+        if cache_key not in _config_hashes:
+            with open(config_filepath) as f:
+                config = yaml.safe_load(f) or {}
+
+            assets = (config.get("metrics") or {}).get(slug)
+            encoded = json.dumps({"assets": assets, "options": options}, sort_keys=True)
+
+            _config_hashes[cache_key] = hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+        return _config_hashes[cache_key]
+
+
+def _normalize(geometry):
+    return geometry.normalize() if hasattr(geometry, "normalize") else geometry
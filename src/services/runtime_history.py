@@ -0,0 +1,135 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+
+from config import METRIC_RUNTIME_PRIORS
+from helpers.logging import get_logger
+from helpers.storage import get_storage
+
+RUNTIME_HISTORY_URL = os.environ.get("RUNTIME_HISTORY_URL", "file:///tmp/runtime-history")
+RUNTIME_HISTORY_TTL = int(os.environ.get("RUNTIME_HISTORY_TTL", 300))  # in seconds
+
+DEFAULT_RUNTIME_PRIOR = {"seconds": 30, "seconds_per_km2": 1e-4}
+
+logger = get_logger("runtime-history")
+
+
+def area_bucket(area_km2):
+    """
+    Order of magnitude of the area, e.g. `1e3` for 1000 to 9999 km2.
+    """
+    if not area_km2 or area_km2 < 1:
+        return "1e0"
+    return f"1e{int(math.log10(area_km2))}"
+
+
+class RuntimeHistory:
+    """
+    Moving average of the metric runtimes by slug & area bucket, recorded by the workers
+    and read by the manager to estimate the cost of the jobs. Kept in storage as a single
+    object; the samples of an invocation are buffered and written at once by `flush`.
+    Concurrent updates may drop samples, which the average tolerates.
+    """
+
+    key = "runtimes.json"
+
+    def __init__(self, backend, ttl=RUNTIME_HISTORY_TTL, alpha=0.3):
+        self.backend = backend
+        self.ttl = ttl
+        self.alpha = alpha  # weight of the latest sample;
+        self._runtimes = None  # (read at, runtimes by slug & bucket);
+        self._samples = []
+        self._lock = threading.Lock()
+
+    def get(self, slug):
+        """
+        :return: A dict of area bucket to average runtime in seconds, cached for `ttl`.
+        """
+        with self._lock:
+            cached = self._runtimes
+        if cached is None or time.monotonic() - cached[0] >= self.ttl:
+            cached = (time.monotonic(), self._read())
+            with self._lock:
+                self._runtimes = cached
+        return cached[1].get(slug, {})
+
+    def record(self, slug, area_km2, seconds):
+        """
+        Buffer a runtime sample of the metric, until `flush`.
+        """
+        with self._lock:
+            self._samples.append((slug, area_bucket(area_km2), seconds))
+
+    def flush(self):
+        """
+        Update the averages with the buffered samples, a single read & write.
+        """
+        with self._lock:
+            samples, self._samples = self._samples, []
+        if not samples:
+            return
+
+        runtimes = self._read()
+        for slug, bucket, seconds in samples:
+            previous = runtimes.setdefault(slug, {}).get(bucket)
+            runtimes[slug][bucket] = (
+                seconds if previous is None else self.alpha * seconds + (1 - self.alpha) * previous
+            )
+        try:
+            self.backend.put(self.key, json.dumps(runtimes).encode("utf-8"))
+        except Exception as e:  # estimates only, never fail the computation;
+            logger.warning("Failed to record %s runtimes %s", len(samples), e)
+            return
+        with self._lock:
+            self._runtimes = (time.monotonic(), runtimes)
+
+    def estimate(self, slug, area_km2=None):
+        """
+        Estimated runtime in seconds of the metric for a location of the given area,
+        the recorded average of its area bucket or the prior of the metric.
+        """
+        runtime = self.get(slug).get(area_bucket(area_km2))
+        if runtime is not None:
+            return runtime
+        return estimate_prior(slug, area_km2)
+
+    def _read(self):
+        try:
+            data = self.backend.get(self.key)
+        except Exception as e:
+            logger.warning("Failed to read runtimes %s", e)
+            return {}
+        return json.loads(data) if data is not None else {}
+
+
+def estimate_prior(slug, area_km2=None):
+    prior = METRIC_RUNTIME_PRIORS.get(slug, DEFAULT_RUNTIME_PRIOR)
+    return prior["seconds"] + prior["seconds_per_km2"] * (area_km2 or 0)
+
+
+def get_runtime_history(url=RUNTIME_HISTORY_URL):
+    """
+    Build the runtime history from its backend URL, None when disabled.
+    """
+    return RuntimeHistory(get_storage(url)) if url else None
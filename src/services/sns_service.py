@@ -0,0 +1,110 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import os
+import time
+
+from helpers.logging import get_logger
+
+SNS_BATCH_SIZE = 10  # max entries per PublishBatch request;
+SNS_BATCH_MAX_BYTES = 256 * 1024  # max aggregated payload per PublishBatch request;
+SNS_PUBLISH_RETRIES = int(os.environ.get("SNS_PUBLISH_RETRIES", 3))
+SNS_PUBLISH_BACKOFF = float(os.environ.get("SNS_PUBLISH_BACKOFF", 0.3))  # in seconds
+
+logger = get_logger("sns-service")
+
+
+class PublishException(Exception):
+    pass
+
+
+def chunk_messages(messages, batch_size=SNS_BATCH_SIZE, max_bytes=SNS_BATCH_MAX_BYTES):
+    """
+    Split messages into batches honoring both the entry count and the aggregated payload
+    size limits of a single PublishBatch request.
+    """
+    batch, batch_bytes = [], 0
+    for message in messages:
+        size = len(message.encode("utf-8"))
+        if batch and (len(batch) == batch_size or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(message)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def publish_batch(
+    client, topic_arn, messages, retries=SNS_PUBLISH_RETRIES, backoff_factor=SNS_PUBLISH_BACKOFF,
+):
+    """
+    Publish messages to a topic using as few PublishBatch requests as possible.
+    Entries which failed on the service side are retried with an exponential backoff,
+    entries rejected because of the request itself (sender fault) are not retried.
+
+    :param client: A boto3 SNS client.
+    :param topic_arn: The topic to publish to.
+    :param messages: List of serialized messages.
+    :param retries: Total number of retries to allow for failed entries.
+    :param backoff_factor: A backoff factor to apply between attempts.
+    :return: The number of published messages.
+    """
+    if not hasattr(client, "publish_batch"):  # older botocore releases;
+        for message in messages:
+            client.publish(TopicArn=topic_arn, Message=message)
+        return len(messages)
+
+    published = 0
+    for batch in chunk_messages(messages):
+        published += _publish_entries(client, topic_arn, batch, retries, backoff_factor)
+
+    return published
+
+
+def _publish_entries(client, topic_arn, batch, retries, backoff_factor):
+    pending = {str(i): message for i, message in enumerate(batch)}
+
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff_factor * (2 ** (attempt - 1)))
+
+        entries = [{"Id": k, "Message": v} for k, v in pending.items()]
+        response = client.publish_batch(TopicArn=topic_arn, PublishBatchRequestEntries=entries)
+
+        for entry in response.get("Successful", []):
+            pending.pop(entry["Id"], None)
+
+        failed = response.get("Failed", [])
+        if not failed:
+            break
+
+        sender_faults = [f for f in failed if f.get("SenderFault")]
+        if sender_faults:
+            codes = ", ".join(f"{f['Id']}: {f.get('Code')}" for f in sender_faults)
+            raise PublishException(f"Rejected batch entries for topic: {topic_arn} {codes}")
+
+        logger.warning("Retrying %s failed batch entries for topic: %s", len(failed), topic_arn)
+
+    if pending:
+        raise PublishException(
+            f"Failed to publish {len(pending)} batch entries for topic: {topic_arn}"
+        )
+
+    return len(batch)
@@ -0,0 +1,46 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+sys.path.insert(0, SRC_DIR)
+
+# environment read at import time by the services & handlers, stores kept in memory.
+TEST_ENVIRONMENT = {
+    "SERVICE_API_ENDPOINT": "http://localhost",
+    "LOG_FORMAT": "text",
+    "METRICS_ENABLED": "false",
+    "SENTRY_DSN": "",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "SNS_MANAGER_TOPIC_ARN": "arn:aws:sns:us-east-1:000000000000:manager",
+    "SNS_WORKER_TOPIC_ARN": "arn:aws:sns:us-east-1:000000000000:worker",
+    "SNS_REDUCER_TOPIC_ARN": "arn:aws:sns:us-east-1:000000000000:reducer",
+    "SNS_RESULT_TOPIC_ARN": "arn:aws:sns:us-east-1:000000000000:result",
+    "LEDGER_URL": "memory://",
+    "RESULT_STORE_URL": "memory://",
+    "RUNTIME_HISTORY_URL": "memory://",
+    "PAYLOAD_STORE_URL": "memory://",
+    "TILE_STORE_URL": "memory://",
+    "LOCATION_CACHE_ENABLED": "false",
+}
+for key, value in TEST_ENVIRONMENT.items():
+    os.environ.setdefault(key, value)
@@ -0,0 +1,206 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import json
+import time
+from collections import namedtuple
+
+import pytest
+
+LOCATION_ID = "5f1a1c0e7a6b2c0012345678"
+
+FakeResult = namedtuple("FakeResult", ["area_km2", "features"])
+
+
+class FakeSNS:
+    """
+    SNS client recording the published messages, without `publish_batch` as the locked
+    boto3 release.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, TopicArn, Message):
+        self.messages.append((TopicArn, Message))
+        return {"MessageId": str(len(self.messages))}
+
+    def published(self, topic_arn):
+        return [json.loads(message) for arn, message in self.messages if arn == topic_arn]
+
+
+class FakeLocationService:
+    """
+    Locations API serving square locations by id, the version probe included.
+    """
+
+    location_format = "json"
+
+    def __init__(self, version=1, area_km2=100.0):
+        self.version = version
+        self.area_km2 = area_km2
+        self.requests = []
+
+    def document(self, resource_id):
+        square = [[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]
+        feature = {
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [square]},
+            "properties": {},
+        }
+        return {
+            "id": resource_id,
+            "version": self.version,
+            "areaKm2": self.area_km2,
+            "geojson": {"type": "FeatureCollection", "features": [feature]},
+        }
+
+    def get_by_id(self, resource_id, select_fields=None, **kwargs):
+        self.requests.append((resource_id, select_fields))
+        document = self.document(resource_id)
+        return {k: v for k, v in document.items() if not select_fields or k in select_fields}
+
+
+class FakePagedLocationService:
+    """
+    Locations API paging through `pages` of location ids, the cursor being the page index.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.cursors = []
+
+    def get_page(self, select_fields=None, filters=None, page_size=100, cursor=None, **kwargs):
+        self.cursors.append(cursor)
+        index = int(cursor or 0)
+        documents = [{"id": i, "version": 1, "areaKm2": 10.0} for i in self.pages[index]]
+        return documents, str(index + 1) if index + 1 < len(self.pages) else None
+
+
+class FakeMetrics:
+    """
+    Registry of fake metric handlers by slug, measuring in `latency` seconds spread over
+    `requests` remote requests, or raising.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.measured = []
+        self.finished = []
+        self.options = {}  # constructor options of the instances by slug;
+
+    def request(self, seconds):
+        time.sleep(seconds)
+
+    def add(self, slug, latency=0.0, error=None, requests=1):
+        registry = self
+
+        class FakeMetric:
+            def __init__(self, config_filepath=None, **kwargs):
+                pass
+
+            def measure(self, gdf, area_km2=None):
+                registry.measured.append(slug)
+                try:
+                    for _ in range(requests):
+                        registry.request(latency / requests)
+                finally:
+                    registry.finished.append(slug)
+                if error is not None:
+                    raise error
+                return FakeResult(area_km2, len(gdf))
+
+        FakeMetric.slug = slug
+        self.handlers[slug] = FakeMetric
+        return FakeMetric
+
+    def resolve_handler(self, slug):
+        return self.handlers[slug]
+
+    def get_metric_instance(self, slug, *args, **kwargs):
+        self.options[slug] = kwargs
+        return self.handlers[slug]()
+
+
+def sns_event(message, message_id="95df01b4-ee98-5cb9-9903-4c221d41eb5e"):
+    return {"Records": [{"Sns": {"MessageId": message_id, "Message": json.dumps(message)}}]}
+
+
+def worker_event(handlers, version=1, **worker):
+    return {
+        "id": LOCATION_ID,
+        "version": version,
+        "meta": {"worker": {"handlers": handlers, **worker}},
+    }
+
+
+@pytest.fixture
+def sns():
+    return FakeSNS()
+
+
+@pytest.fixture
+def metrics():
+    return FakeMetrics()
+
+
+@pytest.fixture
+def worker(monkeypatch, sns, metrics):
+    """
+    The worker handler with fake SNS, locations & metrics, without ledger nor stores.
+    """
+    import geopandas  # noqa, imported by the first location, out of the deadlines of the tests
+    from handlers import worker_handler
+
+    monkeypatch.setattr(worker_handler, "sns", sns)
+    monkeypatch.setattr(worker_handler, "fetch_service", FakeLocationService())
+    monkeypatch.setattr(worker_handler, "resolve_handler", metrics.resolve_handler)
+    monkeypatch.setattr(worker_handler, "get_metric_instance", metrics.get_metric_instance)
+    for name in ["ledger", "result_store", "payload_store", "runtime_history"]:
+        monkeypatch.setattr(worker_handler, name, None)
+    return worker_handler
+
+
+@pytest.fixture
+def reducer(monkeypatch, sns):
+    """
+    The reducer handler with fake SNS, in-memory tile store & ledger, without payload store.
+    """
+    from handlers import reducer_handler
+    from helpers.storage import InMemoryStorage
+    from services.ledger import get_ledger
+
+    monkeypatch.setattr(reducer_handler, "sns", sns)
+    monkeypatch.setattr(reducer_handler, "tile_store", InMemoryStorage())
+    monkeypatch.setattr(reducer_handler, "ledger", get_ledger("memory://"))
+    monkeypatch.setattr(reducer_handler, "payload_store", None)
+    return reducer_handler
+
+
+@pytest.fixture
+def manager(monkeypatch, sns):
+    """
+    The manager handler with fake SNS, without runtime history nor rate limit.
+    """
+    from handlers import manager_handler
+
+    monkeypatch.setattr(manager_handler, "sns", sns)
+    monkeypatch.setattr(manager_handler, "runtime_history", None)
+    monkeypatch.setattr(manager_handler, "BULK_RATE_LIMIT", 0)
+    return manager_handler
@@ -0,0 +1,155 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import pytest
+
+from helpers.deadline import Deadline
+
+from .conftest import FakeLocationService, FakePagedLocationService, sns_event
+
+PAGES = [["a", "b"], ["c"], ["d", "e"]]
+
+
+class FakeDeadline(Deadline):
+    """
+    Deadline expiring after `checks` checks.
+    """
+
+    def __init__(self, checks):
+        super().__init__()
+        self.checks = checks
+
+    def expired(self):
+        self.checks -= 1
+        return self.checks < 0
+
+
+@pytest.fixture
+def pages(manager, monkeypatch):
+    service = FakePagedLocationService(PAGES)
+    monkeypatch.setattr(manager, "location_service", service)
+    return service
+
+
+def compute_events(manager, sns):
+    return sns.published(manager.SNS_WORKER_TOPIC_ARN)
+
+
+def test_handle_bulk(manager, sns, pages):
+    manager.handle_bulk({"resources": ["land_use"]}, None)
+
+    assert pages.cursors == [None, "1", "2"]
+    events = compute_events(manager, sns)
+    assert [e["id"] for e in events] == ["a", "b", "c", "d", "e"]
+    assert all(e["meta"] == {"worker": {"handler": "land_use"}} for e in events)
+
+
+def test_handle_bulk_continuation(manager, sns, pages, monkeypatch):
+    monkeypatch.setattr(Deadline, "from_context", lambda *args: FakeDeadline(checks=2))
+    bulk = {"filter": "type==Country", "resources": ["land_use"]}
+
+    manager.handle_bulk(bulk, None)
+
+    # out of time before the third page, resumed from its cursor
+    assert [e["id"] for e in compute_events(manager, sns)] == ["a", "b", "c"]
+    [continuation] = sns.published(manager.SNS_MANAGER_TOPIC_ARN)
+    assert continuation == {"bulk": {**bulk, "cursor": "2", "scheduled": 3}}
+
+    monkeypatch.setattr(Deadline, "from_context", lambda *args: FakeDeadline(checks=10))
+    manager.lambda_handler(sns_event(continuation), None)
+
+    assert [e["id"] for e in compute_events(manager, sns)] == ["a", "b", "c", "d", "e"]
+    assert pages.cursors == [None, "1", "2"]
+
+
+def test_handle_bulk_expired(manager, sns, pages, monkeypatch):
+    monkeypatch.setattr(Deadline, "from_context", lambda *args: FakeDeadline(checks=0))
+
+    manager.handle_bulk({"cursor": "1", "scheduled": 2}, None)
+
+    assert pages.cursors == []
+    assert sns.published(manager.SNS_MANAGER_TOPIC_ARN) == [
+        {"bulk": {"cursor": "1", "scheduled": 2}}
+    ]
+
+
+def test_continue_bulk_without_topic(manager, monkeypatch):
+    monkeypatch.setattr(manager, "SNS_MANAGER_TOPIC_ARN", None)
+
+    with pytest.raises(ValueError):
+        manager.continue_bulk({"cursor": "1"})
+
+
+FAST_TOPIC_ARN = "arn:aws:sns:us-east-1:000000000000:worker-fast"
+
+
+@pytest.fixture
+def lanes(manager, monkeypatch):
+    monkeypatch.setattr(manager, "SNS_WORKER_FAST_TOPIC_ARN", FAST_TOPIC_ARN)
+    monkeypatch.setattr(manager, "LANE_FAST_MAX_SECONDS", 60)
+    monkeypatch.setattr(manager, "estimate_prior", lambda slug, area_km2: area_km2 / 1000)
+    service = FakeLocationService(area_km2=10.0)
+    monkeypatch.setattr(manager, "location_service", service)
+    return service
+
+
+def lane_handlers(sns, topic_arn):
+    return [e["meta"]["worker"]["handler"] for e in sns.published(topic_arn)]
+
+
+def test_handle_record_lanes(manager, sns, lanes):
+    messages = manager.handle_record({"id": "a", "version": 1, "areaKm2": 10000.0})
+    manager.publish_jobs(messages)
+
+    assert lane_handlers(sns, FAST_TOPIC_ARN) == manager.MetricHandler.slugs()
+    assert sns.published(manager.SNS_WORKER_TOPIC_ARN) == []
+
+    manager.publish_jobs(manager.handle_record({"id": "b", "version": 1, "areaKm2": 1e6}))
+    assert lane_handlers(sns, manager.SNS_WORKER_TOPIC_ARN) == manager.MetricHandler.slugs()
+
+
+def test_handle_record_unknown_area(manager, sns, lanes):
+    manager.publish_jobs(manager.handle_record({"id": "a", "version": 1}))
+
+    # routed to the default lane, without retrieving the area
+    assert lanes.requests == []
+    assert lane_handlers(sns, manager.SNS_WORKER_TOPIC_ARN) == manager.MetricHandler.slugs()
+
+
+def test_handle_record_tiles_area(manager, sns, lanes, monkeypatch):
+    monkeypatch.setattr(manager, "TILE_AREA_THRESHOLD_KM2", 1e6)
+
+    manager.publish_jobs(manager.handle_record({"id": "a", "version": 1}))
+
+    assert lanes.requests == [("a", ["id", "version", "areaKm2"])]
+    assert lane_handlers(sns, FAST_TOPIC_ARN) == manager.MetricHandler.slugs()
+
+
+def test_lambda_handler_prefetch(manager, sns, lanes, monkeypatch):
+    documents = {"a": {"areaKm2": 10.0}, "b": {"areaKm2": 1e6}}
+    monkeypatch.setattr(
+        lanes, "get_many", lambda ids, **kwargs: [documents[i] for i in ids], raising=False
+    )
+    records = [sns_event({"id": i, "version": 1}, message_id=i)["Records"][0] for i in "ab"]
+
+    manager.lambda_handler({"Records": records}, None)
+
+    assert {e["id"] for e in sns.published(FAST_TOPIC_ARN)} == {"a"}
+    assert {e["id"] for e in sns.published(manager.SNS_WORKER_TOPIC_ARN)} == {"b"}
+    assert lanes.requests == []
@@ -0,0 +1,100 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import pytest
+
+from helpers.merge import MergeException
+
+from .conftest import LOCATION_ID, sns_event
+
+
+def tile_event(index, metric, count=2, area_km2=1.0, slug="land_use"):
+    return {
+        "slug": slug,
+        "location": LOCATION_ID,
+        "version": 1,
+        "metric": metric,
+        "tile": {"index": index, "count": count},
+        "areaKm2": area_km2,
+    }
+
+
+def handle(reducer, event):
+    [record] = sns_event(event)["Records"]
+    reducer.handle_record(record)
+
+
+def test_handle_record(reducer, sns):
+    handle(reducer, tile_event(0, {"forest": 1.0}))
+    assert sns.published(reducer.SNS_RESULT_TOPIC_ARN) == []
+
+    handle(reducer, tile_event(1, {"forest": 2.5}))
+
+    [result] = sns.published(reducer.SNS_RESULT_TOPIC_ARN)
+    assert result == {
+        "slug": "land_use",
+        "location": LOCATION_ID,
+        "metric": {"forest": 3.5},
+        "version": 1,
+    }
+    assert reducer.tile_store.list() == []
+
+
+def test_handle_record_redelivered(reducer, sns):
+    handle(reducer, tile_event(0, {"forest": 1.0}))
+    handle(reducer, tile_event(1, {"forest": 2.5}))
+
+    # delivered again once merged, neither published again nor left behind
+    handle(reducer, tile_event(1, {"forest": 2.5}))
+
+    assert len(sns.published(reducer.SNS_RESULT_TOPIC_ARN)) == 1
+    assert reducer.tile_store.list() == []
+
+
+def test_handle_record_claimed(reducer, sns):
+    handle(reducer, tile_event(0, {"forest": 1.0}))
+
+    # the last tiles stored concurrently, the other invocation claimed the merge first
+    assert reducer.ledger.claim_reduction(LOCATION_ID, 1, "land_use")
+    handle(reducer, tile_event(1, {"forest": 2.5}))
+
+    assert sns.published(reducer.SNS_RESULT_TOPIC_ARN) == []
+    assert len(reducer.tile_store.list()) == 2  # merged & deleted by the claiming invocation
+
+
+def test_handle_record_late(reducer, sns, monkeypatch):
+    handle(reducer, tile_event(0, {"forest": 1.0}))
+    handle(reducer, tile_event(1, {"forest": 2.5}))
+
+    # checked before the merge completed, stored after the tiles were deleted
+    reduced = iter([False, True])
+    monkeypatch.setattr(reducer.ledger, "reduced", lambda *args: next(reduced))
+    handle(reducer, tile_event(0, {"forest": 1.0}))
+
+    assert reducer.tile_store.list() == []
+
+
+def test_handle_record_failed(reducer, sns):
+    handle(reducer, tile_event(0, {"label": "a"}))
+    with pytest.raises(MergeException):
+        handle(reducer, tile_event(1, {"label": "b"}))
+
+    # released for the retries of the event
+    assert reducer.ledger.claim_reduction(LOCATION_ID, 1, "land_use")
+    assert len(reducer.tile_store.list()) == 2
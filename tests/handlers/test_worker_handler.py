@@ -0,0 +1,232 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import time
+
+import pytest
+from geopandas import GeoDataFrame
+from shapely.geometry import Point
+
+from helpers.deadline import Deadline, DeadlineExceeded, cancel_before
+from helpers.metrics import StageTimer
+from helpers.storage import InMemoryStorage
+from services.ledger import get_ledger
+from services.runtime_history import RuntimeHistory
+
+from .conftest import LOCATION_ID, sns_event, worker_event
+
+
+def test_continue_location(worker, sns):
+    decoded = worker_event(["queued", "started"])
+
+    timed_out = worker.continue_location(decoded, {"queued": False, "started": True})
+
+    # computed again from scratch, the started metric would run out of time again
+    assert timed_out == ["started"]
+    [continuation] = sns.published(worker.SNS_WORKER_TOPIC_ARN)
+    assert continuation["meta"]["worker"] == {"handlers": ["queued"], "continuation": 1}
+
+
+def test_continue_location_split(worker, sns, monkeypatch):
+    monkeypatch.setattr(worker, "WORKER_SPLIT_CONTINUATIONS", True)
+    decoded = worker_event(["queued", "started"])
+
+    assert worker.continue_location(decoded, {"queued": False, "started": True}) == []
+
+    workers = [m["meta"]["worker"] for m in sns.published(worker.SNS_WORKER_TOPIC_ARN)]
+    assert workers[0] == {"handlers": ["queued"], "continuation": 1}
+    assert [w["tile"] for w in workers[1:]] == [{"index": i, "grid": [2, 2]} for i in range(4)]
+    assert all(w["handlers"] == ["started"] for w in workers[1:])
+
+
+def test_continue_location_tile(worker, sns, monkeypatch):
+    monkeypatch.setattr(worker, "WORKER_SPLIT_CONTINUATIONS", True)
+    decoded = worker_event(["started"], tile={"index": 0, "grid": [2, 2]})
+
+    assert worker.continue_location(decoded, {"started": True}) == ["started"]
+
+
+def test_continue_location_max_continuations(worker, sns):
+    decoded = worker_event(["queued"], continuation=worker.WORKER_MAX_CONTINUATIONS)
+
+    with pytest.raises(DeadlineExceeded):
+        worker.continue_location(decoded, {"queued": False})
+    assert sns.messages == []
+
+
+def test_handle_location_deadline(worker, sns, metrics, monkeypatch):
+    monkeypatch.setattr(worker, "WORKER_CONCURRENCY", 1)
+    handlers = [metrics.add("fast"), metrics.add("slow", latency=2.0), metrics.add("queued")]
+    deadline = Deadline(remaining_ms=1000)
+
+    with pytest.raises(worker.MetricHandlerException, match="slow"):
+        worker.handle_location(
+            worker_event(["fast", "slow", "queued"]), handlers, StageTimer(), deadline
+        )
+
+    assert [r["slug"] for r in sns.published(worker.SNS_RESULT_TOPIC_ARN)] == ["fast"]
+    [continuation] = sns.published(worker.SNS_WORKER_TOPIC_ARN)
+    assert continuation["meta"]["worker"]["handlers"] == ["queued"]
+
+
+def test_handle_location_cancel_at_deadline(worker, sns, metrics):
+    cancel_before(metrics, "request")
+    handlers = [metrics.add("fast"), metrics.add("slow", latency=30.0, requests=300)]
+    deadline = Deadline(remaining_ms=1000)
+    start = time.monotonic()
+
+    with pytest.raises(worker.MetricHandlerException, match="slow"):
+        worker.handle_location(worker_event(["fast", "slow"]), handlers, StageTimer(), deadline)
+
+    assert time.monotonic() - start < 5.0
+    assert metrics.finished == ["fast", "slow"]  # joined before returning;
+    assert [r["slug"] for r in sns.published(worker.SNS_RESULT_TOPIC_ARN)] == ["fast"]
+
+
+def circle(resolution):
+    return GeoDataFrame(geometry=[Point(0, 0).buffer(1, resolution)], crs="EPSG:4326")
+
+
+def test_prepare_geometries(worker, metrics, monkeypatch):
+    calls = []
+    simplify_geometries = worker.simplify_geometries
+
+    def counted(gdf, **rule):
+        calls.append(rule)
+        return simplify_geometries(gdf, **rule)
+
+    monkeypatch.setattr(worker, "simplify_geometries", counted)
+    handlers = [metrics.add(slug) for slug in ["land_use", "tree_loss", "modis_evi"]]
+
+    prepared = worker.prepare_geometries(handlers, circle(8000))  # 32001 vertices
+
+    assert calls == [
+        {"max_vertices": 20000, "max_area_error": 0.002},
+        {"max_vertices": 20000, "max_area_error": 0.01},
+    ]  # once per distinct rule
+    assert prepared["land_use"] is prepared["tree_loss"]
+    for slug, (gdf, report) in prepared.items():
+        assert report["vertices"] == 32001
+        assert 0 < report["simplifiedVertices"] <= 20000
+        assert report["areaError"] <= worker.simplify_rule(slug)["max_area_error"]
+
+
+def test_prepare_geometries_within_budget(worker, metrics):
+    gdf = circle(16)
+
+    [(prepared, report)] = worker.prepare_geometries([metrics.add("land_use")], gdf).values()
+
+    assert prepared is gdf
+    assert report["tolerance"] == 0.0 and report["simplifiedVertices"] == report["vertices"]
+
+
+def test_compute_location_simplify(worker, metrics, monkeypatch):
+    monkeypatch.setattr(worker, "ADAPTIVE_SIMPLIFY", True)
+    handlers = [metrics.add("land_use")]
+
+    worker.compute_location(worker_event(["land_use"]), handlers, StageTimer(), Deadline())
+
+    # the small location is left to the simplification of the metric
+    assert metrics.options["land_use"]["simplify"] is True
+
+
+def test_metric_options(worker):
+    assert worker.metric_options() == worker.METRIC_OPTIONS
+    assert worker.metric_options({"tolerance": 0.0})["simplify"] is True
+    assert worker.metric_options({"tolerance": 1e-4})["simplify"] is False
+
+
+def test_lambda_handler_metrics(worker, sns, metrics):
+    for slug in ["land_use", "tree_loss", "modis_fire"]:
+        metrics.add(slug)
+
+    worker.lambda_handler(sns_event(worker_event(["land_use", "tree_loss", "modis_fire"])), None)
+
+    results = sns.published(worker.SNS_RESULT_TOPIC_ARN)
+    assert sorted(r["slug"] for r in results) == ["land_use", "modis_fire", "tree_loss"]
+    assert all(r["location"] == LOCATION_ID and r["version"] == 1 for r in results)
+    assert all(r["metric"] == {"area_km2": 100.0, "features": 1} for r in results)
+    # the location is downloaded once, shared by the metrics
+    assert [f for _, f in worker.fetch_service.requests if "geojson" in f] == [
+        ["id", "geojson", "version", "areaKm2"]
+    ]
+
+
+def test_lambda_handler_metric_failure(worker, sns, metrics):
+    metrics.add("land_use")
+    metrics.add("tree_loss", error=RuntimeError("Computation timed out."))
+
+    with pytest.raises(worker.MetricHandlerException, match="tree_loss"):
+        worker.lambda_handler(sns_event(worker_event(["land_use", "tree_loss"])), None)
+
+    assert [r["slug"] for r in sns.published(worker.SNS_RESULT_TOPIC_ARN)] == ["land_use"]
+
+
+def test_lambda_handler_single_metric_failure(worker, metrics):
+    metrics.add("tree_loss", error=RuntimeError("Computation timed out."))
+
+    with pytest.raises(RuntimeError, match="timed out"):
+        worker.lambda_handler(sns_event(worker_event(["tree_loss"])), None)
+
+
+def test_lambda_handler_claimed(worker, sns, metrics, monkeypatch):
+    ledger = get_ledger("memory://")
+    monkeypatch.setattr(worker, "ledger", ledger)
+    metrics.add("land_use")
+    metrics.add("tree_loss")
+
+    # computed by another event of the same version
+    assert ledger.claim_metric(LOCATION_ID, 1, "tree_loss")
+    worker.lambda_handler(sns_event(worker_event(["land_use", "tree_loss"])), None)
+    assert metrics.measured == ["land_use"]
+
+    # the same event delivered again
+    worker.lambda_handler(sns_event(worker_event(["land_use", "tree_loss"])), None)
+    assert metrics.measured == ["land_use"]
+    assert [r["slug"] for r in sns.published(worker.SNS_RESULT_TOPIC_ARN)] == ["land_use"]
+
+
+def test_lambda_handler_runtime_history(worker, metrics, monkeypatch):
+    history = RuntimeHistory(InMemoryStorage())
+    writes = []
+    monkeypatch.setattr(history.backend, "put", lambda key, data: writes.append(key))
+    monkeypatch.setattr(worker, "runtime_history", history)
+    for slug in ["land_use", "tree_loss", "modis_fire"]:
+        metrics.add(slug)
+
+    worker.lambda_handler(sns_event(worker_event(["land_use", "tree_loss", "modis_fire"])), None)
+
+    assert writes == [history.key]  # the runtimes of all metrics at once;
+
+
+@pytest.mark.parametrize(
+    "meta, handlers",
+    [
+        ({"handlers": ["land_use", "tree_loss", "land_use"]}, ["land_use", "tree_loss"]),
+        ({"handler": "land_use"}, ["land_use"]),
+        ({"handlers": [], "handler": "land_use"}, ["land_use"]),
+    ],
+)
+def test_worker_handlers(worker, meta, handlers):
+    assert worker.worker_handlers(meta) == handlers
+
+
+def test_worker_handlers_missing(worker):
+    with pytest.raises(ValueError):
+        worker.worker_handlers({"handlers": []})
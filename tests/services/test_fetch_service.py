@@ -0,0 +1,78 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import io
+
+import pytest
+import requests
+
+from services import fetch_service
+from services.fetch_service import ResourceFetchException
+
+
+class Response(requests.Response):
+    def __init__(self, status_code, body=b""):
+        super().__init__()
+        self.status_code = status_code
+        self.url = "http://localhost/locations/1"
+        self.raw = io.BytesIO(body)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    responses = []
+
+    def throttled_get(resource_url, **kwargs):
+        return responses.pop(0)
+
+    monkeypatch.setattr(fetch_service, "throttled_get", throttled_get)
+    return responses
+
+
+@pytest.mark.parametrize("status_code", [404, 500])
+def test_fetch_resource_error_closed(responses, status_code):
+    response = Response(status_code)
+    responses.append(response)
+
+    with pytest.raises(ResourceFetchException):
+        fetch_service.fetch_resource(response.url)
+    assert response.closed
+
+
+def test_fetch_resource_closed(responses):
+    response = Response(200, b'{"data": []}')
+    responses.append(response)
+
+    assert fetch_service.fetch_resource(response.url) == {"data": []}
+    assert response.closed  # released to the pool;
+
+
+@pytest.mark.parametrize("status_code", [404, 500])
+def test_stream_resource_error_closed(responses, status_code):
+    response = Response(status_code)
+    responses.append(response)
+
+    with pytest.raises(ResourceFetchException):
+        with fetch_service.stream_resource(response.url):
+            pass
+    assert response.closed
@@ -0,0 +1,121 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import threading
+
+import pytest
+
+from services.ledger import InMemoryLedger, Ledger, LocalFileLedger
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(params=["memory", "file"])
+def ledger(request, tmp_path, clock):
+    if request.param == "memory":
+        backend = InMemoryLedger(clock=clock)
+    else:
+        backend = LocalFileLedger(str(tmp_path), clock=clock)
+    return Ledger(backend, ttl=3600, lease=900)
+
+
+def test_claim_message(ledger):
+    assert ledger.claim_message("1")
+    assert not ledger.claim_message("1")
+
+    ledger.release_message("1")
+    assert ledger.claim_message("1")
+
+
+def test_lease_expires(ledger, clock):
+    # an invocation killed before completing, its retry gets through
+    assert ledger.claim_message("1", lease=0.5)
+    assert not ledger.claim_message("1")
+    clock.sleep(1.1)
+    assert ledger.claim_message("1")
+    assert not ledger.claim_message("1")
+
+
+def test_complete_message(ledger, clock):
+    assert ledger.claim_message("1", lease=0.5)
+    ledger.complete_message("1")
+    clock.sleep(1.1)
+    assert not ledger.claim_message("1")
+
+
+def test_claim_metric(ledger, clock):
+    tile = {"index": 1, "grid": [2, 2]}
+    assert ledger.claim_metric("location", 1, "tree_loss", lease=0.5)
+    assert ledger.claim_metric("location", 1, "tree_loss", tile, lease=0.5)
+    assert ledger.claim_metric("location", 2, "tree_loss", lease=0.5)
+
+    ledger.complete_metric("location", 1, "tree_loss")
+    clock.sleep(1.1)
+    assert not ledger.claim_metric("location", 1, "tree_loss")
+    assert ledger.claim_metric("location", 1, "tree_loss", tile)
+
+
+def test_expired_claim_taken_over_once(tmp_path, clock):
+    backend = LocalFileLedger(str(tmp_path), clock=clock)
+    assert backend.claim("messages/1", 1)
+    clock.sleep(2)
+
+    barrier = threading.Barrier(8)
+    claims = []
+
+    def claim():
+        barrier.wait()
+        claims.append(backend.claim("messages/1", 900))
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claims) == [False] * 7 + [True]
+    assert backend.claimed("messages/1")
+    assert sorted(p.name for p in tmp_path.joinpath("messages").iterdir()) == ["1"]
+
+
+def test_claim_reduction(ledger):
+    assert ledger.claim_reduction("location", 1, "tree_loss")
+    assert not ledger.claim_reduction("location", 1, "tree_loss")
+    assert not ledger.reduced("location", 1, "tree_loss")  # being merged;
+
+    ledger.release_reduction("location", 1, "tree_loss")
+    assert ledger.claim_reduction("location", 1, "tree_loss")
+
+    ledger.complete_reduction("location", 1, "tree_loss")
+    assert ledger.reduced("location", 1, "tree_loss")
+    assert not ledger.reduced("location", 2, "tree_loss")
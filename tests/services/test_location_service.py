@@ -0,0 +1,215 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from helpers.cache import TwoTierCache
+from services import location_service
+from services.location_service import LocationService
+
+LOCATION_ID = "5f1a1c0e7a6b2c0012345678"
+
+
+@pytest.fixture
+def api():
+    """
+    Locations API serving a single location, revalidated through its ETag.
+    """
+    document = {
+        "data": {
+            "id": LOCATION_ID,
+            "type": "location",
+            "attributes": {"name": "Location", "version": 2, "areaKm2": 10.0},
+        }
+    }
+    body = json.dumps(document).encode("utf-8")
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            requests.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == '"v2"':
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.api+json")
+            self.send_header("ETag", '"v2"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.requests = requests
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def service(api, tmp_path):
+    cache = TwoTierCache(1024 * 1024, str(tmp_path), 1024 * 1024)
+    service = LocationService(cache=cache)
+    host, port = api.server_address
+    service.endpoint = f"http://{host}:{port}"
+    return service
+
+
+def test_get_by_id_cached(api, service):
+    document = service.get_by_id(LOCATION_ID)
+    assert document["id"] == LOCATION_ID
+    assert document["version"] == 2
+
+    # the expected version is served from cache, without request
+    assert service.get_by_id(LOCATION_ID, version=2) == document
+    assert len(api.requests) == 1
+
+    # the latest version is revalidated
+    assert service.get_by_id(LOCATION_ID) == document
+    assert api.requests == [None, '"v2"']
+    assert service.cache.stats["revalidations"] == 1
+
+
+def test_get_by_id_disk_cache(api, service):
+    document = service.get_by_id(LOCATION_ID)
+
+    # a new container, with an empty memory tier
+    service.cache = TwoTierCache(1024 * 1024, service.cache.disk.directory, 1024 * 1024)
+    assert service.get_by_id(LOCATION_ID, version=2) == document
+    assert service.cache.stats["disk_hits"] == 1
+    assert len(api.requests) == 1
+
+
+def test_get_many_cached(api, service):
+    document = service.get_by_id(LOCATION_ID)
+
+    # the expected version is served from cache, without request
+    assert service.get_many([LOCATION_ID], versions=[2]) == [document]
+    assert len(api.requests) == 1
+
+    # the latest version is revalidated
+    assert service.get_many([LOCATION_ID]) == [document]
+    assert api.requests == [None, '"v2"']
+    assert service.cache.stats["revalidations"] == 1
+
+
+def test_get_many_caches(api, service):
+    (document,) = service.get_many([LOCATION_ID])
+    assert document["version"] == 2
+
+    assert service.get_by_id(LOCATION_ID, version=2) == document
+    assert api.requests == [None]
+
+
+@pytest.fixture
+def geoparquet_api():
+    """
+    Locations API answering GeoParquet requests with an undecodable file.
+    """
+    feature = {
+        "type": "Feature",
+        "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 0]]]},
+        "properties": {"name": "a"},
+    }
+    document = {
+        "data": {
+            "id": LOCATION_ID,
+            "type": "location",
+            "attributes": {
+                "version": 2,
+                "geojson": {"type": "FeatureCollection", "features": [feature]},
+            },
+        }
+    }
+    accepted = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            accepted.append(self.headers.get("Accept"))
+            if "parquet" in self.headers.get("Accept"):
+                content_type, body = "application/vnd.apache.parquet", b"PAR1 not parquet"
+            else:
+                content_type, body = "application/vnd.api+json", json.dumps(document).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.accepted = accepted
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_geodataframe_by_id_fallback(geoparquet_api):
+    service = LocationService(cache=None, location_format="geoparquet")
+    host, port = geoparquet_api.server_address
+    service.endpoint = f"http://{host}:{port}"
+
+    document, gdf = service.get_geodataframe_by_id(LOCATION_ID)
+
+    assert document["version"] == 2
+    assert list(gdf["name"]) == ["a"]
+    assert len(geoparquet_api.accepted) == 2
+    assert geoparquet_api.accepted[1] == "application/vnd.api+json"
+
+
+def test_get_page(monkeypatch):
+    requests = []
+
+    def fetch_resource(resource_url, headers=None, params=None, timeout=None):
+        requests.append(params)
+        data = [{"id": LOCATION_ID, "type": "location", "attributes": {"version": 2}}]
+        return {"data": data, "meta": {"pagination": {"nextCursor": "b"}}}
+
+    monkeypatch.setattr(location_service, "fetch_resource", fetch_resource)
+    service = LocationService(cache=None)
+
+    documents, cursor = service.get_page(["id", "version"], "type==Country", 50, cursor="a")
+
+    assert documents == [{"id": LOCATION_ID, "type": "location", "version": 2}]
+    assert cursor == "b"
+    assert requests == [
+        {"page[size]": 50, "select": "id,version", "filter": "type==Country", "page[cursor]": "a"}
+    ]
+
+
+def test_get_page_last(monkeypatch):
+    monkeypatch.setattr(location_service, "fetch_resource", lambda *args, **kwargs: {"data": []})
+
+    assert LocationService(cache=None).get_page() == ([], None)
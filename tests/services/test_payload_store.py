@@ -0,0 +1,81 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import json
+import math
+
+import numpy as np
+import pytest
+
+from helpers.storage import InMemoryStorage
+from services import payload_store
+from services.payload_store import PayloadStore, encode_payload
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"slug": "land-cover", "metric": {"forest": 1.5, "water": 0}},
+        {"metric": {1: "a", 2.5: "b", False: "c", None: "d"}},
+        {"metric": {"loss": float("nan"), "gain": float("inf"), "cover": None}},
+        {"metric": [{"nested": [float("-inf"), 1]}], "label": "nullable"},
+        {"metric": 2 ** 70},
+    ],
+)
+def test_encode_payload(payload):
+    assert encode_payload(payload) == json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+@pytest.mark.parametrize("orjson", [payload_store.orjson, None])
+def test_encode_payload_numpy(monkeypatch, orjson):
+    monkeypatch.setattr(payload_store, "orjson", orjson)
+
+    encoded = encode_payload({"metric": np.array([1.5, np.nan]), "count": np.int64(2)})
+    decoded = json.loads(encoded)
+
+    assert decoded["metric"][0] == 1.5 and math.isnan(decoded["metric"][1])
+    assert decoded["count"] == 2
+
+
+@pytest.mark.skipif(payload_store.orjson is None, reason="orjson is not installed")
+def test_encode_payload_null(monkeypatch):
+    def dumps(*args, **kwargs):
+        raise AssertionError("encoded twice")
+
+    monkeypatch.setattr(payload_store.json, "dumps", dumps)
+
+    assert encode_payload({"metric": {"cover": None}}) == b'{"metric":{"cover":null}}'
+
+
+def test_encode_payload_non_finite_numpy():
+    encoded = encode_payload({"metric": np.array([[1.0], [np.inf]]), "count": np.float32(np.nan)})
+
+    assert encoded == b'{"metric":[[1.0],[Infinity]],"count":NaN}'
+
+
+def test_wrap_unwrap():
+    store = PayloadStore(InMemoryStorage(), max_bytes=100)
+    payload = {"slug": "tree-loss", "location": "1", "version": 2, "metric": {"loss": [0.5] * 50}}
+
+    event = json.loads(store.wrap(payload))
+    assert "metric" not in event and "payloadRef" in event
+    assert store.unwrap(event) == payload
+
+    store.delete(event)
+    assert store.backend.list() == []
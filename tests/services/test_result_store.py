@@ -0,0 +1,81 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import pytest
+
+from config import result_ttl
+from helpers.storage import InMemoryStorage
+from services.result_store import ResultStore, config_hash
+
+KEY = "v2/tree_loss/geometry/config.json"
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def store(clock):
+    return ResultStore(InMemoryStorage(), clock=clock)
+
+
+def test_get_put(store):
+    assert store.get(KEY) is None
+
+    store.put(KEY, {"loss": 1.5})
+    assert store.get(KEY) == {"loss": 1.5}
+
+
+def test_get_expired(store, clock):
+    store.put(KEY, {"loss": 1.5})
+
+    clock.now += 3600
+    assert store.get(KEY, max_age=7200) == {"loss": 1.5}
+    assert store.get(KEY, max_age=1800) is None
+    assert store.get(KEY) == {"loss": 1.5}  # no maximum age
+
+
+def test_get_previous_format(store):
+    store.backend.put(KEY, b'{"loss": 1.5}')
+
+    assert store.get(KEY) is None
+
+
+def test_result_ttl():
+    assert result_ttl("modis_fire") < result_ttl("tree_loss")
+    assert result_ttl("land_use") is None
+
+
+def test_config_hash(tmp_path):
+    config_filepath = tmp_path / "earthengine.yaml"
+    config_filepath.write_text("metrics:\n  tree_loss:\n    gain: a\n")
+
+    h = config_hash(str(config_filepath), "tree_loss", simplify=True)
+    assert h == config_hash(str(config_filepath), "tree_loss", simplify=True)
+    assert h != config_hash(str(config_filepath), "tree_loss", simplify=False)
+    assert h != config_hash(str(config_filepath), "land_use", simplify=True)
@@ -0,0 +1,77 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import pytest
+
+from helpers.storage import InMemoryStorage
+from services.runtime_history import RuntimeHistory, area_bucket, estimate_prior
+
+
+class CountingStorage(InMemoryStorage):
+    def __init__(self):
+        super().__init__()
+        self.reads, self.writes = 0, 0
+
+    def get(self, key):
+        self.reads += 1
+        return super().get(key)
+
+    def put(self, key, data):
+        self.writes += 1
+        super().put(key, data)
+
+
+@pytest.fixture
+def storage():
+    return CountingStorage()
+
+
+@pytest.mark.parametrize(
+    "area_km2, bucket", [(None, "1e0"), (0.5, "1e0"), (999, "1e2"), (1000, "1e3")]
+)
+def test_area_bucket(area_km2, bucket):
+    assert area_bucket(area_km2) == bucket
+
+
+def test_flush(storage):
+    history = RuntimeHistory(storage, alpha=0.5)
+    history.record("land_use", 100, 10.0)
+    history.record("land_use", 150, 20.0)
+    history.record("tree_loss", 5000, 40.0)
+    assert (storage.reads, storage.writes) == (0, 0)  # buffered;
+
+    history.flush()
+    history.flush()  # nothing left to write
+
+    assert (storage.reads, storage.writes) == (1, 1)
+    assert history.get("land_use") == {"1e2": 15.0}
+    assert history.get("tree_loss") == {"1e3": 40.0}
+
+
+def test_estimate(storage):
+    writer, reader = RuntimeHistory(storage), RuntimeHistory(storage, ttl=300)
+    assert reader.estimate("land_use", 100) == estimate_prior("land_use", 100)
+
+    writer.record("land_use", 100, 12.0)
+    writer.flush()
+
+    assert reader.estimate("land_use", 100) == estimate_prior("land_use", 100)  # cached;
+    reader.ttl = 0
+    assert reader.estimate("land_use", 100) == 12.0
+    assert reader.estimate("land_use", 10000) == estimate_prior("land_use", 10000)
@@ -0,0 +1,112 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import pytest
+
+from services.sns_service import PublishException, chunk_messages, publish_batch
+
+TOPIC_ARN = "arn:aws:sns:us-east-1:000000000000:result"
+
+
+class BatchClient:
+    """
+    SNS client stub failing the entries listed in `failures`, one list per request,
+    as `(id, sender_fault)` tuples.
+    """
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.requests = []
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.requests.append([entry["Message"] for entry in PublishBatchRequestEntries])
+        failed = dict(self.failures.pop(0)) if self.failures else {}
+        return {
+            "Successful": [
+                {"Id": e["Id"]} for e in PublishBatchRequestEntries if e["Id"] not in failed
+            ],
+            "Failed": [
+                {"Id": i, "Code": "InternalError", "SenderFault": fault}
+                for i, fault in failed.items()
+            ],
+        }
+
+
+class Client:
+    """
+    SNS client stub of the boto3 releases without `publish_batch`.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, TopicArn, Message):
+        self.messages.append(Message)
+
+
+def test_chunk_messages_count():
+    batches = list(chunk_messages([str(i) for i in range(25)]))
+
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+
+
+def test_chunk_messages_bytes():
+    message = "x" * (100 * 1024)
+
+    batches = list(chunk_messages([message] * 5 + ["é"]))
+
+    assert [len(batch) for batch in batches] == [2, 2, 2]
+    assert all(sum(len(m.encode("utf-8")) for m in b) <= 256 * 1024 for b in batches)
+
+
+def test_publish_batch():
+    client = BatchClient()
+
+    assert publish_batch(client, TOPIC_ARN, [str(i) for i in range(12)]) == 12
+    assert client.requests == [[str(i) for i in range(10)], ["10", "11"]]
+
+
+def test_publish_batch_retry():
+    client = BatchClient(failures=[[("1", False), ("3", False)], [("3", False)]])
+
+    assert publish_batch(client, TOPIC_ARN, ["a", "b", "c", "d"], backoff_factor=0) == 4
+    assert client.requests == [["a", "b", "c", "d"], ["b", "d"], ["d"]]
+
+
+def test_publish_batch_retries_exceeded():
+    client = BatchClient(failures=[[("0", False)]] * 3)
+
+    with pytest.raises(PublishException, match="Failed to publish 1"):
+        publish_batch(client, TOPIC_ARN, ["a", "b"], retries=2, backoff_factor=0)
+    assert len(client.requests) == 3
+
+
+def test_publish_batch_sender_fault():
+    client = BatchClient(failures=[[("0", False), ("1", True)]])
+
+    with pytest.raises(PublishException, match="Rejected batch entries"):
+        publish_batch(client, TOPIC_ARN, ["a", "b"], backoff_factor=0)
+    assert len(client.requests) == 1  # never retried
+
+
+def test_publish_batch_fallback():
+    client = Client()
+
+    assert publish_batch(client, TOPIC_ARN, ["a", "b"]) == 2
+    assert client.messages == ["a", "b"]
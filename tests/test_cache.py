@@ -0,0 +1,70 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import json
+import tracemalloc
+
+from helpers.cache import TwoTierCache, estimate_size
+
+
+def location(vertices):
+    ring = [[i / vertices, (i * 7 % vertices) / vertices] for i in range(vertices)]
+    return {
+        "id": "5f0a4a4f0f6c5a0011a1b2c3",
+        "version": 1,
+        "geojson": {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "properties": {"name": "a"},
+                    "geometry": {"type": "Polygon", "coordinates": [ring, ring[:10]]},
+                }
+            ],
+        },
+    }
+
+
+def test_estimate_size():
+    content = json.dumps(location(10000))
+
+    tracemalloc.start()
+    try:
+        document = json.loads(content)
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert abs(estimate_size(document) - allocated) < 0.2 * allocated
+    assert estimate_size(document) > 2 * len(content)
+
+
+def test_memory_cache_bound():
+    entry = {"etag": '"v1"', "size": 0, "document": location(10000)}
+    entry["size"] = len(json.dumps(entry))  # the serialized size fits the bound
+
+    cache = TwoTierCache(2 * entry["size"], None, 0)
+    cache.put(("a", 1), entry)
+    assert cache.get(("a", 1)) is None
+
+    cache = TwoTierCache(10 * entry["size"], None, 0)
+    cache.put(("a", 1), entry)
+    cache.put(("b", 1), entry)
+    assert cache.get(("b", 1)) == entry
+    assert cache.memory.current_bytes <= cache.memory.max_bytes
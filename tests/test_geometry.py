@@ -0,0 +1,115 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import pytest
+from geopandas import GeoDataFrame
+from geopandas.testing import assert_geodataframe_equal
+
+from helpers.geometry import features_to_geodataframe
+
+SQUARE = [[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]]
+HOLE = [[1, 1], [1, 2], [2, 2], [2, 1], [1, 1]]
+TRIANGLE = [[10, 10], [12, 10], [11, 12], [10, 10]]
+
+
+def feature(geometry_type, coordinates, **properties):
+    return {
+        "type": "Feature",
+        "geometry": {"type": geometry_type, "coordinates": coordinates},
+        "properties": properties,
+    }
+
+
+def null_feature(**properties):
+    return {"type": "Feature", "geometry": None, "properties": properties}
+
+
+CASES = {
+    "polygon": [feature("Polygon", [SQUARE], name="a"), feature("Polygon", [TRIANGLE], name="b")],
+    "holes": [feature("Polygon", [SQUARE, HOLE]), feature("Polygon", [TRIANGLE])],
+    "multi-polygon": [
+        feature("MultiPolygon", [[SQUARE, HOLE], [TRIANGLE]]),
+        feature("Polygon", [TRIANGLE]),
+        feature("MultiPolygon", [[TRIANGLE]]),
+    ],
+    "null-geometry": [feature("Polygon", [SQUARE], name="a"), null_feature(name="b")],
+    "non-polygon": [
+        feature("Polygon", [SQUARE]),
+        feature("Point", [1, 2]),
+        feature("LineString", [[0, 0], [1, 1]]),
+        feature("MultiPoint", [[0, 0], [1, 1]]),
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "GeometryCollection",
+                "geometries": [{"type": "Point", "coordinates": [1, 2]}],
+            },
+            "properties": {},
+        },
+    ],
+    "empty-coordinates": [
+        feature("Polygon", []),
+        feature("MultiPolygon", []),
+        feature("Polygon", [SQUARE]),
+    ],
+    "3d": [
+        feature("Polygon", [[[x, y, 1.5] for x, y in SQUARE]]),
+        feature("MultiPolygon", [[[[x, y, 2.5] for x, y in TRIANGLE]]]),
+    ],
+    "mixed-dimensions": [
+        feature("Polygon", [[[x, y, 1.5] for x, y in SQUARE]]),
+        feature("Polygon", [TRIANGLE]),
+    ],
+    "no-properties": [
+        {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [SQUARE]}}
+    ],
+}
+
+
+@pytest.mark.parametrize("features", list(CASES.values()), ids=list(CASES))
+def test_features_to_geodataframe(features):
+    # features without properties are accepted, unlike `from_features` of geopandas < 0.8
+    expected = GeoDataFrame.from_features(
+        [{**f, "properties": f.get("properties") or {}} for f in features], crs="EPSG:4326"
+    )
+
+    gdf = features_to_geodataframe(features, crs="EPSG:4326")
+
+    assert_geodataframe_equal(gdf, expected, check_less_precise=False)
+    assert list(gdf.has_z) == list(expected.has_z)
+    for geometry, expected_geometry in zip(gdf.geometry, expected.geometry):
+        assert (geometry is None) == (expected_geometry is None)
+        if geometry is not None:
+            assert geometry.geom_type == expected_geometry.geom_type
+            assert geometry.equals_exact(expected_geometry, tolerance=0)
+
+
+VECTORIZED_CASES = {k: v for k, v in CASES.items() if k != "mixed-dimensions"}
+
+
+@pytest.mark.parametrize("features", list(VECTORIZED_CASES.values()), ids=list(VECTORIZED_CASES))
+def test_features_to_geodataframe_without_fallback(monkeypatch, features):
+    def from_features(*args, **kwargs):
+        raise AssertionError("Fell back to GeoDataFrame.from_features")
+
+    monkeypatch.setattr(GeoDataFrame, "from_features", from_features)
+
+    gdf = features_to_geodataframe(features)
+
+    assert len(gdf) == len(features)
@@ -0,0 +1,83 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from geopandas import GeoDataFrame
+from shapely.geometry import MultiPolygon, Point, Polygon
+
+from helpers.geoparquet import read_location_parquet, write_location_parquet
+
+SQUARE = [(0, 0), (4, 0), (4, 4), (0, 4), (0, 0)]
+HOLE = [(1, 1), (1, 2), (2, 2), (2, 1), (1, 1)]
+
+
+@pytest.fixture
+def gdf():
+    geometries = [
+        Polygon(SQUARE, [HOLE]),
+        MultiPolygon([Polygon(SQUARE), Polygon([(5, 5), (6, 5), (6, 6), (5, 5)])]),
+        Point(1, 2),
+        None,
+    ]
+    return GeoDataFrame({"name": ["a", "b", "c", "d"]}, geometry=geometries, crs="EPSG:4326")
+
+
+def test_location_parquet(gdf):
+    document = {"id": "1", "version": 2, "name": "Location", "geojson": {}}
+
+    decoded, decoded_gdf = read_location_parquet(write_location_parquet(document, gdf))
+
+    assert decoded == {"id": "1", "version": 2, "name": "Location"}
+    assert list(decoded_gdf["name"]) == ["a", "b", "c", "d"]
+    assert decoded_gdf.geometry.name == "geometry"
+    assert decoded_gdf.crs.to_epsg() == 4326
+    for geometry, expected in zip(decoded_gdf.geometry, gdf.geometry):
+        assert (geometry is None and expected is None) or geometry.equals(expected)
+
+
+def test_location_parquet_without_crs(gdf):
+    """
+    A GeoParquet file of another writer, without the location metadata nor a crs.
+    """
+    table = pa.table({"geometry": [g.wkb for g in gdf.geometry[:3]]})
+    geo = {"version": "0.4.0", "primary_column": "geometry", "columns": {"geometry": {}}}
+    table = table.replace_schema_metadata({"geo": json.dumps(geo)})
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+
+    document, decoded_gdf = read_location_parquet(buffer.getvalue())
+
+    assert document == {}
+    assert decoded_gdf.crs.to_string() == "OGC:CRS84"
+    assert decoded_gdf.geometry[2].equals(Point(1, 2))
+
+
+def test_location_parquet_unsupported_encoding(gdf):
+    table = pa.table({"geometry": ["POINT (1 2)"]})
+    geo = {"primary_column": "geometry", "columns": {"geometry": {"encoding": "WKT"}}}
+    buffer = io.BytesIO()
+    pq.write_table(table.replace_schema_metadata({"geo": json.dumps(geo)}), buffer)
+
+    with pytest.raises(ValueError):
+        read_location_parquet(buffer.getvalue())
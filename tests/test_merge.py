@@ -0,0 +1,86 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import pytest
+
+from helpers.merge import MAX, MEAN, MIN, SUM, MergeException, merge_metrics
+
+
+def test_merge_metrics_rules():
+    partials = [
+        ({"a": 1.0, "b": 2.0, "c": 3.0, "d": 4.0}, 1.0),
+        ({"a": 3.0, "b": 4.0, "c": 1.0, "d": 0.0}, 3.0),
+    ]
+
+    merged = merge_metrics(partials, {"a": SUM, "b": MEAN, "c": MAX, "d": MIN})
+
+    assert merged == {"a": 4.0, "b": 3.5, "c": 3.0, "d": 0.0}
+
+
+def test_merge_metrics_default_rule():
+    partials = [
+        ({"forest_percentage": 10.0, "area_km2": 1.0}, 1.0),
+        ({"forest_percentage": 30.0, "area_km2": 3.0}, 3.0),
+    ]
+
+    # the default rule of the metric wins over the field names
+    assert merge_metrics(partials, {"*": SUM}) == {"forest_percentage": 40.0, "area_km2": 4.0}
+    assert merge_metrics(partials, {"*": SUM, "forest_percentage": MEAN}) == {
+        "forest_percentage": 25.0,
+        "area_km2": 4.0,
+    }
+
+
+def test_merge_metrics_inferred_rules():
+    partials = [
+        ({"mean_evi": 0.2, "max_fire": 3, "loss": 1}, 1.0),
+        ({"mean_evi": 0.6, "max_fire": 5, "loss": 2}, 1.0),
+    ]
+
+    assert merge_metrics(partials) == {"mean_evi": 0.4, "max_fire": 5, "loss": 3}
+
+
+def test_merge_metrics_nested():
+    partials = [
+        ({"loss": {"2001": 1.0, "2002": 2.0}, "unit": "km2", "gain": None}, 1.0),
+        ({"loss": {"2002": 1.0, "2003": 4.0}, "unit": "km2", "gain": 2.0}, 1.0),
+        (None, 0.0),  # empty tile
+    ]
+
+    merged = merge_metrics(partials, {"*": SUM})
+
+    assert merged == {"loss": {"2001": 1.0, "2002": 3.0, "2003": 4.0}, "unit": "km2", "gain": 2.0}
+
+
+def test_merge_metrics_unweighted_mean():
+    assert merge_metrics([({"v": 1.0}, 0.0), ({"v": 3.0}, 0.0)], {"*": MEAN}) == {"v": 2.0}
+
+
+@pytest.mark.parametrize(
+    "partials, rules",
+    [
+        ([], None),
+        ([(None, 1.0)], None),
+        ([({"label": "a"}, 1.0), ({"label": "b"}, 1.0)], None),
+        ([({"v": 1.0}, 1.0)], {"*": "median"}),
+    ],
+)
+def test_merge_metrics_errors(partials, rules):
+    with pytest.raises(MergeException):
+        merge_metrics(partials, rules)
@@ -0,0 +1,202 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import threading
+import types
+
+import pytest
+
+from helpers import throttle
+from helpers.throttle import (
+    AdaptiveConcurrencyLimiter,
+    AdaptiveRateLimiter,
+    CircuitBreaker,
+    CircuitOpenException,
+    ConcurrencyLimitExceeded,
+    RateLimitExceeded,
+    parse_retry_after,
+)
+
+
+class Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(
+        throttle,
+        "time",
+        types.SimpleNamespace(
+            **{name: getattr(clock, name) for name in ["monotonic", "time", "sleep"]}
+        ),
+    )
+    return clock
+
+
+def test_rate_limiter_burst(clock):
+    limiter = AdaptiveRateLimiter(rate=10, burst=3)
+
+    waits = [limiter.reserve() for _ in range(5)]
+
+    assert waits == pytest.approx([0, 0, 0, 0.1, 0.2])
+
+
+def test_rate_limiter_max_wait(clock):
+    limiter = AdaptiveRateLimiter(rate=1, burst=1)
+    limiter.reserve()
+
+    with pytest.raises(RateLimitExceeded):
+        limiter.reserve(max_wait=0.5)
+    assert limiter.reserve(max_wait=1) == pytest.approx(1)
+
+
+def test_rate_limiter_aimd(clock):
+    limiter = AdaptiveRateLimiter(rate=10, min_rate=1, max_rate=12, increase=1, decrease=0.5)
+
+    limiter.throttled()
+    limiter.throttled()  # same throttling episode
+    assert limiter.rate == 5
+
+    clock.sleep(1)
+    limiter.throttled()
+    assert limiter.rate == 2.5
+
+    for _ in range(1000):
+        limiter.succeeded()
+    assert limiter.rate == 12
+
+    for _ in range(10):
+        clock.sleep(10)
+        limiter.throttled()
+    assert limiter.rate == 1
+
+
+def test_rate_limiter_retry_after(clock):
+    limiter = AdaptiveRateLimiter(rate=100, burst=10)
+
+    limiter.throttled(retry_after=2)
+
+    assert limiter.reserve() == pytest.approx(2)
+
+
+def test_concurrency_limiter():
+    limiter = AdaptiveConcurrencyLimiter(2)
+    limiter.acquire()
+    limiter.acquire()
+
+    with pytest.raises(ConcurrencyLimitExceeded):
+        limiter.acquire(max_wait=0.01)
+
+    threading.Timer(0.05, limiter.release).start()
+    limiter.acquire(max_wait=5)  # the released slot;
+
+
+def test_concurrency_limiter_aimd():
+    limiter = AdaptiveConcurrencyLimiter(4, min_limit=1, max_limit=8, decrease=0.5)
+
+    limiter.throttled()
+    assert limiter.limit == 2
+    limiter.throttled()
+    limiter.throttled()
+    assert limiter.limit == 1
+
+    for _ in range(3):
+        limiter.succeeded()  # one slot for `limit` successful calls
+    assert int(limiter.limit) == 2
+    for _ in range(1000):
+        limiter.succeeded()
+    assert limiter.limit == 8
+
+
+def test_concurrency_limiter_throttled_holds_calls():
+    limiter = AdaptiveConcurrencyLimiter(2, decrease=0.5)
+    limiter.acquire()
+    limiter.throttled()
+
+    with pytest.raises(ConcurrencyLimitExceeded):
+        limiter.acquire(max_wait=0.01)  # the limit is now 1, held by the call in flight
+
+    limiter.release()
+    limiter.acquire(max_wait=0.01)
+
+
+def test_circuit_breaker(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=3, reset_timeout=30)
+
+    for _ in range(2):
+        breaker.failed()
+    breaker.allow()
+    breaker.succeeded()  # consecutive failures only
+    for _ in range(3):
+        breaker.failed()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenException):
+        breaker.allow()
+
+    clock.sleep(30)
+    breaker.allow()  # the probe
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenException):
+        breaker.allow()
+
+    breaker.succeeded()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.allow()
+
+
+def test_circuit_breaker_failed_probe(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_timeout=30)
+    breaker.failed()
+
+    clock.sleep(30)
+    breaker.allow()
+    breaker.failed()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.sleep(29)
+    with pytest.raises(CircuitOpenException):
+        breaker.allow()
+
+
+@pytest.mark.parametrize(
+    "value, seconds",
+    [
+        (None, None),
+        ("", None),
+        ("12", 12.0),
+        ("-1", 0.0),
+        ("soon", None),
+        ("Thu, 01 Jan 1970 00:01:50 GMT", 10.0),
+    ],
+)
+def test_parse_retry_after(clock, value, seconds):
+    assert parse_retry_after(value) == seconds
@@ -0,0 +1,62 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import pytest
+from geopandas import GeoDataFrame
+from shapely.geometry import box
+from shapely.ops import unary_union
+
+from helpers.tiles import clip_to_tile, tile_bounds, tile_grid
+
+
+@pytest.mark.parametrize(
+    "area_km2, grid",
+    [
+        (100, (1, 1)),
+        (250000, (1, 1)),
+        (250001, (2, 1)),
+        (1000000, (2, 2)),
+        (1500000, (3, 2)),
+        (1e9, (8, 8)),
+    ],
+)
+def test_tile_grid(area_km2, grid):
+    assert tile_grid(area_km2, 250000, 64) == grid
+
+
+def test_tile_bounds():
+    total_bounds = (-10.0, -5.0, 20.0, 5.0)
+    grid = (2, 3)
+
+    tiles = [box(*tile_bounds(total_bounds, grid, index)) for index in range(6)]
+
+    assert unary_union(tiles).equals(box(*total_bounds))
+    assert sum(tile.area for tile in tiles) == pytest.approx(box(*total_bounds).area)
+    assert tile_bounds(total_bounds, grid, 0) == (-10.0, -5.0, 0.0, 0.0)
+
+
+def test_clip_to_tile():
+    # an L shaped location, the top right tile is empty
+    gdf = GeoDataFrame(geometry=[box(0, 0, 2, 1), box(0, 1, 1, 2)], crs="EPSG:4326")
+
+    clipped = [clip_to_tile(gdf, (2, 2), index, 300.0) for index in range(4)]
+
+    assert clipped[3][0].empty and clipped[3][1] == 0.0
+    assert sum(area for _, area in clipped) == pytest.approx(300.0)
+    assert all(area == pytest.approx(100.0, rel=1e-3) for _, area in clipped[:3])
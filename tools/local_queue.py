@@ -0,0 +1,101 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+
+
+class InMemoryQueue:
+    """
+    Stand-in for the boto3 SNS client, messages published to a topic are queued
+    in memory until they are drained.
+    """
+
+    def __init__(self):
+        self._topics = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def publish(self, TopicArn, Message, **kwargs):
+        message_id = str(uuid.uuid4())
+        with self._lock:
+            self._topics[TopicArn].append((message_id, Message))
+        return {"MessageId": message_id}
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries, **kwargs):
+        successful = []
+        for entry in PublishBatchRequestEntries:
+            response = self.publish(TopicArn=TopicArn, Message=entry["Message"])
+            successful.append({"Id": entry["Id"], "MessageId": response["MessageId"]})
+        return {"Successful": successful, "Failed": []}
+
+    def drain(self, topic_arn):
+        """
+        :return: The (message id, message) tuples queued for the topic, in order.
+        """
+        with self._lock:
+            messages = list(self._topics[topic_arn])
+            self._topics[topic_arn].clear()
+        return messages
+
+    def size(self, topic_arn):
+        return len(self._topics[topic_arn])
+
+    def topics(self):
+        return [topic for topic, messages in self._topics.items() if messages]
+
+
+class LocalContext:
+    """
+    Stand-in for the AWS Lambda context object.
+    """
+
+    def __init__(self, function_name="local", timeout_seconds=900, memory_limit_in_mb=512):
+        self.function_name = function_name
+        self.memory_limit_in_mb = memory_limit_in_mb
+        self.aws_request_id = str(uuid.uuid4())
+        self._deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def sns_event(message, message_id=None, topic_arn="arn:aws:sns:local:000000000000:local"):
+    """
+    Wrap a message in an SNS event, as delivered to AWS Lambda.
+    """
+    if not isinstance(message, str):
+        message = json.dumps(message)
+    return {
+        "Records": [
+            {
+                "EventSource": "aws:sns",
+                "EventVersion": "1.0",
+                "Sns": {
+                    "Type": "Notification",
+                    "MessageId": message_id or str(uuid.uuid4()),
+                    "TopicArn": topic_arn,
+                    "Message": message,
+                    "MessageAttributes": {},
+                },
+            }
+        ]
+    }
@@ -0,0 +1,192 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+
+sys.path.insert(0, ROOT_DIR)
+
+from tools.local_queue import InMemoryQueue, LocalContext, sns_event  # noqa
+
+MANAGER_TOPIC_ARN = "arn:aws:sns:local:000000000000:manager"
+WORKER_TOPIC_ARN = "arn:aws:sns:local:000000000000:worker"
+WORKER_FAST_TOPIC_ARN = "arn:aws:sns:local:000000000000:worker-fast"
+REDUCER_TOPIC_ARN = "arn:aws:sns:local:000000000000:reducer"
+RESULT_TOPIC_ARN = "arn:aws:sns:local:000000000000:result"
+
+# environment read at import time by the handlers, the topics are local queues and the
+# ledger is kept per process.
+DEFAULT_ENV = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "LOG_FORMAT": "text",
+    "SENTRY_DSN": "",
+    "SNS_MANAGER_TOPIC_ARN": MANAGER_TOPIC_ARN,
+    "SNS_WORKER_TOPIC_ARN": WORKER_TOPIC_ARN,
+    "SNS_WORKER_FAST_TOPIC_ARN": WORKER_FAST_TOPIC_ARN,
+    "SNS_REDUCER_TOPIC_ARN": REDUCER_TOPIC_ARN,
+    "SNS_RESULT_TOPIC_ARN": RESULT_TOPIC_ARN,
+    "LEDGER_URL": "memory://",
+}
+
+# per process pipeline, set by the pool initializer.
+_queue = None
+_routes = None
+
+
+def init_process():
+    """
+    Import the handlers in the pool process and replace their SNS clients by an
+    in-memory queue. The handlers subscribed to each topic are routed locally.
+    """
+    global _queue, _routes
+
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+
+    sys.path.insert(0, SRC_DIR)
+    from handlers import manager_handler, reducer_handler, worker_handler
+
+    _queue = InMemoryQueue()
+    _routes = {}
+    for module in (manager_handler, worker_handler, reducer_handler):
+        module.sns = _queue
+
+    _routes[os.environ["SNS_MANAGER_TOPIC_ARN"]] = ("manager-handler", 30, manager_handler)
+    _routes[os.environ["SNS_WORKER_TOPIC_ARN"]] = ("worker-handler", 900, worker_handler)
+    _routes[os.environ["SNS_WORKER_FAST_TOPIC_ARN"]] = ("worker-fast-handler", 300, worker_handler)
+    _routes[os.environ["SNS_REDUCER_TOPIC_ARN"]] = ("reducer-handler", 60, reducer_handler)
+
+
+def run_location(line):
+    """
+    Run the manager → worker → reducer pipeline for a single location.
+
+    :param line: A `<id>` or `<id>,<version>` line of the input file.
+    :return: A dict with the published results, the errors, the events delivered to each
+        function and the duration.
+    """
+    resource_id, _, version = line.strip().partition(",")
+
+    start = time.perf_counter()
+    results, errors, events = [], [], Counter()
+    try:
+        from handlers import worker_handler
+
+        if not version:
+            document = worker_handler.fetch_service.get_by_id(
+                resource_id=resource_id, select_fields=["id", "version"]
+            )
+            version = document["version"]
+
+        _queue.publish(
+            TopicArn=os.environ["SNS_MANAGER_TOPIC_ARN"],
+            Message=json.dumps({"id": resource_id, "version": int(version)}),
+        )
+        drain_pipeline(errors, events)
+
+        result_topic_arn = os.environ["SNS_RESULT_TOPIC_ARN"]
+        results = [json.loads(message) for _, message in _queue.drain(result_topic_arn)]
+        if worker_handler.payload_store is not None:  # resolve the offloaded payloads;
+            results = [worker_handler.payload_store.unwrap(result) for result in results]
+    except Exception as e:
+        errors.append({"stage": "pipeline", "error": repr(e)})
+
+    return {
+        "location": resource_id,
+        "version": version,
+        "results": results,
+        "errors": errors,
+        "events": dict(events),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def drain_pipeline(errors, events):
+    """
+    Deliver the queued messages to the subscribed handlers until only results are left.
+    The delivered events are counted per function, to show how the jobs were routed.
+    """
+    while True:
+        pending = [topic for topic in _queue.topics() if topic in _routes]
+        if not pending:
+            return
+
+        for topic in pending:
+            function_name, timeout, module = _routes[topic]
+            for message_id, message in _queue.drain(topic):
+                events[function_name] += 1
+                try:
+                    module.lambda_handler(
+                        sns_event(message, message_id, topic), LocalContext(function_name, timeout),
+                    )
+                except Exception as e:
+                    errors.append({"stage": function_name, "message": message, "error": repr(e)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the workers pipeline locally.")
+    parser.add_argument("input", help="File with one `<id>` or `<id>,<version>` per line.")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file of results.")
+    parser.add_argument("--errors", default="errors.jsonl", help="JSONL file of errors.")
+    parser.add_argument(
+        "--processes", type=int, default=multiprocessing.cpu_count(), help="Pool size."
+    )
+    args = parser.parse_args()
+
+    with open(args.input) as f:
+        lines = [line for line in f if line.strip() and not line.startswith("#")]
+
+    start = time.perf_counter()
+    num_results, num_errors = 0, 0
+
+    with multiprocessing.Pool(args.processes, initializer=init_process) as pool:
+        with open(args.output, "w") as out, open(args.errors, "w") as err:
+            for record in pool.imap_unordered(run_location, lines):
+                for result in record["results"]:
+                    out.write(json.dumps(result) + "\n")
+                for error in record["errors"]:
+                    err.write(json.dumps({"location": record["location"], **error}) + "\n")
+
+                num_results += len(record["results"])
+                num_errors += len(record["errors"])
+
+                lanes = ", ".join(f"{k}={v}" for k, v in sorted(record["events"].items()))
+                print(
+                    f"{record['location']}: {len(record['results'])} results, "
+                    f"{len(record['errors'])} errors in {record['seconds']:.1f}s ({lanes})"
+                )
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Processed {len(lines)} locations in {elapsed:.1f}s "
+        f"({len(lines) / elapsed:.2f} locations/s, {num_results / elapsed:.2f} results/s), "
+        f"{num_errors} errors"
+    )
+
+
+if __name__ == "__main__":
+    main()
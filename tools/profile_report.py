@@ -0,0 +1,217 @@
+"""
+  Copyright 2018-2020 National Geographic Society
+
+  Use of this software does not constitute endorsement by National Geographic
+  Society (NGS). The NGS name and NGS logo may not be used for any purpose without
+  written permission from NGS.
+
+  Licensed under the Apache License, Version 2.0 (the "License"); you may not use
+  this file except in compliance with the License. You may obtain a copy of the
+  License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+  Unless required by applicable law or agreed to in writing, software distributed
+  under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR
+  CONDITIONS OF ANY KIND, either express or implied. See the License for the
+  specific language governing permissions and limitations under the License.
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+from collections import defaultdict
+
+LAMBDA_MEMORY_MIN = 128  # in MB
+LAMBDA_MEMORY_MAX = 10240
+LAMBDA_MEMORY_STEP = 64
+LAMBDA_MEMORY_PER_VCPU = 1769  # memory size at which a function gets a full vCPU
+LAMBDA_TIMEOUT_MAX = 900  # in seconds
+
+TAIL_PERCENTILE = 0.99  # of the profiles & recommendations
+MEMORY_HEADROOM = 1.3  # over the p99 peak RSS
+TIMEOUT_HEADROOM = 1.5  # over the p99 job duration
+WORKER_TIME_MARGIN = 60  # in seconds, see the worker `WORKER_TIME_MARGIN`
+CPU_BOUND_RATIO = 0.8  # share of its vCPU fraction a metric uses when starved of CPU
+
+# stages of the invocation timed before the metrics, inherited by the metric records.
+PREPARATION_STAGES = ["probe", "fetch", "deserialize", "geodataframe", "simplify"]
+
+
+def read_records(lines):
+    """
+    Parse the profiled metric records, lines may be prefixed (e.g. exported log events).
+    """
+    for line in lines:
+        start = line.find("{")
+        if start < 0:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and "slug" in record and "wallTime" in record:
+            yield record
+
+
+def fetch_records(log_group, hours):
+    """
+    Retrieve the profiled metric records from a CloudWatch log group.
+    """
+    import boto3
+
+    paginator = boto3.client("logs").get_paginator("filter_log_events")
+    pages = paginator.paginate(
+        logGroupName=log_group,
+        startTime=int((time.time() - hours * 3600) * 1000),
+        filterPattern="{ $.wallTime = * }",
+    )
+    for page in pages:
+        yield from read_records(event["message"] for event in page["events"])
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(math.ceil(q * len(values))) - 1)]
+
+
+def job_seconds(record):
+    """
+    Duration of the job of a metric: the preparation of the location, then the metric.
+    """
+    return (sum(record.get(s, 0) for s in PREPARATION_STAGES) + record["wallTime"]) / 1000
+
+
+def cpu_ratio(record):
+    return record.get("cpuTime", 0) / record["wallTime"] if record["wallTime"] else 0.0
+
+
+def profiles(records):
+    """
+    :return: A dict of (slug, size bucket) to the stats of its records.
+    """
+    groups = defaultdict(list)
+    for record in records:
+        groups[(record["slug"], record.get("sizeBucket", "unknown"))].append(record)
+
+    return {key: stats(group) for key, group in sorted(groups.items())}
+
+
+def stats(records):
+    """
+    Median & p99 of the wall time, p99 of the CPU time & peak RSS, the same tail as
+    `recommend`.
+    """
+    peaks = [r["peakRss"] for r in records if r.get("peakRss") is not None]
+    return {
+        "count": len(records),
+        "wall_p50": percentile([r["wallTime"] / 1000 for r in records], 0.5),
+        "wall_p99": percentile([r["wallTime"] / 1000 for r in records], TAIL_PERCENTILE),
+        "cpu_p99": percentile([r.get("cpuTime", 0) / 1000 for r in records], TAIL_PERCENTILE),
+        "cpu_ratio": percentile([cpu_ratio(r) for r in records], 0.5),
+        "rss_p99": percentile(peaks, TAIL_PERCENTILE),
+    }
+
+
+def recommend(records):
+    """
+    Memory size & timeout of a function, from the records of its invocations. The memory
+    covers the p99 peak RSS, doubled (up to a full vCPU) when the metrics are CPU-bound:
+    they use all the CPU allocated to the current memory size. The timeout covers the p99
+    job duration and the margin kept by the worker to checkpoint.
+    """
+    memory_limit = percentile([r["memoryLimit"] for r in records if r.get("memoryLimit")], 0.5)
+    peak = percentile(
+        [r["peakRss"] for r in records if r.get("peakRss") is not None], TAIL_PERCENTILE
+    )
+
+    memory, reasons = LAMBDA_MEMORY_MIN, []
+    if peak is not None:
+        memory = max(memory, peak * MEMORY_HEADROOM)
+        reasons.append(f"p99 peak RSS {peak:.0f} MB")
+
+    ratio = percentile([cpu_ratio(r) for r in records], 0.5)
+    if memory_limit:
+        share = min(1.0, memory_limit / LAMBDA_MEMORY_PER_VCPU)
+        if ratio >= CPU_BOUND_RATIO * share and memory_limit < LAMBDA_MEMORY_PER_VCPU:
+            memory = max(memory, min(LAMBDA_MEMORY_PER_VCPU, memory_limit * 2))
+            reasons.append(f"CPU-bound, {ratio:.0%} CPU of a {share:.0%} vCPU share")
+
+    memory = math.ceil(memory / LAMBDA_MEMORY_STEP) * LAMBDA_MEMORY_STEP
+    memory = min(LAMBDA_MEMORY_MAX, memory)
+
+    duration = percentile([job_seconds(r) for r in records], TAIL_PERCENTILE)
+    timeout = duration * TIMEOUT_HEADROOM + WORKER_TIME_MARGIN
+    timeout = min(LAMBDA_TIMEOUT_MAX, int(math.ceil(timeout / 10) * 10))
+    reasons.append(f"p99 job {duration:.0f}s")
+
+    return {
+        "count": len(records),
+        "memory_limit": memory_limit,
+        "memory": memory,
+        "timeout": timeout,
+        "reasons": reasons,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Right-size the worker functions.")
+    parser.add_argument("inputs", nargs="*", help="Files of EMF records, stdin when omitted.")
+    parser.add_argument("--log-group", action="append", help="CloudWatch log group to query.")
+    parser.add_argument("--hours", type=float, default=24, help="Period of the query.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    records = []
+    for log_group in args.log_group or []:
+        records.extend(fetch_records(log_group, args.hours))
+    for filepath in args.inputs:
+        with open(filepath) as f:
+            records.extend(read_records(f))
+    if not args.inputs and not args.log_group:
+        records.extend(read_records(sys.stdin))
+
+    if not records:
+        sys.exit("No profiled metric records found")
+
+    by_function = defaultdict(list)
+    for record in records:
+        by_function[record.get("functionName") or record.get("function", "unknown")].append(record)
+
+    report = {
+        "profiles": [
+            {"slug": slug, "sizeBucket": bucket, **values}
+            for (slug, bucket), values in profiles(records).items()
+        ],
+        "functions": {name: recommend(group) for name, group in sorted(by_function.items())},
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(
+        f"{'slug':<28}{'size':>6}{'count':>7}{'wall p50':>10}{'wall p99':>10}"
+        f"{'cpu p99':>9}{'cpu %':>7}{'rss p99':>9}"
+    )
+    for p in report["profiles"]:
+        rss = f"{p['rss_p99']:.0f}MB" if p["rss_p99"] is not None else "-"
+        print(
+            f"{p['slug']:<28}{p['sizeBucket']:>6}{p['count']:>7}{p['wall_p50']:>9.1f}s"
+            f"{p['wall_p99']:>9.1f}s{p['cpu_p99']:>8.1f}s{p['cpu_ratio']:>7.0%}{rss:>9}"
+        )
+
+    print()
+    for name, r in report["functions"].items():
+        print(
+            f"{name}: memorySize {r['memory']} (now {r['memory_limit'] or '?'}), "
+            f"timeout {r['timeout']} from {r['count']} records: {', '.join(r['reasons'])}"
+        )
+
+
+if __name__ == "__main__":
+    main()